@@ -0,0 +1,325 @@
+# Mesures de performance lancées avec `python manage.py benchmark <nom>`.
+# Chaque fonction enregistrée renvoie une liste de lignes de résultats à afficher.
+import csv
+import io
+import time
+from contextlib import contextmanager
+from data.emission_factors import get_emission_factors
+from data.models import compute_resultat
+from data.synthetic import synthetic_emission_values
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+class Timer:
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        yield
+        self.timings[name] = time.perf_counter() - start
+
+
+def synthetic_emission_rows(count, seed=0):
+    """
+    Rows shaped like the all-emissions export, without going through the database
+    """
+    emission_factors = get_emission_factors()
+    for index, (poste, type, valeur, unite, localisation) in enumerate(synthetic_emission_values(count, seed=seed)):
+        factor = emission_factors.get_factor(type, unite, localisation)
+        siren = f"{100000000 + index // 20}"
+        yield (
+            siren,
+            2021,
+            "03",
+            "01",
+            poste,
+            type,
+            valeur,
+            unite,
+            localisation,
+            factor,
+            compute_resultat(valeur, factor),
+            None,
+        )
+
+
+@benchmark("parquet")
+def parquet_export(rows=1000000, **_):
+    import pyarrow.csv
+    import pyarrow.parquet as pq
+    from api.exports import stream_parquet, EMISSION_SCHEMA, EMISSION_EXPORT_FIELDS
+
+    data = list(synthetic_emission_rows(rows))
+    timer = Timer()
+
+    with timer.measure("csv write"):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EMISSION_EXPORT_FIELDS)
+        writer.writerows(data)
+        csv_bytes = buffer.getvalue().encode("utf-8")
+    with timer.measure("csv read"):
+        pyarrow.csv.read_csv(io.BytesIO(csv_bytes))
+
+    with timer.measure("parquet write"):
+        parquet_bytes = b"".join(stream_parquet(EMISSION_SCHEMA, iter(data)))
+    with timer.measure("parquet read"):
+        pq.read_table(io.BytesIO(parquet_bytes))
+
+    csv_total = timer.timings["csv write"] + timer.timings["csv read"]
+    parquet_total = timer.timings["parquet write"] + timer.timings["parquet read"]
+    return [
+        f"{rows} emission rows",
+        *(f"{name}: {duration:.2f}s" for name, duration in timer.timings.items()),
+        f"csv size: {len(csv_bytes) / 1e6:.1f} MB, parquet size: {len(parquet_bytes) / 1e6:.1f} MB",
+        f"parquet write + read takes {parquet_total / csv_total:.0%} of the csv time",
+    ]
+
+
+@benchmark("partitions")
+def partitioned_export(workers=None, **_):
+    """
+    Uses the reports already in the database, see the generatesyntheticdata command
+    """
+    import os
+    from api.exports import iter_partitioned_export, render_reports_csv
+    from data.models import Report
+
+    workers = workers or os.cpu_count()
+    timer = Timer()
+    with timer.measure("single process"):
+        single = render_reports_csv(Report.objects.select_related("gestionnaire").order_by("id"))
+    with timer.measure(f"{workers} processes"):
+        partitioned = b"".join(iter_partitioned_export(workers))
+
+    single_duration, partitioned_duration = timer.timings.values()
+    return [
+        f"{Report.objects.count()} reports",
+        *(f"{name}: {duration:.2f}s" for name, duration in timer.timings.items()),
+        f"speedup: x{single_duration / partitioned_duration:.1f}",
+        f"identical output: {single == partitioned}",
+    ]
+
+
+@benchmark("compression")
+def export_compression(rows=1000000, **_):
+    from api.exports import stream_csv, emission_export_labels, EMISSION_EXPORT_FIELDS
+    from api.exports.compression import compress_stream, ENCODINGS
+
+    labels = emission_export_labels()
+    chunks = list(stream_csv(EMISSION_EXPORT_FIELDS, labels, synthetic_emission_rows(rows)))
+    size = sum(len(chunk) for chunk in chunks)
+    lines = [f"{rows} emission rows, {size / 1e6:.1f} MB of CSV"]
+    for encoding in ENCODINGS:
+        timer = Timer()
+        with timer.measure(encoding):
+            compressed = sum(len(data) for data in compress_stream(iter(chunks), encoding))
+        duration = timer.timings[encoding]
+        lines.append(f"{encoding}: {size / 1e6 / duration:.0f} MB/s, ratio x{size / compressed:.1f}")
+    return lines
+
+
+@benchmark("factors")
+def factors_loading(rows=50, **_):
+    """
+    Time and memory for a worker to get the emission factors with their index, from the JSON file and
+    from the compiled file. rows is the number of loads averaged.
+    """
+    import tempfile
+    import tracemalloc
+    from data.emission_factors import EmissionFactors, compile_factors
+
+    def load_json():
+        return EmissionFactors().index
+
+    with tempfile.TemporaryDirectory() as directory:
+        compiled_path = f"{directory}/emission-factors.pickle"
+        compile_factors(compiled_path=compiled_path)
+
+        def load_compiled():
+            return EmissionFactors(compiled_path=compiled_path).index
+
+        lines = []
+        for name, load in [("json", load_json), ("compiled", load_compiled)]:
+            timer = Timer()
+            with timer.measure(name):
+                for _ in range(rows):
+                    load()
+            tracemalloc.start()
+            index = load()
+            memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del index
+            lines.append(f"{name}: {timer.timings[name] / rows * 1000:.1f} ms, {memory / 1e6:.2f} MB")
+    return lines
+
+
+def proportional_memory():
+    """
+    Memory of the process in bytes, the pages shared with other processes counted in proportion (Linux only)
+    """
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024
+
+
+def measure_worker_memory(load, lookups, barrier, results):
+    # the lookups come from the parent, reading them once keeps their copy out of the measure
+    for key in lookups:
+        len(key)
+    # every step is taken by all the workers together, the pages shared by them are then counted alike
+    barrier.wait()
+    before = proportional_memory()
+    barrier.wait()
+    emission_factors = load()
+    for key in lookups:
+        emission_factors.find_factor(*key)
+    barrier.wait()
+    results.put(proportional_memory() - before)
+    barrier.wait()
+
+
+@benchmark("workers")
+def worker_factors_memory(workers=None, **_):
+    """
+    Memory added to each forked worker by the emission factors, parsed in each worker or mapped from the
+    shared table, measured with 8 and 16 workers
+    """
+    import multiprocessing
+    import tempfile
+    from django.db import connections
+    from data.emission_factors import EmissionFactors, compile_factors
+
+    context = multiprocessing.get_context("fork")
+    connections.close_all()
+    lines = []
+    with tempfile.TemporaryDirectory() as directory:
+        compiled_path = f"{directory}/emission-factors.pickle"
+        table_path = f"{directory}/emission-factors.table"
+        compile_factors(compiled_path=compiled_path, table_path=table_path)
+        lookups = [
+            (type, unit.replace("kgCO2e/", "", 1), location)
+            for type, emission_factor in EmissionFactors().emission_factors.items()
+            for location, location_factors in emission_factor["facteurs"].items()
+            for unit in location_factors
+        ]
+        loads = {
+            "json": lambda: EmissionFactors(),
+            "compiled": lambda: EmissionFactors(compiled_path=compiled_path),
+            "table": lambda: EmissionFactors(table_path=table_path),
+        }
+        # libraries used for the first time (OpenSSL for the hash, zlib...) would be counted otherwise
+        for load in loads.values():
+            load().find_factor(*lookups[0])
+        for count in [workers] if workers else [8, 16]:
+            for name, load in loads.items():
+                barrier, results = context.Barrier(count), context.Queue()
+                processes = [
+                    context.Process(target=measure_worker_memory, args=(load, lookups, barrier, results))
+                    for _ in range(count)
+                ]
+                for process in processes:
+                    process.start()
+                memory = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                lines.append(
+                    f"{count} workers, {name}: {sum(memory) / count / 1e3:.0f} kB per worker, "
+                    f"{sum(memory) / 1e6:.2f} MB in all"
+                )
+    return lines
+
+
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import djangoapp.wsgi
+from django.conf import settings
+from django.test import Client
+from django.urls import reverse
+timings = {"wsgi import": time.perf_counter() - start}
+if sys.argv[1] == "warm":
+    from djangoapp.warmup import warm_up
+    start = time.perf_counter()
+    warm_up()
+    timings["warm-up"] = time.perf_counter() - start
+client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+for name in ["ef-compact", "ef-search"]:
+    start = time.perf_counter()
+    client.get(reverse(name), {"q": "gaz"})
+    timings[f"first {name} request"] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+
+@benchmark("startup")
+def worker_startup(rows=5, **_):
+    """
+    Start-up of the app in a new process and its first requests, with and without the warm-up that gunicorn
+    runs before forking the workers. rows is the number of processes averaged.
+    """
+    import json
+    import subprocess
+    import sys
+
+    lines = []
+    for mode in ["cold", "warm"]:
+        runs = [
+            json.loads(
+                subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, mode], capture_output=True, check=True).stdout
+            )
+            for _ in range(rows)
+        ]
+        lines.append(f"{mode}:")
+        lines += [f"  {name}: {sum(run[name] for run in runs) / rows * 1000:.1f} ms" for name in runs[0]]
+    return lines
+
+
+@benchmark("storage")
+def emission_storage(rows=3, **_):
+    """
+    Size of the emissions table and time to read it. Uses the emissions already in the database, see the
+    generatesyntheticdata command. rows is the number of runs, the fastest is kept.
+    """
+    from django.db import connection
+    from api.exports import iter_emission_rows
+    from data.bulk import report_post_totals
+    from data.models import Report
+
+    with connection.cursor() as cursor:
+        cursor.execute("VACUUM ANALYZE data_emission")
+        cursor.execute(
+            "SELECT count(*), pg_relation_size('data_emission'), pg_indexes_size('data_emission'), "
+            "pg_total_relation_size('data_emission') FROM data_emission"
+        )
+        count, table_size, indexes_size, total_size = cursor.fetchone()
+    report_ids = list(Report.objects.values_list("id", flat=True))
+    runs = {"sequential scan": [], "export rows": [], "poste totals": []}
+    for _ in range(rows):
+        timer = Timer()
+        with timer.measure("sequential scan"), connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM data_emission WHERE note IS NULL")
+        with timer.measure("export rows"):
+            for _ in iter_emission_rows():
+                pass
+        with timer.measure("poste totals"):
+            report_post_totals(report_ids)
+        for name, duration in timer.timings.items():
+            runs[name].append(duration)
+    return [
+        f"{count} emissions",
+        f"table: {table_size / 1e6:.1f} MB, indexes: {indexes_size / 1e6:.1f} MB, total: {total_size / 1e6:.1f} MB",
+        *(f"{name}: {min(durations):.2f}s" for name, durations in runs.items()),
+    ]
@@ -0,0 +1,25 @@
+from data.emission_factors import get_emission_factors
+from data.models import compute_resultat, sum_results
+
+
+def calculate(emissions):
+    """
+    Results of unsaved emissions and their poste totals, following the rules of Emission.resultat and
+    Report.sum_post. Only reads the emission factors in memory, no database access.
+    """
+    emission_factors = get_emission_factors()
+    results = []
+    for emission in emissions:
+        factor = emission_factors.get_factor(emission["type"], emission["unite"], emission.get("localisation"))
+        results.append(
+            {
+                "facteur_d_emission": factor,
+                "resultat": compute_resultat(emission["valeur"], factor),
+                "classification": emission_factors.get_classification(emission["type"]),
+            }
+        )
+    poste_1, poste_2 = [
+        sum_results(result["resultat"] for result, emission in zip(results, emissions) if emission["poste"] == poste)
+        for poste in (1, 2)
+    ]
+    return {"emissions": results, "poste_1": poste_1, "poste_2": poste_2, "total": poste_1 + poste_2}
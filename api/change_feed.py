@@ -0,0 +1,76 @@
+# Flux des modifications : les consommateurs (Koumoul, tableaux de bord ADEME) gardent un curseur
+# et ne récupèrent que ce qui a changé depuis, suppressions comprises.
+import base64
+import json
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from api.serializers import ReportChangeSerializer, EmissionChangeSerializer, TombstoneSerializer
+from data.models import Report, Emission, Tombstone
+
+# name: (queryset, date field, serializer)
+STREAMS = {
+    "reports": (Report.objects.all(), "modification_date", ReportChangeSerializer),
+    "emissions": (Emission.objects.all(), "modification_date", EmissionChangeSerializer),
+    "deleted": (Tombstone.objects.all(), "deletion_date", TombstoneSerializer),
+}
+
+
+def encode_cursor(positions):
+    data = {name: [date.isoformat(), id] for name, (date, id) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(data).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (date, id) of the last change seen for each stream
+    """
+    if not cursor:
+        return {}
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(data, dict):
+            raise ValueError("not a cursor")
+        return {name: (datetime.fromisoformat(date), int(id)) for name, (date, id) in data.items() if name in STREAMS}
+    except (ValueError, TypeError, UnicodeError, AttributeError):
+        raise ValidationError({"cursor": "Curseur invalide"})
+
+
+def changes_after(queryset, date_field, position, limit):
+    """
+    Objects ordered by (date, id) coming after the given position, reading the (date, id) index.
+    The dates are set by the application before the commit, the changes more recent than CHANGE_FEED_LAG are
+    left for later so that a transaction committing late can't end up behind the position of a consumer.
+    """
+    settled = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_LAG)
+    queryset = queryset.filter(**{f"{date_field}__lt": settled})
+    if position:
+        date, id = position
+        queryset = queryset.filter(**{f"{date_field}__gte": date}).exclude(**{date_field: date, "id__lte": id})
+    # one more than the limit to know whether there are further changes
+    extra = limit + 1
+    return list(queryset.order_by(date_field, "id")[:extra])
+
+
+def get_changes(cursor=None, limit=100, include_emissions=False):
+    positions = decode_cursor(cursor)
+    names = ["reports", "deleted"] + (["emissions"] if include_emissions else [])
+    changes = {}
+    has_more = False
+    for name in names:
+        queryset, date_field, serializer = STREAMS[name]
+        objects = changes_after(queryset, date_field, positions.get(name), limit)
+        if len(objects) > limit:
+            has_more = True
+            objects = objects[:limit]
+        if objects:
+            positions[name] = (getattr(objects[-1], date_field), objects[-1].id)
+        if name == "reports":
+            # imported on first use, see api.tests.test_import_time
+            from data.bulk import attach_post_totals
+
+            # the totals of the page in a few queries rather than several for each report
+            objects = attach_post_totals(objects)
+        changes[name] = serializer(objects, many=True).data
+    return {**changes, "cursor": encode_cursor(positions), "has_more": has_more}
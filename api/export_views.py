@@ -0,0 +1,203 @@
+# Vues des exports, chargées à leur première requête seulement (voir lazy_view dans api/urls.py) :
+# leurs dépendances (openpyxl, pyarrow, numpy...) ne ralentissent pas le démarrage des autres commandes.
+# Les exports de l'administration lisent la réplique, ceux d'un bilan la base principale (voir data/replica.py).
+from django.http.response import StreamingHttpResponse
+from django.utils import timezone
+from drf_excel.mixins import XLSXFileMixin
+from drf_excel.renderers import XLSXRenderer
+from rest_framework import permissions
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import ListAPIView
+from rest_framework.views import APIView
+from rest_framework.viewsets import ReadOnlyModelViewSet
+from api.serializers import PrivateReportExportSerializer, EmissionExportSerializer
+from api.utils import ReplicaReadMixin
+from data.bulk import attach_post_totals
+from data.models import Report, Emission
+from .exports import CachedExportMixin, iter_report_rows, iter_emission_rows
+from .exports import PrivateReportExportRenderer, EmissionExportRenderer
+from .exports import stream_parquet, REPORT_SCHEMA, EMISSION_SCHEMA, PARQUET_CONTENT_TYPE
+from .exports import stream_csv, emission_export_labels, EMISSION_EXPORT_FIELDS, CSV_CONTENT_TYPE
+from .exports import stream_emissions_bundle, filter_reports, ZIP_CONTENT_TYPE
+
+
+class PrivateExportView(ReplicaReadMixin, CachedExportMixin, ListAPIView):
+    renderer_classes = (PrivateReportExportRenderer,)
+    model = Report
+    serializer_class = PrivateReportExportSerializer
+    queryset = Report.objects.all()
+    permission_classes = [permissions.IsAdminUser]
+    export_format = "csv"
+    export_content_type = "text/csv; charset=utf-8"
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response["Content-Disposition"] = "attachment; filename=%s" % (self.get_filename())
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get_queryset(self):
+        # totals of all the reports computed in bulk rather than with queries for each report
+        return attach_post_totals(Report.objects.select_related("gestionnaire").order_by("id"))
+
+    def get_filename(self):
+        timestamp = timezone.now().strftime("%Y-%m-%d")
+        return f"bilans_climat_simplifies_{timestamp}.csv"
+
+    def get_export_filename(self):
+        return self.get_filename()
+
+
+class PrivateXlsxExportView(ReplicaReadMixin, CachedExportMixin, XLSXFileMixin, ReadOnlyModelViewSet):
+    queryset = Report.objects.all()
+    serializer_class = PrivateReportExportSerializer
+    renderer_classes = [XLSXRenderer]
+    permission_classes = [permissions.IsAdminUser]
+    export_format = "xlsx"
+    export_content_type = "application/xlsx; charset=utf-8"
+    xlsx_use_labels = True
+    column_header = {
+        "height": 20,
+        "style": {
+            "font": {
+                "bold": True,
+            },
+        },
+    }
+    body = {
+        "style": {
+            "alignment": {
+                "horizontal": "left",
+                "vertical": "center",
+            },
+        },
+        "height": 20,
+    }
+
+    def get_queryset(self):
+        # totals of all the reports computed in bulk rather than with queries for each report
+        return attach_post_totals(Report.objects.select_related("gestionnaire").order_by("id"))
+
+    def get_filename(self, request):
+        timestamp = timezone.now().strftime("%Y-%m-%d")
+        return f"bilans_climat_simplifies_{timestamp}.xlsx"
+
+    def get_export_filename(self):
+        return self.get_filename(self.request)
+
+
+class PrivateParquetExportView(ReplicaReadMixin, APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, _):
+        response = StreamingHttpResponse(
+            stream_parquet(REPORT_SCHEMA, iter_report_rows()), content_type=PARQUET_CONTENT_TYPE
+        )
+        timestamp = timezone.now().strftime("%Y-%m-%d")
+        response["Content-Disposition"] = f"attachment; filename=bilans_climat_simplifies_{timestamp}.parquet"
+        return response
+
+
+class AllEmissionsExportView(ReplicaReadMixin, APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, _):
+        rows = iter_emission_rows()
+        response = StreamingHttpResponse(
+            stream_csv(EMISSION_EXPORT_FIELDS, emission_export_labels(), rows), content_type=CSV_CONTENT_TYPE
+        )
+        timestamp = timezone.now().strftime("%Y-%m-%d")
+        response["Content-Disposition"] = f"attachment; filename=emissions_bilans_climat_simplifies_{timestamp}.csv"
+        return response
+
+
+class EmissionsBundleExportView(ReplicaReadMixin, APIView):
+    """
+    ZIP of the emissions export of each report, filtered by annee, region and naf
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        annee = request.query_params.get("annee")
+        if annee and not annee.isdigit():
+            raise ValidationError({"annee": "Une année est attendue"})
+        reports = filter_reports(
+            annee=annee, region=request.query_params.get("region"), naf=request.query_params.get("naf")
+        )
+        response = StreamingHttpResponse(stream_emissions_bundle(reports), content_type=ZIP_CONTENT_TYPE)
+        timestamp = timezone.now().strftime("%Y-%m-%d")
+        response["Content-Disposition"] = f"attachment; filename=emissions_bilans_climat_simplifies_{timestamp}.zip"
+        return response
+
+
+class AllEmissionsParquetExportView(ReplicaReadMixin, APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, _):
+        response = StreamingHttpResponse(
+            stream_parquet(EMISSION_SCHEMA, iter_emission_rows()), content_type=PARQUET_CONTENT_TYPE
+        )
+        timestamp = timezone.now().strftime("%Y-%m-%d")
+        response["Content-Disposition"] = (
+            f"attachment; filename=emissions_bilans_climat_simplifies_{timestamp}.parquet"
+        )
+        return response
+
+
+class EmissionsExportView(ListAPIView):
+    renderer_classes = (EmissionExportRenderer,)
+    model = Emission
+    serializer_class = EmissionExportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        report_id = self.request.parser_context.get("kwargs").get("report_pk")
+        report = Report.objects.get(pk=report_id)
+        if report.gestionnaire != self.request.user:
+            raise NotFound()
+        return Emission.objects.filter(bilan=report_id)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if response.status_code == 200:
+            response["Content-Disposition"] = "attachment; filename=%s" % (self.get_filename())
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get_filename(self):
+        report_id = self.request.parser_context.get("kwargs").get("report_pk")
+        report = Report.objects.get(pk=report_id)
+        return f"export_{report.siren}_{report.annee}.csv"
+
+
+class EmissionsXlsxExportView(XLSXFileMixin, ReadOnlyModelViewSet):
+    queryset = Emission.objects.all()
+    serializer_class = EmissionExportSerializer
+    renderer_classes = [XLSXRenderer]
+    permission_classes = [permissions.IsAuthenticated]
+    xlsx_use_labels = True
+    column_header = {
+        "height": 20,
+        "style": {
+            "font": {
+                "bold": True,
+            },
+        },
+    }
+    body = {
+        "style": {
+            "alignment": {
+                "horizontal": "left",
+                "vertical": "center",
+            },
+        },
+        "height": 20,
+    }
+
+    def get_queryset(self):
+        report_id = self.request.parser_context.get("kwargs").get("report_pk")
+        report = Report.objects.get(pk=report_id)
+        if report.gestionnaire != self.request.user:
+            raise NotFound()
+        return Emission.objects.filter(bilan=report_id)
+
+    def get_filename(self, request, report_pk):
+        report = Report.objects.get(pk=report_pk)
+        return f"export_{report.siren}_{report.annee}.xlsx"
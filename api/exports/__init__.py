@@ -0,0 +1,37 @@
+# Les sous-modules sont importés au premier accès à l'un de leurs noms : le middleware de compression
+# et les vues qui n'exportent rien n'ont pas à charger pyarrow, numpy ou rest_framework_csv.
+import importlib
+
+# name: submodule defining it
+EXPORTS = {
+    "PrivateReportExportRenderer": "renderers",
+    "EmissionExportRenderer": "renderers",
+    "CachedExportMixin": "cache",
+    "export_watermark": "cache",
+    "iter_report_rows": "rows",
+    "iter_emission_rows": "rows",
+    "REPORT_EXPORT_FIELDS": "rows",
+    "EMISSION_EXPORT_FIELDS": "rows",
+    "stream_parquet": "parquet",
+    "REPORT_SCHEMA": "parquet",
+    "EMISSION_SCHEMA": "parquet",
+    "PARQUET_CONTENT_TYPE": "parquet",
+    "stream_csv": "streaming_csv",
+    "emission_export_labels": "streaming_csv",
+    "CSV_CONTENT_TYPE": "streaming_csv",
+    "stream_emissions_bundle": "bundle",
+    "filter_reports": "bundle",
+    "ZIP_CONTENT_TYPE": "bundle",
+    "iter_partitioned_export": "partitions",
+    "render_reports_csv": "partitions",
+}
+
+
+def __getattr__(name):
+    if name not in EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{EXPORTS[name]}", __name__), name)
+
+
+def __dir__():
+    return sorted([*globals(), *EXPORTS])
@@ -0,0 +1,106 @@
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.conf import settings
+from django.utils import timezone
+from api.serializers import EmissionExportSerializer
+from data.models import Report, Emission, FactorKey
+from .renderers import EmissionExportRenderer
+
+ZIP_CONTENT_TYPE = "application/zip"
+
+# reports whose emissions are fetched together in one query
+REPORTS_PER_QUERY = 50
+
+
+class ZipStream:
+    """
+    Unseekable file object for ZipFile, which then writes data descriptors instead of seeking back.
+    Keeps the bytes written until they are collected.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def collect(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def report_emissions_filename(report):
+    return f"export_{report.siren}_{report.annee}.csv"
+
+
+def render_report_emissions(emissions):
+    """
+    Same CSV as the per-report emissions export. Runs in a worker thread, without database access.
+    """
+    data = EmissionExportSerializer(emissions, many=True).data
+    return EmissionExportRenderer().render(data)
+
+
+def iter_reports_with_emissions(reports):
+    """
+    Yields (report, emissions) pairs, fetching the emissions of several reports per query
+    """
+    reports = reports.order_by("id").iterator(chunk_size=settings.EXPORT_FETCH_SIZE)
+    while True:
+        chunk = list(islice(reports, REPORTS_PER_QUERY))
+        if not chunk:
+            return
+        emissions_by_report = {report.id: [] for report in chunk}
+        for emission in Emission.objects.filter(bilan__in=chunk).order_by("id"):
+            # the factor keys are read here, the worker threads rendering the files don't query
+            FactorKey.objects.values_of(emission.factor_key_id)
+            emissions_by_report[emission.bilan_id].append(emission)
+        for report in chunk:
+            yield report, emissions_by_report[report.id]
+
+
+def stream_emissions_bundle(reports, workers=None, max_pending=None):
+    """
+    Yields the bytes of a ZIP file holding the emissions export of each report.
+    CSV files are rendered by a pool of threads; at most max_pending of them are held in memory waiting
+    to be written, the next ones are only submitted once the zip has been sent further.
+    """
+    workers = workers or settings.EXPORT_BUNDLE_WORKERS
+    max_pending = max_pending or 2 * workers
+    stream = ZipStream()
+    date_time = timezone.now().timetuple()[:6]
+    with ThreadPoolExecutor(max_workers=workers) as executor, zipfile.ZipFile(
+        stream, mode="w", compression=zipfile.ZIP_DEFLATED
+    ) as bundle:
+        pending = deque()
+
+        def write_oldest():
+            filename, future = pending.popleft()
+            bundle.writestr(zipfile.ZipInfo(filename, date_time=date_time), future.result(), zipfile.ZIP_DEFLATED)
+            return stream.collect()
+
+        for report, emissions in iter_reports_with_emissions(reports):
+            if len(pending) >= max_pending:
+                yield write_oldest()
+            pending.append((report_emissions_filename(report), executor.submit(render_report_emissions, emissions)))
+        while pending:
+            yield write_oldest()
+    yield stream.collect()
+
+
+def filter_reports(annee=None, region=None, naf=None):
+    reports = Report.objects.all()
+    if annee:
+        reports = reports.filter(annee=annee)
+    if region:
+        reports = reports.filter(region=region)
+    if naf:
+        reports = reports.filter(naf=naf)
+    return reports
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import tempfile
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.db.models import Count, Max, TextField, Value
+from django.db.models.functions import Concat, MD5
+from django.http import FileResponse
+from rest_framework.response import Response
+from data.emission_factors import get_emission_factors
+from data.models import Report, Emission
+
+# bump when the content of the exports changes (new columns, labels, how the factors are looked up...) to
+# invalidate existing files
+EXPORT_CACHE_VERSION = 3
+
+
+def export_watermark():
+    """
+    Summarises the state of the exported data: if none of these values change, a previously generated
+    export file is still up to date.
+    """
+    reports = Report.objects.aggregate(last_modified=Max("modification_date"), count=Count("id"))
+    emissions = Emission.objects.aggregate(last_modified=Max("modification_date"), count=Count("id"))
+    # the exports show the name and email of the gestionnaire, which can change (or the user be deleted)
+    # without any report being modified. Users have no modification date, their exported fields are hashed.
+    user_fields = Concat("id", Value(":"), "email", Value(":"), "first_name", Value(":"), "last_name")
+    users = get_user_model().objects.aggregate(
+        digest=MD5(StringAgg(user_fields, delimiter="\n", ordering="id", output_field=TextField()))
+    )
+    return "|".join(
+        [
+            str(EXPORT_CACHE_VERSION),
+            str(reports["last_modified"]),
+            str(reports["count"]),
+            str(emissions["last_modified"]),
+            str(emissions["count"]),
+            str(users["digest"]),
+            get_emission_factors().version,
+        ]
+    )
+
+
+def cached_export_path(export_format):
+    digest = hashlib.sha256(export_watermark().encode("utf-8")).hexdigest()[:32]
+    return os.path.join(settings.EXPORT_CACHE_DIR, f"{export_format}-{digest}.{export_format}")
+
+
+def write_cached_export(path, content):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # write to a temporary file first so that concurrent downloads never read a partial export
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    # only the latest file for each format can be served, remove the outdated ones
+    prefix = os.path.basename(path).split("-")[0] + "-"
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and not name.endswith(".tmp") and name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+class CachedExportMixin:
+    """
+    Serves the export from a file on disk when the data hasn't changed since it was generated.
+    The view must define `export_format`, `export_content_type` and `get_export_filename()`.
+    """
+
+    export_format = None
+    export_content_type = None
+
+    def list(self, request, *args, **kwargs):
+        path = cached_export_path(self.export_format)
+        if os.path.exists(path):
+            response = FileResponse(open(path, "rb"), content_type=self.export_content_type)
+            response["Content-Disposition"] = "attachment; filename=%s" % (self.get_export_filename())
+            return response
+        self.export_cache_path = path
+        return super().list(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        path = getattr(self, "export_cache_path", None)
+        if path and isinstance(response, Response) and response.status_code == 200:
+            response.render()
+            write_cached_export(path, response.content)
+        return response
@@ -0,0 +1,61 @@
+import re
+import zlib
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+# preferred first, zstd is faster for a better ratio when the client supports it
+ENCODINGS = [ZSTD, GZIP]
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Encodings listed in an Accept-Encoding header, without the ones refused with q=0 or
+    given an invalid q-value
+    """
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, parameters = part.strip().partition(";")
+        quality = re.search(r"q=([0-9.]+)", parameters)
+        try:
+            refused = quality is not None and float(quality.group(1)) == 0
+        except ValueError:
+            refused = True
+        if refused:
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def negotiate_encoding(accept_encoding):
+    accepted = accepted_encodings(accept_encoding or "")
+    for encoding in ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def compressor(encoding):
+    if encoding == ZSTD:
+        # imported with the first zstd response, the middleware is loaded by every process
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    # wbits 16 + MAX_WBITS writes a gzip header and trailer around the deflate stream
+    return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def compress_stream(chunks, encoding):
+    """
+    Compresses the chunks as they come, only the compressor's window is kept in memory
+    """
+    stream = compressor(encoding)
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.flush()
+
+
+def compress(content, encoding):
+    return b"".join(compress_stream([content], encoding))
@@ -0,0 +1,112 @@
+from itertools import islice
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .rows import REPORT_EXPORT_FIELDS, EMISSION_EXPORT_FIELDS
+
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+
+# each batch of rows is written as one row group, then sent to the client
+ROW_GROUP_SIZE = 50000
+
+# low cardinality text columns are stored once per row group and referenced by index
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+REPORT_COLUMN_TYPES = {
+    "siren": pa.string(),
+    "annee": pa.int16(),
+    "raison_sociale": pa.string(),
+    "region": CATEGORY,
+    "nom_region": CATEGORY,
+    "naf": CATEGORY,
+    "nom_naf": CATEGORY,
+    "nombre_salaries": pa.int32(),
+    "mode": CATEGORY,
+    "poste_1_t": pa.float64(),
+    "poste_2_t": pa.float64(),
+    "total_t": pa.float64(),
+    "statut": CATEGORY,
+    "creation_date": TIMESTAMP,
+    "publication_date": TIMESTAMP,
+    "gestionnaire_email": pa.string(),
+    "gestionnaire_first_name": pa.string(),
+    "gestionnaire_last_name": pa.string(),
+}
+
+EMISSION_COLUMN_TYPES = {
+    "siren": pa.string(),
+    "annee": pa.int16(),
+    "naf": CATEGORY,
+    "region": CATEGORY,
+    "poste": pa.int8(),
+    "type": CATEGORY,
+    "valeur": pa.float64(),
+    "unite": CATEGORY,
+    "localisation": CATEGORY,
+    "facteur_d_emission": pa.float64(),
+    "resultat": pa.float64(),
+    "note": pa.string(),
+}
+
+REPORT_SCHEMA = pa.schema([(name, REPORT_COLUMN_TYPES[name]) for name in REPORT_EXPORT_FIELDS])
+EMISSION_SCHEMA = pa.schema([(name, EMISSION_COLUMN_TYPES[name]) for name in EMISSION_EXPORT_FIELDS])
+
+
+class ChunkSink:
+    """
+    Write-only file object for ParquetWriter, keeps the bytes written until they are collected
+    """
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def collect(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def to_column(values, field):
+    if pa.types.is_floating(field.type):
+        # Decimals are converted here, the parquet export is meant for analysis rather than exact figures
+        return [float(value) if value is not None else None for value in values]
+    return list(values)
+
+
+def stream_parquet(schema, rows, row_group_size=ROW_GROUP_SIZE):
+    """
+    Yields the bytes of a parquet file for the given rows (tuples in schema order), one row group at a time
+    """
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, row_group_size))
+        if not batch:
+            break
+        columns = zip(*batch)
+        table = pa.Table.from_arrays(
+            [pa.array(to_column(values, field), type=field.type) for values, field in zip(columns, schema)],
+            schema=schema,
+        )
+        writer.write_table(table, row_group_size=row_group_size)
+        yield sink.collect()
+    writer.close()
+    yield sink.collect()
@@ -0,0 +1,63 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from django.db import connections
+from api.serializers import PrivateReportExportSerializer
+from data.bulk import attach_post_totals
+from data.models import Report
+from .renderers import PrivateReportExportRenderer
+
+CSV_LINE_END = b"\r\n"
+
+
+def report_id_partitions(partitions):
+    """
+    Splits the report ids into contiguous [first_id, last_id] ranges holding about the same number of reports
+    """
+    ids = list(Report.objects.order_by("id").values_list("id", flat=True))
+    if not ids:
+        return []
+    partitions = max(1, min(partitions, len(ids)))
+    size = len(ids) / partitions
+    bounds = []
+    for index in range(partitions):
+        first = ids[round(index * size)]
+        last = ids[round((index + 1) * size) - 1]
+        bounds.append((first, last))
+    return bounds
+
+
+def render_reports_csv(reports):
+    data = PrivateReportExportSerializer(reports, many=True).data
+    return PrivateReportExportRenderer().render(data)
+
+
+def render_partition(bounds):
+    """
+    CSV lines, without the header, of the reports in the id range. Runs in a worker process, which opens
+    its own database connection on the first query and keeps it for the following partitions.
+    """
+    first, last = bounds
+    reports = Report.objects.filter(id__gte=first, id__lte=last).select_related("gestionnaire").order_by("id")
+    content = render_reports_csv(attach_post_totals(reports))
+    header_end = content.index(CSV_LINE_END) + len(CSV_LINE_END)
+    return content[header_end:]
+
+
+def render_header():
+    return render_reports_csv([])
+
+
+def iter_partitioned_export(workers, partitions=None):
+    """
+    Yields the private reports CSV export: the header then each partition's lines, in id order,
+    rendered in parallel by a pool of processes.
+    """
+    bounds = report_id_partitions(partitions or 4 * workers)
+    yield render_header()
+    if not bounds:
+        return
+    # forked processes must not share the parent's database socket, each one opens its own connection
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        yield from executor.map(render_partition, bounds)
@@ -0,0 +1,38 @@
+from rest_framework_csv import renderers as r
+from api.serializers import PrivateReportExportSerializer, EmissionExportSerializer
+
+
+class PrivateReportExportRenderer(r.CSVRenderer):
+    header = [
+        "siren",
+        "annee",
+        "raison_sociale",
+        "region",
+        "nom_region",
+        "naf",
+        "nom_naf",
+        "nombre_salaries",
+        "mode",
+        "poste_1_t",
+        "poste_2_t",
+        "total_t",
+        "statut",
+        "creation_date",
+        "publication_date",
+        "gestionnaire_email",
+        "gestionnaire_first_name",
+        "gestionnaire_last_name",
+    ]
+    labels = {
+        **PrivateReportExportSerializer.get_labels(),
+        **{
+            "gestionnaire_email": "Email du créateur du bilan",
+            "gestionnaire_first_name": "Prénom du créateur du bilan",
+            "gestionnaire_last_name": "Nom du créateur du bilan",
+        },
+    }
+
+
+class EmissionExportRenderer(r.CSVRenderer):
+    header = ["type", "valeur", "unite", "facteur_d_emission", "resultat", "poste", "localisation", "note"]
+    labels = EmissionExportSerializer.get_labels()
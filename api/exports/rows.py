@@ -0,0 +1,134 @@
+from itertools import islice
+from django.conf import settings
+from data.bulk import attach_post_totals, resultats
+from data.emission_factors import get_emission_factors
+from data.insee_naf_division_choices import NafDivision
+from data.models import Report, Emission, FactorKey
+from data.region_choices import Region
+
+REPORT_EXPORT_FIELDS = [
+    "siren",
+    "annee",
+    "raison_sociale",
+    "region",
+    "nom_region",
+    "naf",
+    "nom_naf",
+    "nombre_salaries",
+    "mode",
+    "poste_1_t",
+    "poste_2_t",
+    "total_t",
+    "statut",
+    "creation_date",
+    "publication_date",
+    "gestionnaire_email",
+    "gestionnaire_first_name",
+    "gestionnaire_last_name",
+]
+
+EMISSION_EXPORT_FIELDS = [
+    "siren",
+    "annee",
+    "naf",
+    "region",
+    "poste",
+    "type",
+    "valeur",
+    "unite",
+    "localisation",
+    "facteur_d_emission",
+    "resultat",
+    "note",
+]
+
+
+def label(choices, value):
+    return choices(value).label if value else None
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_reports_with_totals(queryset, chunk_size):
+    reports = queryset.select_related("gestionnaire").order_by("id").iterator(chunk_size=chunk_size)
+    for chunk in chunks(reports, chunk_size):
+        yield from attach_post_totals(chunk)
+
+
+def iter_report_rows(queryset=None, chunk_size=None):
+    """
+    Yields a tuple of REPORT_EXPORT_FIELDS values for each report. The poste totals are computed
+    for a chunk of reports at a time.
+    """
+    chunk_size = chunk_size or settings.EXPORT_FETCH_SIZE
+    queryset = Report.objects.all() if queryset is None else queryset
+    for report in iter_reports_with_totals(queryset, chunk_size):
+        gestionnaire = report.gestionnaire
+        poste_1 = report.poste_1
+        poste_2 = report.poste_2
+        total = (poste_1 or 0) + (poste_2 or 0) if poste_1 is not None or poste_2 is not None else None
+        yield (
+            report.siren,
+            report.annee,
+            report.raison_sociale,
+            report.region,
+            label(Region, report.region),
+            report.naf,
+            label(NafDivision, report.naf),
+            report.nombre_salaries,
+            label(Report.CalculationMode, report.mode),
+            poste_1 / 1000 if poste_1 is not None else None,
+            poste_2 / 1000 if poste_2 is not None else None,
+            total / 1000 if total is not None else None,
+            report.statut,
+            report.creation_date,
+            report.publication_date,
+            gestionnaire.email if gestionnaire else None,
+            gestionnaire.first_name if gestionnaire else None,
+            gestionnaire.last_name if gestionnaire else None,
+        )
+
+
+def iter_emission_rows(queryset=None, chunk_size=None):
+    """
+    Yields a tuple of EMISSION_EXPORT_FIELDS values for each emission, with the report it belongs to.
+    On PostgreSQL iterator() reads through a named server-side cursor, fetching chunk_size rows at a time,
+    so memory use doesn't depend on the number of emissions.
+    """
+    chunk_size = chunk_size or settings.EXPORT_FETCH_SIZE
+    emission_factors = get_emission_factors()
+    queryset = Emission.objects.all() if queryset is None else queryset
+    values = queryset.order_by("bilan_id", "id").values_list(
+        "bilan__siren",
+        "bilan__annee",
+        "bilan__naf",
+        "bilan__region",
+        "poste",
+        "factor_key_id",
+        "valeur",
+        "note",
+    )
+    # factor key id: (type, unite, localisation, ScaledFactor)
+    keys = {}
+    for chunk in chunks(values.iterator(chunk_size=chunk_size), chunk_size):
+        # the results of a chunk are computed at once
+        valeurs = []
+        factors = []
+        for _, _, _, _, _, factor_key_id, valeur, _ in chunk:
+            if factor_key_id not in keys:
+                key = FactorKey.objects.values_of(factor_key_id)
+                keys[factor_key_id] = (*key, emission_factors.get_scaled_factor(*key))
+            valeurs.append(valeur)
+            factors.append(keys[factor_key_id][3])
+        for row, resultat in zip(chunk, resultats(valeurs, factors)):
+            siren, annee, naf, region, poste, factor_key_id, valeur, note = row
+            type, unite, localisation, factor = keys[factor_key_id]
+            factor = factor.value if factor is not None else None
+            yield (siren, annee, naf, region, poste, type, valeur, unite, localisation, factor, resultat, note)
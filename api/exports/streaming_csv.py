@@ -0,0 +1,49 @@
+import csv
+from itertools import islice
+from api.serializers.export import verbose_report_fieldname_dict, EmissionExportSerializer
+
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+
+# number of rows formatted together before being sent to the client
+ROWS_PER_CHUNK = 500
+
+
+def emission_export_labels():
+    return {
+        **verbose_report_fieldname_dict(),
+        **EmissionExportSerializer.get_labels(),
+    }
+
+
+class LineBuffer:
+    """
+    File-like object keeping what the csv writer writes until it is collected
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def collect(self):
+        data = "".join(self.lines).encode("utf-8")
+        self.lines = []
+        return data
+
+
+def stream_csv(header, labels, rows, rows_per_chunk=ROWS_PER_CHUNK):
+    """
+    Yields the encoded CSV lines for the given rows (tuples in header order), a chunk of rows at a time
+    """
+    buffer = LineBuffer()
+    writer = csv.writer(buffer)
+    writer.writerow([labels.get(field, field) for field in header])
+    yield buffer.collect()
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, rows_per_chunk))
+        if not batch:
+            return
+        writer.writerows(batch)
+        yield buffer.collect()
@@ -0,0 +1,102 @@
+# Après une mise à jour du fichier des facteurs d'émission : quels bilans voient leurs totaux changer,
+# et quelles lignes d'émission n'ont plus de facteur (type renommé, unité supprimée...).
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db import connections
+from data.bulk import post_totals
+from data.emission_factors import EmissionFactors
+from data.models import Emission, Report, FactorKey
+from .exports.partitions import report_id_partitions
+
+TOTALS_HEADER = [
+    "bilan",
+    "siren",
+    "annee",
+    "ancien_poste_1",
+    "nouveau_poste_1",
+    "ancien_poste_2",
+    "nouveau_poste_2",
+    "ancien_total",
+    "nouveau_total",
+]
+LINES_HEADER = ["bilan", "siren", "annee", "emission", "poste", "type", "unite", "localisation", "ancien_facteur"]
+
+# the factor sets of a worker process, loaded once by load_factor_sets
+factor_sets = None
+
+
+def load_factor_sets(old_path, new_path):
+    global factor_sets
+    factor_sets = (EmissionFactors(old_path), EmissionFactors(new_path))
+
+
+def totals(postes):
+    poste_1 = postes.get(1, 0)
+    poste_2 = postes.get(2, 0)
+    return poste_1, poste_2, poste_1 + poste_2
+
+
+def diff_partition(bounds):
+    """
+    Recomputes the emissions of the reports in the id range with the old and the new factors. Returns the
+    rows of the reports whose totals changed and of the emissions which no longer have a factor.
+    Runs in a worker process, after load_factor_sets.
+    """
+    old_factors, new_factors = factor_sets
+    first, last = bounds
+    emissions = Emission.objects.filter(bilan_id__gte=first, bilan_id__lte=last).order_by("bilan_id", "id")
+    columns = {"report_ids": [], "postes": [], "valeurs": [], "old": [], "new": []}
+    reports = {}
+    lines = []
+    values = emissions.values_list(
+        "bilan_id",
+        "bilan__siren",
+        "bilan__annee",
+        "bilan__mode",
+        "id",
+        "poste",
+        "factor_key_id",
+        "valeur",
+    )
+    for report_id, siren, annee, mode, id, poste, factor_key_id, valeur in values.iterator(
+        chunk_size=settings.EXPORT_FETCH_SIZE
+    ):
+        type, unite, localisation = FactorKey.objects.values_of(factor_key_id)
+        old_factor = old_factors.get_scaled_factor(type, unite, localisation)
+        new_factor = new_factors.get_scaled_factor(type, unite, localisation)
+        if old_factor is not None and new_factor is None:
+            lines.append([report_id, siren, annee, id, poste, type, unite, localisation, old_factor.value])
+        # the totals of reports in manual mode are declared, they don't depend on the factors
+        if mode == Report.CalculationMode.MANUAL:
+            continue
+        reports[report_id] = (siren, annee)
+        for name, value in zip(columns, (report_id, poste, valeur, old_factor, new_factor)):
+            columns[name].append(value)
+
+    old_totals = post_totals(columns["report_ids"], columns["postes"], columns["valeurs"], columns["old"])
+    new_totals = post_totals(columns["report_ids"], columns["postes"], columns["valeurs"], columns["new"])
+    changed = []
+    for report_id, (siren, annee) in reports.items():
+        old = totals(old_totals.get(report_id, {}))
+        new = totals(new_totals.get(report_id, {}))
+        if old != new:
+            changed.append([report_id, siren, annee] + [value for pair in zip(old, new) for value in pair])
+    return changed, lines
+
+
+def iter_factor_diff(old_path, new_path, workers, partitions=None):
+    """
+    Yields the (changed totals, unresolvable lines) of each partition of the reports, in id order,
+    computed in parallel by a pool of processes
+    """
+    bounds = report_id_partitions(partitions or 4 * workers)
+    if not bounds:
+        return
+    # forked processes must not share the parent's database socket, each one opens its own connection
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=load_factor_sets, initargs=(old_path, new_path)
+    ) as executor:
+        yield from executor.map(diff_partition, bounds)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Run a performance measurement, see api/benchmarks.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(BENCHMARKS.keys()))
+        parser.add_argument("--rows", type=int, help="Size of the synthetic dataset")
+        parser.add_argument("--workers", type=int, help="Number of parallel workers")
+
+    def handle(self, *args, **options):
+        parameters = {name: options[name] for name in ["rows", "workers"] if options[name]}
+        for line in BENCHMARKS[options["name"]](**parameters):
+            self.stdout.write(line)
@@ -0,0 +1,22 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from data.emission_factors import compile_factors, FACTORS_FILE, COMPILED_FILE, TABLE_FILE
+
+
+class Command(BaseCommand):
+    help = "Validate the emission factors file and write the prebuilt lookups loaded by the workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default=FACTORS_FILE, help="Path of the emission factors JSON file")
+        parser.add_argument("--output", default=COMPILED_FILE, help="Path of the compiled file")
+        parser.add_argument("--table", default=TABLE_FILE, help="Path of the factor table mapped by the workers")
+
+    def handle(self, *args, **options):
+        try:
+            payload = compile_factors(options["source"], options["output"], options["table"])
+        except ValueError as error:
+            raise CommandError(f"Invalid emission factors:\n{error}")
+        size = os.path.getsize(options["output"])
+        self.stdout.write(
+            f"Compiled {len(payload['emission_factors'])} emission factors to {options['output']} ({size} bytes)"
+        )
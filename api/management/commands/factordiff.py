@@ -0,0 +1,38 @@
+import csv
+import os
+from django.core.management.base import BaseCommand
+from api.factor_diff import iter_factor_diff, TOTALS_HEADER, LINES_HEADER
+from data.emission_factors import FACTORS_FILE
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute all the emissions with an old and a new emission factors file, and write the reports whose "
+        "totals change and the emissions which no longer have a factor"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("old", help="Path of the previous emission factors file")
+        parser.add_argument("--new", default=FACTORS_FILE, help="Path of the new file, the current one by default")
+        parser.add_argument("--output-dir", default=".", help="Directory where the CSV files are written")
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--partitions", type=int, help="Number of report id ranges, 4 per worker by default")
+
+    def handle(self, *args, **options):
+        totals_path = os.path.join(options["output_dir"], "factordiff_totaux.csv")
+        lines_path = os.path.join(options["output_dir"], "factordiff_lignes.csv")
+        changed_reports = 0
+        unresolvable_lines = 0
+        with open(totals_path, "w", newline="") as totals_file, open(lines_path, "w", newline="") as lines_file:
+            totals = csv.writer(totals_file)
+            lines = csv.writer(lines_file)
+            totals.writerow(TOTALS_HEADER)
+            lines.writerow(LINES_HEADER)
+            diff = iter_factor_diff(options["old"], options["new"], options["workers"], options["partitions"])
+            for changed, unresolvable in diff:
+                totals.writerows(changed)
+                lines.writerows(unresolvable)
+                changed_reports += len(changed)
+                unresolvable_lines += len(unresolvable)
+        self.stdout.write(f"{changed_reports} reports with changed totals written to {totals_path}")
+        self.stdout.write(f"{unresolvable_lines} emissions without a factor any more written to {lines_path}")
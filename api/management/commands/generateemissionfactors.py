@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from data.base_carbone import PageFetcher
+from data.factor_etl import read_csv_lines, select_columns, write_factors_file, EXTRACT_FILE, POSTS_FILE
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the emission factors file from the Base Carbone, see data/factor_etl.py for how to update "
+        "data/static/emission-factors.json with it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--csv", default=EXTRACT_FILE, help="Path of a Base Carbone CSV export")
+        parser.add_argument("--fetch", action="store_true", help="Read the lines from the ADEME API instead")
+        parser.add_argument(
+            "--refresh", action="store_true", help="With --fetch, request again the pages kept by an interrupted run"
+        )
+        parser.add_argument("--posts", default=POSTS_FILE, help="Path of the poste and groupe of each type")
+        parser.add_argument("--output", default="auto-emission-factors.json")
+
+    def handle(self, *args, **options):
+        if options["fetch"]:
+            fetcher = PageFetcher()
+            if options["refresh"]:
+                fetcher.clear_cache()
+            report = write_factors_file(select_columns(fetcher.lines()), options["output"], options["posts"])
+            # the pages are only kept to resume an interrupted run, the next one reads the dataset again
+            fetcher.clear_cache()
+        else:
+            with open(options["csv"], "r", encoding="utf8") as csvfile:
+                report = write_factors_file(read_csv_lines(csvfile), options["output"], options["posts"])
+        for line in report:
+            self.stdout.write(line)
@@ -0,0 +1,52 @@
+from itertools import islice
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from data.models import Report, Emission, PublicationSnapshot, publication_snapshot_values
+from data.synthetic import synthetic_reports, synthetic_emissions
+
+BATCH_SIZE = 5000
+
+
+def bulk_create_in_batches(model, objects):
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return
+        yield from model.objects.bulk_create(batch)
+
+
+def publication_snapshots(report_ids):
+    """
+    bulk_create doesn't go through Report.save, the snapshots of the published reports are made here
+    """
+    published = Report.objects.filter(id__in=report_ids, statut=Report.Status.PUBLISHED)
+    for report in published.prefetch_related("emission_set"):
+        yield PublicationSnapshot(bilan=report, **publication_snapshot_values(report, report.emission_set.all()))
+
+
+def generate_synthetic_data(reports, emissions_per_report, seed=0):
+    with transaction.atomic():
+        # start after the existing reports so that the command can be run several times without SIREN clashes
+        first_siren = 10000000 + Report.objects.count()
+        new_reports = synthetic_reports(reports, seed=seed, first_siren=first_siren)
+        report_ids = [report.id for report in bulk_create_in_batches(Report, new_reports)]
+        emissions = synthetic_emissions(report_ids, emissions_per_report, seed=seed)
+        emission_count = sum(1 for _ in bulk_create_in_batches(Emission, emissions))
+        for _ in bulk_create_in_batches(PublicationSnapshot, publication_snapshots(report_ids)):
+            pass
+    return len(report_ids), emission_count
+
+
+class Command(BaseCommand):
+    help = "Fill the database with generated reports and emissions, for performance measurements"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reports", type=int, default=1000)
+        parser.add_argument("--emissions-per-report", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        reports, emissions = generate_synthetic_data(
+            options["reports"], options["emissions_per_report"], seed=options["seed"]
+        )
+        self.stdout.write(f"Created {reports} reports and {emissions} emissions")
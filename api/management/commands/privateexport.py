@@ -0,0 +1,20 @@
+import os
+from django.core.management.base import BaseCommand
+from api.exports import iter_partitioned_export
+from data.replica import replica_reads
+
+
+class Command(BaseCommand):
+    help = "Write the private reports CSV export to a file, rendered in parallel by several processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path of the CSV file to write")
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--partitions", type=int, help="Number of report id ranges, 4 per worker by default")
+
+    def handle(self, *args, **options):
+        # the forked workers keep reading from the database chosen here
+        with replica_reads(), open(options["output"], "wb") as output:
+            for chunk in iter_partitioned_export(options["workers"], options["partitions"]):
+                output.write(chunk)
+        self.stdout.write(f"Export written to {options['output']}")
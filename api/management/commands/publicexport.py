@@ -2,7 +2,8 @@ import requests
 from django.conf import settings
 from rest_framework_csv import renderers as r
 from api.serializers import PublicReportExportSerializer
-from data.models import Report
+from data.models import PublicationSnapshot
+from data.replica import replica_reads
 from django.core.management.base import BaseCommand
 
 
@@ -26,12 +27,12 @@ class ExportRenderer(r.CSVRenderer):
 
 def update_public_export():
     print("Updating public export...")
-    published_reports = Report.objects.filter(statut=Report.Status.PUBLISHED)
-    if published_reports.count() == 0:
+    snapshots = PublicationSnapshot.objects.order_by("bilan_id")
+    if snapshots.count() == 0:
         print("No published reports to send.")
         return
 
-    serializer = PublicReportExportSerializer(published_reports, many=True)
+    serializer = PublicReportExportSerializer(snapshots, many=True)
     rendered_data = ExportRenderer().render(serializer.data)
     files = {"file": ("report.csv", rendered_data)}
 
@@ -45,4 +46,5 @@ class Command(BaseCommand):
     help = "Update public export"
 
     def handle(self, *args, **options):
-        update_public_export()
+        with replica_reads():
+            update_public_export()
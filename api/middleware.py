@@ -0,0 +1,46 @@
+from django.utils.cache import patch_vary_headers
+from api.exports.compression import compress, compress_stream, negotiate_encoding, GZIP
+
+GZIP_CONTENT_TYPE = "application/gzip"
+
+
+class ExportCompressionMiddleware:
+    """
+    Compresses the CSV exports, chunk by chunk for streamed responses.
+    Clients get zstd or gzip Content-Encoding depending on Accept-Encoding, or a .csv.gz file
+    when requesting `?compression=gzip`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.status_code != 200 or not response.get("Content-Type", "").startswith("text/csv"):
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+
+        if request.GET.get("compression") == GZIP:
+            self.compress_response(response, GZIP)
+            response["Content-Type"] = GZIP_CONTENT_TYPE
+            disposition = response.get("Content-Disposition")
+            if disposition:
+                response["Content-Disposition"] = f"{disposition}.gz"
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate_encoding(request.META.get("HTTP_ACCEPT_ENCODING"))
+        if encoding:
+            self.compress_response(response, encoding)
+            response["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def compress_response(response, encoding):
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response["Content-Length"]
+        else:
+            response.content = compress(response.content, encoding)
+            response["Content-Length"] = str(len(response.content))
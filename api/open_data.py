@@ -0,0 +1,77 @@
+# Données publiques : les bilans publiés, servis depuis un instantané en mémoire plutôt que depuis la BDD
+# pour que le trafic public n'ait pas d'impact sur l'API utilisée par les entreprises.
+import hashlib
+import time
+from bisect import bisect_right
+from django.conf import settings
+from api.exports import export_watermark
+from api.serializers import PublicReportExportSerializer
+from data.models import PublicationSnapshot
+from data.replica import replica_reads
+
+FILTERS = ["siren", "annee", "region", "naf"]
+
+
+class PublicReportsSnapshot:
+    """
+    Serialized published reports ordered by id, with the positions of the reports for each filter value
+    """
+
+    def __init__(self, version, ids, rows):
+        self.version = version
+        self.ids = ids
+        self.rows = rows
+        self.positions = {name: {} for name in FILTERS}
+        for position, row in enumerate(rows):
+            for name in FILTERS:
+                self.positions[name].setdefault(str(row[name]), []).append(position)
+
+    def page(self, filters, after=None, limit=100):
+        """
+        Returns the rows matching the filters with an id greater than `after`, and the cursor of the next page
+        """
+        start = bisect_right(self.ids, after) if after is not None else 0
+        selected = None
+        for name, value in filters.items():
+            positions = self.positions[name].get(str(value), [])
+            selected = set(positions) if selected is None else selected.intersection(positions)
+        if selected is None:
+            positions = range(start, len(self.rows))
+        else:
+            positions = sorted(position for position in selected if position >= start)
+        page = [self.rows[position] for position in positions[:limit]]
+        if len(positions) > limit:
+            return page, self.ids[positions[limit - 1]]
+        return page, None
+
+
+def build_snapshot(version):
+    # a single table scan: the published figures are frozen in the publication snapshots
+    snapshots = PublicationSnapshot.objects.order_by("bilan_id").defer("emissions")
+    ids = []
+    rows = []
+    for published in snapshots.iterator(chunk_size=settings.EXPORT_FETCH_SIZE):
+        ids.append(published.bilan_id)
+        rows.append(dict(PublicReportExportSerializer(published).data))
+    return PublicReportsSnapshot(version, ids, rows)
+
+
+snapshot = None
+snapshot_checked_at = None
+
+
+def get_snapshot():
+    """
+    The snapshot is rebuilt, from the replica, when the data has changed. The data is checked at most every
+    OPEN_DATA_SNAPSHOT_TTL seconds, whatever the number of requests.
+    """
+    global snapshot, snapshot_checked_at
+    now = time.monotonic()
+    if snapshot is not None and now - snapshot_checked_at < settings.OPEN_DATA_SNAPSHOT_TTL:
+        return snapshot
+    with replica_reads():
+        version = hashlib.sha256(export_watermark().encode("utf-8")).hexdigest()[:32]
+        if snapshot is None or snapshot.version != version:
+            snapshot = build_snapshot(version)
+    snapshot_checked_at = now
+    return snapshot
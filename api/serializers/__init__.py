@@ -2,3 +2,5 @@ from .user import UserSerializer  # noqa: F401
 from .report import ReportSerializer  # noqa: F401
 from .emission import EmissionSerializer  # noqa: F401
 from .export import PrivateReportExportSerializer, PublicReportExportSerializer, EmissionExportSerializer  # noqa: F401
+from .changes import ReportChangeSerializer, EmissionChangeSerializer, TombstoneSerializer  # noqa: F401
+from .calculation import CalculationSerializer  # noqa: F401
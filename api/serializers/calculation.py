@@ -0,0 +1,23 @@
+from rest_framework import serializers
+from data.models import FactorKey
+
+
+class EmissionCalculationSerializer(serializers.Serializer):
+    """
+    An emission which is not saved, with the same constraints as the Emission model
+    """
+
+    type = serializers.CharField(max_length=FactorKey._meta.get_field("type").max_length)
+    unite = serializers.CharField(max_length=FactorKey._meta.get_field("unite").max_length)
+    localisation = serializers.CharField(
+        max_length=FactorKey._meta.get_field("localisation").max_length,
+        required=False,
+        allow_null=True,
+        allow_blank=True,
+    )
+    valeur = serializers.DecimalField(max_digits=10, decimal_places=2)
+    poste = serializers.IntegerField()
+
+
+class CalculationSerializer(serializers.Serializer):
+    emissions = EmissionCalculationSerializer(many=True, allow_empty=True, max_length=1000)
@@ -0,0 +1,53 @@
+from rest_framework import serializers
+from data.models import Report, Emission, Tombstone
+
+
+class ReportChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Report
+        fields = [
+            "id",
+            "siren",
+            "annee",
+            "raison_sociale",
+            "naf",
+            "nombre_salaries",
+            "region",
+            "statut",
+            "mode",
+            "poste_1",
+            "poste_2",
+            "total",
+            "creation_date",
+            "modification_date",
+            "publication_date",
+        ]
+        read_only_fields = fields
+
+
+class EmissionChangeSerializer(serializers.ModelSerializer):
+    facteur_d_emission = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Emission
+        fields = [
+            "id",
+            "bilan",
+            "poste",
+            "type",
+            "localisation",
+            "valeur",
+            "unite",
+            "note",
+            "facteur_d_emission",
+            "resultat",
+            "modification_date",
+        ]
+        read_only_fields = fields
+
+
+class TombstoneSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tombstone
+        fields = ["kind", "object_id", "deletion_date"]
+        read_only_fields = fields
@@ -1,8 +1,18 @@
 from rest_framework import serializers
-from data.models import Emission
+from data.models import Emission, FactorKey
 
 
 class EmissionSerializer(serializers.ModelSerializer):
+    # stored in the factor key of the emission
+    type = serializers.CharField(max_length=FactorKey._meta.get_field("type").max_length)
+    unite = serializers.CharField(max_length=FactorKey._meta.get_field("unite").max_length)
+    localisation = serializers.CharField(
+        max_length=FactorKey._meta.get_field("localisation").max_length,
+        required=False,
+        allow_null=True,
+        allow_blank=True,
+    )
+
     class Meta:
         model = Emission
         fields = [
@@ -1,11 +1,14 @@
+from functools import lru_cache
 from rest_framework import serializers
 from data.insee_naf_division_choices import NafDivision
-from data.models import Report, Emission
+from data.models import Report, Emission, FactorKey, PublicationSnapshot
 from data.region_choices import Region
 
 
 # TODO: see if can check serializer label as well to avoid repetition of names between CSV and XLSX export types
 # https://github.com/mjumbewu/django-rest-framework-csv/issues/14#issuecomment-534566844
+# the labels of a model don't change while running, their dict is shared by the exports
+@lru_cache(maxsize=None)
 def verbose_fieldname_dict(model):
     return {
         f.name: (f.verbose_name[0].upper() + f.verbose_name[1:]) for f in model._meta.fields + model._meta.many_to_many
@@ -77,11 +80,15 @@ class PrivateReportExportSerializer(serializers.ModelSerializer):
 
 
 class PublicReportExportSerializer(serializers.ModelSerializer):
+    """
+    Reads the publication snapshots, the figures are the ones of the day of publication
+    """
+
     nom_naf = serializers.CharField(source="naf", read_only=True)
     nom_region = serializers.CharField(source="region", read_only=True)
 
     class Meta:
-        model = Report
+        model = PublicationSnapshot
         fields = [
             "siren",
             "raison_sociale",
@@ -122,6 +129,8 @@ class EmissionExportSerializer(serializers.ModelSerializer):
 
     def get_labels():
         return {
+            # type, unite and localisation are stored in the factor key
+            **verbose_fieldname_dict(FactorKey),
             **verbose_fieldname_dict(Emission),
             **{"resultat": "Résultat kgCO2e", "facteur_d_emission": "Facteur d'émission"},
         }
@@ -0,0 +1,158 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from io import StringIO
+from unittest.mock import patch
+import requests
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from data.base_carbone import PageFetcher, FACTOR_QUERY
+
+EXTRACT_FILE = os.path.join(settings.BASE_DIR, "scripts/files/Base.Carbone.V20.2_Extrait.BCS-1.csv")
+
+
+def recorded_lines():
+    """
+    The lines of the Base Carbone extract, as the data-fair API gives them
+    """
+    with open(EXTRACT_FILE, encoding="utf8") as f:
+        return [{key.replace(" ", "_"): value for key, value in row.items()} for row in csv.DictReader(f)]
+
+
+class StubDataFair(ThreadingHTTPServer):
+    """
+    Replays the lines page by page, keeping track of the requests
+    """
+
+    def __init__(self, lines):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.lines = lines
+        self.failing_pages = set()
+        self.requests = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/lines"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        parameters = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+        page, size = int(parameters["page"]), int(parameters["size"])
+        with server.lock:
+            server.requests.append(parameters)
+            server.running += 1
+            server.max_running = max(server.max_running, server.running)
+        # long enough for the requests of the other threads to overlap
+        time.sleep(0.02)
+        with server.lock:
+            server.running -= 1
+        if page in server.failing_pages:
+            self.send_response(503)
+            self.end_headers()
+            return
+        start, end = (page - 1) * size, page * size
+        body = {"total": len(server.lines), "results": server.lines[start:end]}
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBaseCarboneFetcher(SimpleTestCase):
+    def setUp(self):
+        self.lines = recorded_lines()
+        self.server = StubDataFair(self.lines)
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+
+    def fetcher(self, **options):
+        return PageFetcher(url=self.server.url, cache_dir=self.cache_dir, page_size=100, retry_delay=0, **options)
+
+    def requested_pages(self):
+        return sorted(int(parameters["page"]) for parameters in self.server.requests)
+
+    def test_fetch_pages(self):
+        """
+        Test that all the pages are fetched, in order, with the query of the factors and at most `workers` at once
+        """
+        self.assertEqual(list(self.fetcher(workers=2).lines()), self.lines)
+        self.assertEqual(self.requested_pages(), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.server.max_running, 2)
+        for name, value in FACTOR_QUERY.items():
+            self.assertEqual(self.server.requests[0][name], value)
+
+    def test_cached_pages(self):
+        """
+        Test that the pages already fetched are read from the disk
+        """
+        list(self.fetcher().lines())
+        self.server.requests.clear()
+        self.assertEqual(list(self.fetcher().lines()), self.lines)
+        self.assertEqual(self.server.requests, [])
+
+        # unless the cache is cleared, or another page size is asked for
+        fetcher = self.fetcher()
+        fetcher.clear_cache()
+        list(fetcher.lines())
+        self.assertEqual(self.requested_pages(), [1, 2, 3, 4, 5, 6])
+        self.server.requests.clear()
+        list(PageFetcher(url=self.server.url, cache_dir=self.cache_dir, page_size=200).lines())
+        self.assertEqual(self.requested_pages(), [1, 2, 3])
+
+    def test_expired_pages(self):
+        """
+        Test that the pages cached for longer than cache_max_age are requested again
+        """
+        list(self.fetcher().lines())
+        self.server.requests.clear()
+        list(self.fetcher(cache_max_age=0).lines())
+        self.assertEqual(self.requested_pages(), [1, 2, 3, 4, 5, 6])
+
+    def test_command_clears_cache(self):
+        """
+        Test that generateemissionfactors --fetch forgets the pages once the file is written, and before
+        fetching them with --refresh
+        """
+        fetcher = self.fetcher()
+        output = os.path.join(self.cache_dir, "factors.json")
+        with patch("api.management.commands.generateemissionfactors.PageFetcher", return_value=fetcher):
+            fetcher.page(1)
+            self.server.requests.clear()
+            call_command("generateemissionfactors", "--fetch", "--refresh", "--output", output, stdout=StringIO())
+        self.assertEqual(self.requested_pages(), [1, 2, 3, 4, 5, 6])
+        self.assertTrue(os.path.exists(output))
+        self.assertFalse(os.listdir(fetcher.cache_dir))
+
+    def test_resume(self):
+        """
+        Test that a failing page is retried, and that the next run only fetches the pages that are missing
+        """
+        self.server.failing_pages = {4}
+        with self.assertRaises(requests.HTTPError):
+            list(self.fetcher().lines())
+        self.assertEqual(self.requested_pages(), [1, 2, 3, 4, 4, 4, 5, 6])
+
+        self.server.failing_pages = set()
+        self.server.requests.clear()
+        self.assertEqual(list(self.fetcher().lines()), self.lines)
+        self.assertEqual(self.requested_pages(), [4])
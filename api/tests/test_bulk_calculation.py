@@ -0,0 +1,96 @@
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from data.bulk import resultats, post_totals, attach_post_totals
+from data.emission_factors import get_emission_factors, scale_factor
+from data.models import Report, compute_resultat, sum_results
+from data.synthetic import synthetic_emission_values
+
+
+def synthetic_columns(count, seed=0):
+    emission_factors = get_emission_factors()
+    columns = {"report_ids": [], "postes": [], "valeurs": [], "factors": []}
+    for index, (poste, type, valeur, unite, localisation) in enumerate(synthetic_emission_values(count, seed=seed)):
+        columns["report_ids"].append(index // 20)
+        columns["postes"].append(poste)
+        columns["valeurs"].append(valeur)
+        columns["factors"].append(emission_factors.get_scaled_factor(type, unite, localisation))
+    return columns
+
+
+def value(factor):
+    return factor.value if factor is not None else None
+
+
+class TestBulkCalculation(SimpleTestCase):
+    def test_same_results_as_decimal(self):
+        """
+        Test that the batch results are identical to compute_resultat on the synthetic emissions
+        """
+        columns = synthetic_columns(20000)
+        expected = [compute_resultat(v, value(f)) for v, f in zip(columns["valeurs"], columns["factors"])]
+        self.assertEqual(resultats(columns["valeurs"], columns["factors"]), expected)
+        # same representation too, as the exports write them
+        self.assertEqual([str(r) for r in resultats(columns["valeurs"], columns["factors"])], list(map(str, expected)))
+
+    def test_same_totals_as_decimal(self):
+        """
+        Test that the totals by report and poste are identical to Report.sum_post on the synthetic emissions
+        """
+        columns = synthetic_columns(20000, seed=1)
+        expected = {}
+        for report_id, poste, valeur, factor in zip(*columns.values()):
+            expected.setdefault(report_id, {}).setdefault(poste, []).append(compute_resultat(valeur, value(factor)))
+        expected = {
+            report_id: {poste: sum_results(results) for poste, results in postes.items()}
+            for report_id, postes in expected.items()
+        }
+        self.assertEqual(post_totals(*columns.values()), expected)
+
+    def test_rounding_edge_cases(self):
+        """
+        Test halves, negative values, missing and zero factors, and products too large for 64 bit integers
+        """
+        valeurs = [Decimal(v) for v in ["0.25", "-0.25", "0.05", "-0.04", "1.00", "3.00", "99999999.99", "12.34"]]
+        factors = [
+            scale_factor(Decimal(f)) if f else None
+            for f in ["0.2", "0.2", "1", "1", None, "0", "4637.123456", "8.80E-03"]
+        ]
+        expected = [compute_resultat(v, value(f)) for v, f in zip(valeurs, factors)]
+        self.assertEqual([str(r) for r in resultats(valeurs, factors)], [str(r) for r in expected])
+
+        report_ids = [1, 1, 1, 2, 2, 2, 3, 3]
+        postes = [1, 1, 1, 1, 2, 2, 1, 2]
+        self.assertEqual(
+            post_totals(report_ids, postes, valeurs, factors),
+            {1: {1: 0}, 2: {1: 0, 2: 0}, 3: {1: sum_results([expected[6]]), 2: 0}},
+        )
+        self.assertEqual(post_totals([], [], [], []), {})
+
+    def test_any_poste(self):
+        """
+        Test that negative and very large postes stay in their own report and poste
+        """
+        report_ids = [9, 9, 10, 10, 11]
+        postes = [2, 1, -1, 2**62, 2]
+        valeurs = [Decimal("1.00"), Decimal("2.00"), Decimal("30.00"), Decimal("400.00"), Decimal("5000.00")]
+        factors = [scale_factor(Decimal("1"))] * 5
+        self.assertEqual(
+            post_totals(report_ids, postes, valeurs, factors),
+            {9: {1: 2, 2: 1}, 10: {-1: 30, 2**62: 400}, 11: {2: 5000}},
+        )
+
+
+class TestAttachPostTotals(TestCase):
+    def test_same_totals_as_reports(self):
+        """
+        Test that the totals computed in bulk are the ones of each report, and are read by Report.sum_post
+        """
+        call_command("generatesyntheticdata", reports=30, emissions_per_report=10, stdout=None)
+        reports = Report.objects.order_by("id")
+        expected = [(report.poste_1, report.poste_2, report.total) for report in reports]
+
+        with self.assertNumQueries(2):
+            reports = attach_post_totals(Report.objects.order_by("id"))
+            totals = [(report.poste_1, report.poste_2, report.total) for report in reports]
+        self.assertEqual(totals, expected)
@@ -0,0 +1,88 @@
+from decimal import Decimal
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from data.factories import ReportFactory, EmissionFactory
+from .utils import override_emission_factors
+
+example_emission_factors = {
+    "Gaz naturel": {
+        "facteurs": {
+            "France continentale": {
+                "kgCO2e/GJ PCI": "0.5",
+            },
+            "Guadeloupe, Martinique, Guyane, Corse": {
+                "kgCO2e/GJ PCI": "2",
+            },
+        },
+        "classification": None,
+    },
+    "Essence, E10": {
+        "facteurs": {
+            "France continentale": {
+                "kgCO2e/kg": "0.15",
+            },
+        },
+        "classification": "carburant",
+    },
+}
+
+emissions = [
+    {"type": "Gaz naturel", "unite": "GJ PCI", "localisation": "France continentale", "valeur": "10.1", "poste": 1},
+    {
+        "type": "Gaz naturel",
+        "unite": "GJ PCI",
+        "localisation": "Guadeloupe, Martinique, Guyane, Corse",
+        "valeur": "0.25",
+        "poste": 1,
+    },
+    # single location, used whatever the location given
+    {"type": "Essence, E10", "unite": "kg", "localisation": "Corse", "valeur": "3", "poste": 2},
+    {"type": "Essence, E10", "unite": "kg", "localisation": None, "valeur": "0.3", "poste": 2},
+    # no factor for this unit
+    {"type": "Essence, E10", "unite": "litre", "localisation": None, "valeur": "100", "poste": 2},
+]
+
+
+@override_emission_factors(example_emission_factors)
+class TestCalculationApi(APITestCase):
+    def test_calculation(self):
+        """
+        Test that results and totals are returned without any database access
+        """
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse("calculation"), {"emissions": emissions}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.json()
+        self.assertEqual([e["resultat"] for e in body["emissions"]], [5.1, 0.5, 0.5, 0.0, None])
+        self.assertEqual([e["facteurDEmission"] for e in body["emissions"]], [0.5, 2, 0.15, 0.15, None])
+        self.assertEqual(body["emissions"][2]["classification"], "carburant")
+        self.assertEqual((body["poste1"], body["poste2"], body["total"]), (6, 1, 7))
+
+    def test_same_results_as_saved_emissions(self):
+        """
+        Test that the calculation gives the same figures as a saved report with the same emissions
+        """
+        report = ReportFactory.create()
+        saved = [
+            EmissionFactory.create(bilan=report, **{**emission, "valeur": Decimal(emission["valeur"])})
+            for emission in emissions
+        ]
+
+        body = self.client.post(reverse("calculation"), {"emissions": emissions}, format="json").json()
+
+        for emission, result in zip(saved, body["emissions"]):
+            emission.refresh_from_db()
+            expected = emission.resultat
+            self.assertEqual(result["resultat"], float(expected) if expected is not None else None)
+        self.assertEqual(
+            (body["poste1"], body["poste2"], body["total"]), (report.poste_1, report.poste_2, report.total)
+        )
+
+    def test_invalid_emissions(self):
+        invalid = [{**emissions[0], "valeur": "1.234"}]
+        response = self.client.post(reverse("calculation"), {"emissions": invalid}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse("calculation"), {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
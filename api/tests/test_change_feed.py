@@ -0,0 +1,141 @@
+from datetime import timedelta
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from data.factories import ReportFactory, EmissionFactory
+from data.models import Report, Emission, Tombstone
+from .utils import authenticate, authenticate_staff
+
+
+# the changes are served as soon as they are made, see test_recent_changes_held_back for the lag
+@override_settings(CHANGE_FEED_LAG=0)
+class TestChangeFeed(APITestCase):
+    @authenticate_staff
+    def test_changes_since_cursor(self):
+        """
+        Test that only the reports modified since the cursor are returned, in modification order
+        """
+        first = ReportFactory.create()
+        second = ReportFactory.create()
+
+        body = self.client.get(reverse("changes")).json()
+        self.assertEqual([report["id"] for report in body["reports"]], [first.id, second.id])
+        self.assertFalse(body["hasMore"])
+        self.assertNotIn("emissions", body)
+
+        body = self.client.get(reverse("changes"), {"cursor": body["cursor"]}).json()
+        self.assertEqual(body["reports"], [])
+
+        first.raison_sociale = "New name"
+        first.save()
+        third = ReportFactory.create()
+        body = self.client.get(reverse("changes"), {"cursor": body["cursor"]}).json()
+        self.assertEqual([report["id"] for report in body["reports"]], [first.id, third.id])
+        self.assertEqual(body["reports"][0]["raisonSociale"], "New name")
+
+    @authenticate_staff
+    def test_pages(self):
+        """
+        Test that the limit gives pages which together hold every change once
+        """
+        reports = [ReportFactory.create() for _ in range(5)]
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            body = self.client.get(reverse("changes"), params).json()
+            seen += [report["id"] for report in body["reports"]]
+            cursor = body["cursor"]
+            if not body["hasMore"]:
+                break
+        self.assertEqual(seen, [report.id for report in reports])
+
+    @authenticate_staff
+    def test_emissions_and_deletions(self):
+        """
+        Test that emissions are included on demand and deletions are reported with tombstones
+        """
+        report = ReportFactory.create()
+        emission = EmissionFactory.create(bilan=report)
+        cursor = self.client.get(reverse("changes"), {"include": "emissions"}).json()["cursor"]
+
+        other_emission = EmissionFactory.create(bilan=report)
+        emission_id = emission.id
+        emission.delete()
+
+        body = self.client.get(reverse("changes"), {"include": "emissions", "cursor": cursor}).json()
+        self.assertEqual([e["id"] for e in body["emissions"]], [other_emission.id])
+        self.assertEqual(
+            [(tombstone["kind"], tombstone["objectId"]) for tombstone in body["deleted"]],
+            [(Tombstone.Kind.EMISSION, emission_id)],
+        )
+
+        report_id = report.id
+        report.delete()
+        body = self.client.get(reverse("changes"), {"include": "emissions", "cursor": body["cursor"]}).json()
+        self.assertEqual(body["emissions"], [])
+        deleted = {(tombstone["kind"], tombstone["objectId"]) for tombstone in body["deleted"]}
+        self.assertEqual(deleted, {(Tombstone.Kind.REPORT, report_id), (Tombstone.Kind.EMISSION, other_emission.id)})
+
+    @authenticate_staff
+    def test_report_totals(self):
+        """
+        Test that a report is listed again when its emissions change its totals, and that the totals of a page
+        are computed in bulk
+        """
+        report = ReportFactory.create()
+        cursor = self.client.get(reverse("changes")).json()["cursor"]
+
+        emission = EmissionFactory.create(bilan=report, poste=1)
+        body = self.client.get(reverse("changes"), {"cursor": cursor}).json()
+        self.assertEqual([changed["id"] for changed in body["reports"]], [report.id])
+
+        emission.delete()
+        body = self.client.get(reverse("changes"), {"cursor": body["cursor"]}).json()
+        self.assertEqual([changed["id"] for changed in body["reports"]], [report.id])
+
+        Emission.objects.bulk_create([Emission(bilan=report, poste=1, type="Fioul", valeur=1, unite="litre")])
+        body = self.client.get(reverse("changes"), {"cursor": body["cursor"]}).json()
+        self.assertEqual([changed["id"] for changed in body["reports"]], [report.id])
+
+        for _ in range(5):
+            EmissionFactory.create(bilan=ReportFactory.create())
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.get(reverse("changes")).json()
+        self.assertEqual(len(body["reports"]), 6)
+        self.assertLess(len(queries), 12)
+
+    @authenticate_staff
+    @override_settings(CHANGE_FEED_LAG=60)
+    def test_recent_changes_held_back(self):
+        """
+        Test that the changes are only served once older than CHANGE_FEED_LAG, so that the cursor doesn't pass
+        the date of a change which could still be committed
+        """
+        now = timezone.now()
+        old = ReportFactory.create()
+        Report.objects.filter(id=old.id).update(modification_date=now - timedelta(seconds=90))
+        late = ReportFactory.create()
+        body = self.client.get(reverse("changes")).json()
+        self.assertEqual([report["id"] for report in body["reports"]], [old.id])
+
+        # the lag has passed
+        Report.objects.filter(id=late.id).update(modification_date=now - timedelta(seconds=70))
+        body = self.client.get(reverse("changes"), {"cursor": body["cursor"]}).json()
+        self.assertEqual([report["id"] for report in body["reports"]], [late.id])
+
+    @authenticate_staff
+    def test_invalid_cursor(self):
+        # not base64, then valid JSON which isn't an object
+        for cursor in ["not a cursor", "W10=", "NDI=", "eyJyZXBvcnRzIjogNDJ9"]:
+            response = self.client.get(reverse("changes"), {"cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, cursor)
+
+    @authenticate
+    def test_only_staff_access(self):
+        response = self.client.get(reverse("changes"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,153 @@
+import json
+import os
+import pickle
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from data.emission_factors import EmissionFactors, compile_factors
+
+
+class TestCompiledEmissionFactors(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.compiled_path = os.path.join(self.directory, "compiled", "emission-factors.pickle")
+        self.table_path = os.path.join(self.directory, "compiled", "emission-factors.table")
+
+    def write_factors(self, emission_factors):
+        path = os.path.join(self.directory, "emission-factors.json")
+        with open(path, "w") as f:
+            json.dump(emission_factors, f)
+        return path
+
+    def test_compiled_factors(self):
+        """
+        Test that the compiled file gives the same factors and lookups as the JSON file
+        """
+        compile_factors(compiled_path=self.compiled_path, table_path=self.table_path)
+        from_json = EmissionFactors()
+        compiled = EmissionFactors(compiled_path=self.compiled_path)
+        self.assertIsNotNone(compiled._index)
+        self.assertIs(compiled.index.emission_factors, compiled.emission_factors)
+        self.assertEqual(compiled.emission_factors, from_json.emission_factors)
+        self.assertEqual(compiled.version, from_json.version)
+        self.assertEqual(compiled.index.compact, from_json.index.compact)
+        self.assertEqual(compiled.index.search_terms, from_json.index.search_terms)
+        self.assertEqual(
+            compiled.get_factor("Anthracite", "kg", "France continentale"),
+            from_json.get_factor("Anthracite", "kg", "France continentale"),
+        )
+
+    def test_outdated_compiled_factors(self):
+        """
+        Test that the JSON file is read when the compiled file is missing, was compiled from another version
+        of the JSON file or has another schema
+        """
+        self.assertIsNone(EmissionFactors(compiled_path=self.compiled_path)._index)
+
+        path = self.write_factors({"Bois": {"poste": "1", "facteurs": {"France continentale": {"kgCO2e/kg": "1"}}}})
+        compile_factors(path, self.compiled_path, self.table_path)
+        with self.assertLogs("data.emission_factors", level="WARNING"):
+            emission_factors = EmissionFactors(compiled_path=self.compiled_path)
+        self.assertIsNone(emission_factors._index)
+        self.assertNotIn("Bois", emission_factors.emission_factors)
+
+        payload = compile_factors(compiled_path=self.compiled_path, table_path=self.table_path)
+        with open(self.compiled_path, "wb") as f:
+            pickle.dump({**payload, "schema": 0}, f)
+        with self.assertLogs("data.emission_factors", level="WARNING"):
+            self.assertIsNone(EmissionFactors(compiled_path=self.compiled_path)._index)
+
+        with open(self.compiled_path, "wb") as f:
+            f.write(b"not a pickle")
+        with self.assertLogs("data.emission_factors", level="WARNING"):
+            self.assertIsNone(EmissionFactors(compiled_path=self.compiled_path)._index)
+
+    def test_compile_command(self):
+        """
+        Test that the command writes the compiled file, and refuses a file with invalid factors
+        """
+        out = StringIO()
+        call_command("compileemissionfactors", output=self.compiled_path, table=self.table_path, stdout=out)
+        self.assertTrue(os.path.exists(self.compiled_path))
+        self.assertIn("Compiled", out.getvalue())
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(self.compiled_path))),
+            ["emission-factors.pickle", "emission-factors.table"],
+        )
+
+        path = self.write_factors(
+            {
+                "Bois": {"poste": "3", "facteurs": {"France continentale": {"kgCO2e/kg": "un"}}},
+                "Charbon": {"poste": "1"},
+            }
+        )
+        with self.assertRaises(CommandError) as context:
+            call_command(
+                "compileemissionfactors", source=path, output=self.compiled_path, table=self.table_path, stdout=out
+            )
+        self.assertIn("Bois : poste 3 inconnu", str(context.exception))
+        self.assertIn("Bois : facteur 'un' invalide", str(context.exception))
+        self.assertIn("Charbon : facteurs manquants", str(context.exception))
+        # the previously compiled file is left as it was
+        with open(self.compiled_path, "rb") as f:
+            self.assertEqual(pickle.load(f)["source_hash"], EmissionFactors().source_hash)
+
+    def test_factor_table(self):
+        """
+        Test that the mapped table gives the same factors and classifications as the JSON file, without loading it
+        """
+        compile_factors(compiled_path=self.compiled_path, table_path=self.table_path)
+        from_json = EmissionFactors()
+        mapped = EmissionFactors(compiled_path=self.compiled_path, table_path=self.table_path)
+        self.assertTrue(mapped.uses_table)
+        lookups = [
+            (type, unit.replace("kgCO2e/", ""), location)
+            for type, emission_factor in from_json.emission_factors.items()
+            for location, location_factors in emission_factor["facteurs"].items()
+            for unit in location_factors
+        ]
+        lookups += [
+            ("Anthracite", "kg", None),
+            ("Anthracite", "kg", "Mayotte"),
+            ("Anthracite", "litre", "France continentale"),
+            ("Essence aviation (AvGas)", "litre", "Mayotte"),
+            ("Essence aviation (AvGas)", "litre", None),
+            ("Anthracite\x1fFrance continentale", "kg", ""),
+            ("Inconnu", "kWh PCI", "France continentale"),
+        ]
+        for type, unit, location in lookups:
+            self.assertEqual(mapped.find_factor(type, unit, location), from_json.find_factor(type, unit, location))
+            self.assertEqual(mapped.get_classification(type), from_json.get_classification(type))
+        self.assertNotIn("emission_factors", mapped.__dict__)
+
+        # the factors are loaded for the endpoints serving them
+        self.assertEqual(mapped.emission_factors, from_json.emission_factors)
+        self.assertTrue(mapped.uses_table)
+
+    def test_outdated_factor_table(self):
+        """
+        Test that the factors are read when the table was written from another version of the JSON file
+        """
+        path = self.write_factors({"Bois": {"poste": "1", "facteurs": {"France continentale": {"kgCO2e/kg": "1"}}}})
+        compile_factors(path, self.compiled_path, self.table_path)
+        with self.assertLogs("data.emission_factors", level="WARNING"):
+            emission_factors = EmissionFactors(table_path=self.table_path)
+        self.assertFalse(emission_factors.uses_table)
+        self.assertIsNone(emission_factors.get_factor("Bois", "kg", "France continentale"))
+
+    def test_factor_table_after_touch(self):
+        """
+        Test that the table is still used when only the modification time of the JSON file changed, as when the
+        deployment archive rounds it
+        """
+        path = self.write_factors({"Bois": {"poste": "1", "facteurs": {"France continentale": {"kgCO2e/kg": "1"}}}})
+        compile_factors(path, self.compiled_path, self.table_path)
+        modification = os.stat(path).st_mtime_ns // 10**9 * 10**9 - 10**9
+        os.utime(path, ns=(modification, modification))
+        emission_factors = EmissionFactors(path, table_path=self.table_path)
+        self.assertTrue(emission_factors.uses_table)
+        self.assertEqual(str(emission_factors.get_factor("Bois", "kg", "France continentale")), "1")
@@ -1,6 +1,7 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
+from .utils import override_emission_factors
 
 
 class TestEmissionFactorsFileApi(APITestCase):
@@ -12,3 +13,94 @@ class TestEmissionFactorsFileApi(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         body = response.json()
         self.assertGreaterEqual(len(body.keys()), 200)
+
+    example_emission_factors = {
+        "Gaz naturel": {
+            "affichage": "Gaz naturel",
+            "classification": "carburant",
+            "facteurs": {
+                "France continentale": {"kgCO2e/GJ PCI": "0.5", "kgCO2e/kWh PCI": "0.2"},
+                "Guadeloupe, Martinique, Guyane, Corse": {"kgCO2e/GJ PCI": "2"},
+            },
+            "groupe": "",
+            "poste": "1",
+        },
+        "Électricité réseau": {
+            "affichage": "Électricité du réseau",
+            "classification": None,
+            "facteurs": {"France continentale": {"kgCO2e/kWh PCI": "0.06"}},
+            "groupe": "Les plus utilisés",
+            "poste": "1",
+        },
+        "Articulé, Diesel routier, incorporation 7 % de biodiesel": {
+            "affichage": "Articulé, Diesel routier (B7)",
+            "classification": "véhicule",
+            "facteurs": {"France continentale": {"kgCO2e/t.km": "0.06"}},
+            "groupe": ["", "Routier"],
+            "poste": ["1", "2"],
+        },
+    }
+
+    @override_emission_factors(example_emission_factors)
+    def test_factors_by_poste(self):
+        """
+        Test that the factors can be fetched by poste and groupe, in the format of the full file
+        """
+        body = self.client.get(reverse("ef-poste", kwargs={"poste": 1})).json()
+        self.assertEqual(list(body.keys()), list(self.example_emission_factors.keys()))
+        self.assertEqual(body["Gaz naturel"], self.example_emission_factors["Gaz naturel"])
+
+        body = self.client.get(reverse("ef-poste", kwargs={"poste": 2})).json()
+        self.assertEqual(list(body.keys()), ["Articulé, Diesel routier, incorporation 7 % de biodiesel"])
+
+        body = self.client.get(reverse("ef-poste", kwargs={"poste": 1}), {"groupe": "Les plus utilisés"}).json()
+        self.assertEqual(list(body.keys()), ["Électricité réseau"])
+
+    @override_emission_factors(example_emission_factors)
+    def test_search(self):
+        """
+        Test that the search matches the start of any word of the type or display name, ignoring accents and case
+        """
+
+        def search(query):
+            return list(self.client.get(reverse("ef-search"), {"q": query}).json().keys())
+
+        self.assertEqual(search("electri"), ["Électricité réseau"])
+        self.assertEqual(search("DIESEL"), ["Articulé, Diesel routier, incorporation 7 % de biodiesel"])
+        self.assertEqual(search("(b7"), ["Articulé, Diesel routier, incorporation 7 % de biodiesel"])
+        self.assertEqual(search("du rés"), ["Électricité réseau"])
+        self.assertEqual(search("naturel"), ["Gaz naturel"])
+        self.assertEqual(search("iesel"), [])
+        self.assertEqual(search(""), [])
+
+        for limit in ["0", "-1", "a"]:
+            response = self.client.get(reverse("ef-search"), {"q": "e", "limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("limit", response.json())
+
+    @override_emission_factors(example_emission_factors)
+    def test_compact(self):
+        """
+        Test that the compact format holds all the factors, units and locations being written once
+        """
+        body = self.client.get(reverse("ef-compact")).json()
+        self.assertEqual(body["unites"], ["kgCO2e/GJ PCI", "kgCO2e/kWh PCI", "kgCO2e/t.km"])
+        self.assertEqual(body["localisations"], ["France continentale", "Guadeloupe, Martinique, Guyane, Corse"])
+        decoded = {}
+        for type, affichage, poste, groupe, classification, factors in body["types"]:
+            for location, unit, value in factors:
+                decoded.setdefault(type, {}).setdefault(body["localisations"][location], {})
+                decoded[type][body["localisations"][location]][body["unites"][unit]] = value
+            self.assertEqual(affichage or type, self.example_emission_factors[type]["affichage"])
+            self.assertEqual(
+                body["classifications"][classification], self.example_emission_factors[type]["classification"]
+            )
+        self.assertEqual(decoded, {type: value["facteurs"] for type, value in self.example_emission_factors.items()})
+
+    def test_compact_size(self):
+        """
+        Test that the compact format is much smaller than the full file
+        """
+        full = self.client.get(reverse("ef-file"))
+        compact = self.client.get(reverse("ef-compact"))
+        self.assertLess(len(compact.content), len(full.content) / 2)
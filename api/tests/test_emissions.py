@@ -1,11 +1,9 @@
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .utils import authenticate
+from .utils import authenticate, override_emission_factors
 from data.factories import ReportFactory, EmissionFactory
 from data.models import Emission
-from data.emission_factors import get_emission_factors
-from unittest.mock import patch
 
 example_emission_factors = {
     "Gaz naturel": {
@@ -39,7 +37,7 @@ example_emission_factors = {
 }
 
 
-@patch.object(get_emission_factors(), "emission_factors", example_emission_factors)
+@override_emission_factors(example_emission_factors)
 class TestEmissionApi(APITestCase):
     def test_unauthenticated_create_emission(self):
         """
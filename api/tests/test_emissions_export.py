@@ -1,10 +1,17 @@
-from .utils import authenticate
+from .utils import authenticate, authenticate_staff, override_emission_factors
 from rest_framework.test import APITestCase
 from rest_framework import status
 from data.factories import ReportFactory, EmissionFactory
 from django.urls import reverse
-from data.emission_factors import get_emission_factors
+from django.db import connections
+from django.test.utils import override_settings
 from unittest.mock import patch
+from decimal import Decimal
+import io
+import zipfile
+import pyarrow.parquet as pq
+from api.exports import stream_emissions_bundle
+from data.models import Report
 
 example_emission_factors = {
     "Gaz naturel": {
@@ -30,7 +37,7 @@ example_emission_factors = {
 }
 
 
-@patch.object(get_emission_factors(), "emission_factors", example_emission_factors)
+@override_emission_factors(example_emission_factors)
 class TestPrivateReportExport(APITestCase):
     @authenticate
     def test_csv_emissions_export(self):
@@ -133,3 +140,142 @@ class TestPrivateReportExport(APITestCase):
         report = ReportFactory.create()
         response = self.client.get(reverse("emissions-xlsx-export", kwargs={"report_pk": report.id}))
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @authenticate_staff
+    def test_all_emissions_parquet_export(self):
+        """
+        Test that staff can download the emissions of all reports as a parquet file
+        """
+        report = ReportFactory.create(annee=2020, siren="123456789", region="01")
+        EmissionFactory.create(
+            bilan=report,
+            type="Gaz naturel",
+            valeur=10,
+            unite="GJ PCI",
+            localisation="France continentale",
+            poste=1,
+        )
+        EmissionFactory.create(bilan=report, type="Inconnu", valeur=10, unite="kg", poste=2)
+        EmissionFactory.create(valeur=1234)
+
+        response = self.client.get(reverse("emissions-parquet-export"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        table = pq.read_table(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 3)
+        rows = table.to_pylist()
+        self.assertEqual(rows[0]["siren"], "123456789")
+        self.assertEqual(rows[0]["annee"], 2020)
+        self.assertEqual(rows[0]["region"], "01")
+        self.assertEqual(rows[0]["type"], "Gaz naturel")
+        self.assertEqual(rows[0]["facteur_d_emission"], 0.5)
+        self.assertEqual(Decimal(str(rows[0]["resultat"])), Decimal("5.0"))
+        self.assertIsNone(rows[1]["resultat"])
+
+    @authenticate
+    def test_only_staff_access_all_emissions_parquet_export(self):
+        """
+        Test that the export of all emissions is restricted to staff
+        """
+        response = self.client.get(reverse("emissions-parquet-export"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @authenticate_staff
+    @override_settings(EXPORT_FETCH_SIZE=2)
+    def test_all_emissions_csv_export(self):
+        """
+        Test that staff can download the emissions of all reports as a csv file, read through a server-side cursor
+        """
+        report = ReportFactory.create(annee=2020, siren="123456789", naf="03", region="01")
+        EmissionFactory.create(
+            bilan=report,
+            type="Gaz naturel",
+            valeur=10,
+            unite="GJ PCI",
+            localisation="Guadeloupe, Martinique, Guyane, Corse",
+            note="Note pour gaz naturel",
+            poste=1,
+        )
+        for _ in range(4):
+            EmissionFactory.create()
+
+        connection = connections["default"]
+        with patch.object(connection, "create_cursor", wraps=connection.create_cursor) as create_cursor:
+            response = self.client.get(reverse("all-emissions-csv-export"))
+            body = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertTrue(any(call.args and call.args[0] for call in create_cursor.call_args_list))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertTrue(response["Content-Disposition"].startswith("attachment; filename=emissions_bilans_climat_"))
+        self.assertEqual(len(body), 6)
+        self.assertEqual(
+            body[0],
+            "SIREN,Année de reporting,Code NAF,Code région,Poste,Type d'émission,Valeur,Unité,Localisation,Facteur d'émission,Résultat kgCO2e,Note",
+        )
+        self.assertEqual(
+            body[1],
+            '123456789,2020,03,01,1,Gaz naturel,10.00,GJ PCI,"Guadeloupe, Martinique, Guyane, Corse",2,20.0,Note pour gaz naturel',
+        )
+
+    @authenticate
+    def test_only_staff_access_all_emissions_csv_export(self):
+        """
+        Test that the export of all emissions is restricted to staff
+        """
+        response = self.client.get(reverse("all-emissions-csv-export"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @authenticate_staff
+    def test_emissions_zip_export(self):
+        """
+        Test that staff can download a zip of the emissions export of the filtered reports
+        """
+        first = ReportFactory.create(annee=2020, siren="123456789", region="01")
+        second = ReportFactory.create(annee=2020, siren="910546308", region="01")
+        ReportFactory.create(annee=2021, siren="515277358", region="01")
+        ReportFactory.create(annee=2020, siren="794690446", region="02")
+        EmissionFactory.create(
+            bilan=first, type="Gaz naturel", valeur=10, unite="GJ PCI", localisation="France continentale", poste=1
+        )
+        EmissionFactory.create(bilan=second, type="Essence, E10", valeur=1000, unite="kg", poste=2)
+
+        response = self.client.get(reverse("emissions-zip-export"), {"annee": 2020, "region": "01"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        bundle = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(bundle.namelist(), ["export_123456789_2020.csv", "export_910546308_2020.csv"])
+        lines = bundle.read("export_123456789_2020.csv").decode("utf-8").splitlines()
+        self.assertEqual(
+            lines[0], "Type d'émission,Valeur,Unité,Facteur d'émission,Résultat kgCO2e,Poste,Localisation,Note"
+        )
+        self.assertTrue(lines[1].startswith("Gaz naturel,10.00,GJ PCI,0.5,5.0,1,France continentale,"))
+
+    def test_emissions_bundle_bounded_pending(self):
+        """
+        Test that the zip is written progressively when few rendered files can be kept pending
+        """
+        for siren in ["123456789", "910546308", "515277358"]:
+            EmissionFactory.create(bilan=ReportFactory.create(siren=siren, annee=2020))
+        chunks = list(stream_emissions_bundle(Report.objects.all(), workers=1, max_pending=1))
+        self.assertGreater(len([chunk for chunk in chunks if chunk]), 2)
+        bundle = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        self.assertEqual(len(bundle.namelist()), 3)
+        self.assertIsNone(bundle.testzip())
+
+    @authenticate_staff
+    def test_emissions_zip_export_year_validated(self):
+        """
+        Test that the year filter must be a number
+        """
+        response = self.client.get(reverse("emissions-zip-export"), {"annee": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @authenticate
+    def test_only_staff_access_emissions_zip_export(self):
+        """
+        Test that the zip export is restricted to staff
+        """
+        response = self.client.get(reverse("emissions-zip-export"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,107 @@
+import gzip
+import zstandard
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.exports.compression import negotiate_encoding
+from data.factories import ReportFactory, EmissionFactory
+from .utils import authenticate, authenticate_staff
+
+
+class TestExportCompression(APITestCase):
+    def create_report(self, user):
+        report = ReportFactory.create(gestionnaire=user, annee=2020, siren="123456789")
+        for _ in range(20):
+            EmissionFactory.create(bilan=report, note="Une note qui se répète")
+        return report
+
+    @authenticate
+    def test_gzip_encoding(self):
+        """
+        Test that the emissions export is gzipped when the client accepts it
+        """
+        report = self.create_report(authenticate.user)
+        url = reverse("emissions-csv-export", kwargs={"report_pk": report.id})
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+
+    @authenticate
+    def test_zstd_encoding(self):
+        """
+        Test that zstd is preferred when the client accepts it
+        """
+        report = self.create_report(authenticate.user)
+        url = reverse("emissions-csv-export", kwargs={"report_pk": report.id})
+        plain = self.client.get(url)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, zstd")
+
+        self.assertEqual(response["Content-Encoding"], "zstd")
+        self.assertEqual(zstandard.ZstdDecompressor().decompressobj().decompress(response.content), plain.content)
+
+    @authenticate
+    def test_gz_download(self):
+        """
+        Test that the export can be downloaded as a .csv.gz file
+        """
+        report = self.create_report(authenticate.user)
+        url = reverse("emissions-csv-export", kwargs={"report_pk": report.id})
+        plain = self.client.get(url)
+
+        response = self.client.get(url, {"compression": "gzip"}, HTTP_ACCEPT_ENCODING="zstd")
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Content-Disposition"], "attachment; filename=export_123456789_2020.csv.gz")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    @authenticate_staff
+    def test_streamed_export_compressed(self):
+        """
+        Test that streamed exports are compressed chunk by chunk
+        """
+        self.create_report(authenticate.user)
+        plain = b"".join(self.client.get(reverse("all-emissions-csv-export")).streaming_content)
+
+        response = self.client.get(reverse("all-emissions-csv-export"), HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+
+    @authenticate
+    def test_json_not_compressed(self):
+        """
+        Test that only CSV exports are compressed
+        """
+        response = self.client.get(reverse("reports"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate, br"), "gzip")
+        self.assertEqual(negotiate_encoding("gzip;q=0.5, zstd"), "zstd")
+        self.assertEqual(negotiate_encoding("zstd;q=0, gzip"), "gzip")
+        self.assertIsNone(negotiate_encoding("identity"))
+        self.assertIsNone(negotiate_encoding(None))
+        self.assertEqual(negotiate_encoding("zstd;q=., gzip"), "gzip")
+        self.assertIsNone(negotiate_encoding("gzip;q=1.2.3"))
+
+    @authenticate
+    def test_malformed_accept_encoding(self):
+        """
+        Test that an invalid q-value doesn't make the export fail
+        """
+        report = self.create_report(authenticate.user)
+        url = reverse("emissions-csv-export", kwargs={"report_pk": report.id})
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip;q=., zstd;q=1.2.3")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header("Content-Encoding"))
@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from django.test import SimpleTestCase
+from data.emission_factors import EmissionFactors, compile_factors, get_emission_factors, validate_factors
+from data.factor_aliases import OLD_KEY, DISPLAY_NAME, NORMALIZED
+from data.models import Emission
+from .utils import override_emission_factors
+
+example_emission_factors = {
+    "Fioul domestique": {
+        "affichage": "Fioul domestique (FOD)",
+        "anciens_noms": ["Fioul", "Fioul domestique, France"],
+        "classification": "carburant",
+        "facteurs": {"France continentale": {"kgCO2e/litre": "3.25"}},
+        "poste": "1",
+    },
+    "Coke de pétrole": {
+        "affichage": "Coke de pétrole",
+        "classification": None,
+        "facteurs": {"France continentale": {"kgCO2e/kg": "3.5"}},
+        "poste": "1",
+    },
+    "coke de pétrole": {
+        "affichage": "coke de pétrole",
+        "classification": None,
+        "facteurs": {"France continentale": {"kgCO2e/kg": "3.2"}},
+        "poste": "1",
+    },
+    "Électricité réseau": {
+        "affichage": "Électricité du réseau",
+        "classification": None,
+        "facteurs": {"France continentale": {"kgCO2e/kWh PCI": "0.06"}},
+        "poste": "1",
+    },
+}
+
+
+class TestFactorAliases(SimpleTestCase):
+    lookups = [
+        ("Fioul domestique", "Fioul domestique", None),
+        ("Fioul", "Fioul domestique", OLD_KEY),
+        ("Fioul domestique, France", "Fioul domestique", OLD_KEY),
+        ("Fioul domestique (FOD)", "Fioul domestique", DISPLAY_NAME),
+        ("Électricité du réseau", "Électricité réseau", DISPLAY_NAME),
+        ("electricite  RESEAU", "Électricité réseau", NORMALIZED),
+        ("FIOUL DOMESTIQUE (fod)", "Fioul domestique", NORMALIZED),
+        ("Coke de pétrole", "Coke de pétrole", None),
+        ("coke de pétrole", "coke de pétrole", None),
+        # the accents and case of the two cokes can't be ignored
+        ("Coke de petrole", None, None),
+        ("Inconnu", None, None),
+        ("Fioul\x1d", None, None),
+    ]
+
+    def test_find_type(self):
+        """
+        Test that the types are found from their old keys, display names and normalized names,
+        the same way from the JSON file and the mapped table
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "emission-factors.json")
+            with open(path, "w") as f:
+                json.dump(example_emission_factors, f)
+            table_path = os.path.join(directory, "emission-factors.table")
+            compile_factors(path, os.path.join(directory, "emission-factors.pickle"), table_path)
+            mapped = EmissionFactors(path, table_path=table_path)
+            self.assertTrue(mapped.uses_table)
+            from_json = EmissionFactors(path)
+            for type, current, kind in self.lookups:
+                self.assertEqual(from_json.index.find_type(type), (current, kind), type)
+                self.assertEqual(mapped.table.find_type(type), (current, kind), type)
+            self.assertEqual(mapped.get_factor("Fioul", "litre", None), Decimal("3.25"))
+            self.assertEqual(mapped.get_classification("Fioul"), "carburant")
+
+    @override_emission_factors(example_emission_factors)
+    def test_renamed_emission(self):
+        """
+        Test that emissions saved with an old key keep their result, and that every alias hit is counted,
+        the variants of a normalized name together
+        """
+        emission_factors = get_emission_factors()
+        emission_factors.alias_hits.clear()
+        emission = Emission(type="Fioul", unite="litre", localisation="France continentale", valeur=Decimal("100"))
+        self.assertEqual(emission.resultat, Decimal("325.0"))
+        self.assertEqual(emission.classification, "carburant")
+        for variant in ["electricite reseau", "ELECTRICITE  reseau", "Electricite Reseau"]:
+            emission_factors.get_factor(variant, "kWh PCI", None)
+        emission_factors.get_factor("Électricité réseau", "kWh PCI", None)
+        self.assertEqual(
+            emission_factors.alias_hits,
+            {
+                (OLD_KEY, "Fioul", "Fioul domestique"): 2,
+                (NORMALIZED, "electricite reseau", "Électricité réseau"): 3,
+            },
+        )
+
+    def test_validate_aliases(self):
+        """
+        Test that an old key can't be an existing type nor the old key of two types
+        """
+        emission_factors = {
+            "Fioul": {"facteurs": {}, "poste": "1", "anciens_noms": ["Gazole"]},
+            "Gazole": {"facteurs": {}, "poste": "1", "anciens_noms": ["Gasoil"]},
+            "Gazole routier": {"facteurs": {}, "poste": "1", "anciens_noms": ["Gasoil"]},
+            "Essence": {"facteurs": {}, "poste": "1", "anciens_noms": "Super"},
+        }
+        self.assertEqual(
+            validate_factors(emission_factors),
+            [
+                "Fioul : l'ancien nom Gazole est un type existant",
+                "Gazole routier : l'ancien nom Gasoil est aussi celui de Gazole",
+                "Essence : anciens noms invalides",
+            ],
+        )
@@ -0,0 +1,82 @@
+import csv
+import json
+import os
+import tempfile
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from data.factories import ReportFactory, EmissionFactory
+from data.models import Report
+
+
+def factors_file(factors):
+    path = os.path.join(tempfile.mkdtemp(), "emission-factors.json")
+    with open(path, "w") as f:
+        json.dump({type: {"facteurs": {"France continentale": units}} for type, units in factors.items()}, f)
+    return path
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+class TestFactorDiff(TransactionTestCase):
+    def test_factor_diff(self):
+        """
+        Test that the reports whose totals change and the emissions left without a factor are written
+        """
+        old = factors_file(
+            {"Gaz naturel": {"kgCO2e/GJ PCI": "0.5"}, "Essence": {"kgCO2e/kg": "0.1"}, "Fioul": {"kgCO2e/kg": "3"}}
+        )
+        new = factors_file(
+            {"Gaz naturel": {"kgCO2e/GJ PCI": "1"}, "Essence": {"kgCO2e/litre": "0.1"}, "Fioul": {"kgCO2e/kg": "3"}}
+        )
+        emission = {"localisation": "France continentale", "valeur": 10}
+        changed = ReportFactory.create(siren="515277358", annee=2021)
+        EmissionFactory.create(bilan=changed, type="Gaz naturel", unite="GJ PCI", poste=1, **emission)
+        EmissionFactory.create(bilan=changed, type="Fioul", unite="kg", poste=2, **emission)
+        unresolvable = ReportFactory.create(siren="910546308", annee=2021)
+        line = EmissionFactory.create(bilan=unresolvable, type="Essence", unite="kg", poste=2, **emission)
+        manual = ReportFactory.create(mode=Report.CalculationMode.MANUAL, manuel_poste_1=100)
+        EmissionFactory.create(bilan=manual, type="Gaz naturel", unite="GJ PCI", poste=1, **emission)
+        unchanged = ReportFactory.create()
+        EmissionFactory.create(bilan=unchanged, type="Fioul", unite="kg", poste=1, **emission)
+
+        output_dir = tempfile.mkdtemp()
+        call_command(
+            "factordiff", old, new=new, output_dir=output_dir, workers=2, partitions=3, stdout=open(os.devnull, "w")
+        )
+
+        totals = read_csv(os.path.join(output_dir, "factordiff_totaux.csv"))
+        self.assertEqual(
+            totals,
+            [
+                {
+                    "bilan": str(changed.id),
+                    "siren": "515277358",
+                    "annee": "2021",
+                    "ancien_poste_1": "5",
+                    "nouveau_poste_1": "10",
+                    "ancien_poste_2": "30",
+                    "nouveau_poste_2": "30",
+                    "ancien_total": "35",
+                    "nouveau_total": "40",
+                },
+                {
+                    "bilan": str(unresolvable.id),
+                    "siren": "910546308",
+                    "annee": "2021",
+                    "ancien_poste_1": "0",
+                    "nouveau_poste_1": "0",
+                    "ancien_poste_2": "1",
+                    "nouveau_poste_2": "0",
+                    "ancien_total": "1",
+                    "nouveau_total": "0",
+                },
+            ],
+        )
+        lines = read_csv(os.path.join(output_dir, "factordiff_lignes.csv"))
+        self.assertEqual(
+            [(row["emission"], row["type"], row["ancien_facteur"]) for row in lines],
+            [(str(line.id), "Essence", "0.1")],
+        )
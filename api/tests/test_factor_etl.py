@@ -0,0 +1,43 @@
+import csv
+import hashlib
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from data.factor_etl import select_columns, write_factors_file, EXTRACT_FILE
+
+# sha256 of the file made from the V20.2 extract by scripts/generate_emission_factors.py, before the command
+EXTRACT_OUTPUT_HASH = "729e9f5e294777e65ec602df20d968f34e6e2cba2daf0b3d4641601a7c069136"
+
+
+class TestFactorEtl(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, "auto-emission-factors.json")
+
+    def output_hash(self):
+        with open(self.output, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def test_extract_output(self):
+        """
+        Test that the command creates the same file from the V20.2 extract as the script it replaces
+        """
+        out = StringIO()
+        call_command("generateemissionfactors", output=self.output, stdout=out)
+        self.assertEqual(self.output_hash(), EXTRACT_OUTPUT_HASH)
+        self.assertIn("Total ignored: 5", out.getvalue())
+        self.assertIn("Missing posts: ['Hoverboard']", out.getvalue())
+        self.assertIn("Total efs saved: 537", out.getvalue())
+        self.assertIn("Total types: 261", out.getvalue())
+
+    def test_api_lines(self):
+        """
+        Test that the lines of the API, having all the columns, give the same file
+        """
+        with open(EXTRACT_FILE, encoding="utf8") as f:
+            lines = [{key.replace(" ", "_"): value for key, value in row.items()} for row in csv.DictReader(f)]
+        write_factors_file(select_columns(iter(lines)), self.output)
+        self.assertEqual(self.output_hash(), EXTRACT_OUTPUT_HASH)
@@ -0,0 +1,98 @@
+import importlib
+from unittest.mock import patch
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from .utils import authenticate
+from data.factories import ReportFactory, EmissionFactory
+from data.models import Emission, FactorKey
+
+factor_key_migration = importlib.import_module("data.migrations.0012_factor_key")
+
+
+class TestFactorKeyApi(APITestCase):
+    @authenticate
+    def test_emission_strings(self):
+        """
+        Test that the API reads and writes the type, unite and localisation of the emissions, each combination
+        being stored once
+        """
+        report = ReportFactory.create(gestionnaire=authenticate.user)
+        payload = {"bilan": report.id, "type": "Essence, E10", "valeur": 100, "unite": "l", "poste": 1}
+        for localisation in ["Corse", "Corse", None, ""]:
+            response = self.client.post(reverse("emissions"), {**payload, "localisation": localisation}, format="json")
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()["localisation"], localisation)
+        self.assertEqual(Emission.objects.count(), 4)
+        self.assertEqual(FactorKey.objects.count(), 3)
+
+        emission = Emission.objects.filter(factor_key__localisation="Corse").first()
+        response = self.client.patch(reverse("emission", kwargs={"pk": emission.id}), {"unite": "kg"})
+        self.assertEqual(response.json()["unite"], "kg")
+        self.assertEqual(response.json()["type"], "Essence, E10")
+        emission.refresh_from_db()
+        self.assertEqual((emission.type, emission.unite, emission.localisation), ("Essence, E10", "kg", "Corse"))
+        self.assertEqual(FactorKey.objects.count(), 4)
+
+
+class TestFactorKeys(TestCase):
+    def test_reads_without_queries(self):
+        """
+        Test that the strings of the emissions are read from memory once the factor keys are loaded
+        """
+        report = ReportFactory.create()
+        EmissionFactory.create_batch(5, bilan=report)
+        Emission.objects.bulk_create(
+            [Emission(bilan=report, poste=1, type="Fioul", valeur=1, unite="litre") for _ in range(2)]
+        )
+        self.assertEqual(FactorKey.objects.filter(type="Fioul").count(), 1)
+        FactorKey.objects.values_of(FactorKey.objects.get(type="Fioul").id)
+        with self.assertNumQueries(1):
+            values = [(emission.type, emission.unite) for emission in Emission.objects.filter(bilan=report)]
+        self.assertEqual(len(values), 7)
+        self.assertIn(("Fioul", "litre"), values)
+
+
+class TestFactorKeyMigration(TransactionTestCase):
+    def migrate(self, target=None):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        # the latest migrations by default
+        targets = [("data", target)] if target else executor.loader.graph.leaf_nodes()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_migration(self):
+        """
+        Test that the existing emissions are converted in batches, and back when the migration is reversed
+        """
+        self.addCleanup(self.migrate)
+        apps = self.migrate("0011_publication_snapshot")
+        Report = apps.get_model("data", "Report")
+        OldEmission = apps.get_model("data", "Emission")
+        report = Report.objects.create(siren="000000000", annee=2021, raison_sociale="Entreprise")
+        keys = [("Fioul", "litre", "Corse"), ("Fioul", "litre", None), ("Fioul", "kg", "Corse")] * 3
+        OldEmission.objects.bulk_create(
+            [
+                OldEmission(bilan=report, poste=1, valeur=1, type=type, unite=unite, localisation=localisation)
+                for type, unite, localisation in keys
+            ]
+        )
+
+        with patch.object(factor_key_migration, "BATCH_SIZE", 2):
+            apps = self.migrate("0012_factor_key")
+        Emission = apps.get_model("data", "Emission")
+        self.assertEqual(apps.get_model("data", "FactorKey").objects.count(), 3)
+        converted = Emission.objects.order_by("id").values_list(
+            "factor_key__type", "factor_key__unite", "factor_key__localisation"
+        )
+        self.assertEqual(list(converted), keys)
+
+        with patch.object(factor_key_migration, "BATCH_SIZE", 2):
+            apps = self.migrate("0011_publication_snapshot")
+        restored = (
+            apps.get_model("data", "Emission").objects.order_by("id").values_list("type", "unite", "localisation")
+        )
+        self.assertEqual(list(restored), keys)
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# loaded by the exports or the account creation only, see api/export_views.py
+LAZY_MODULES = ["numpy", "pyarrow", "openpyxl", "drf_excel", "rest_framework_csv", "zstandard", "data.bulk"]
+# generous for slow CI machines, the imports take about 0.5 s on a laptop
+IMPORT_TIME_BUDGET = 3
+
+
+def profile_imports(*arguments):
+    """
+    {module: cumulative import time in seconds} of the modules imported by the python command,
+    and the total time of the imports
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        cwd=settings.BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        seconds = int(cumulative) / 1e6
+        modules[name.strip()] = seconds
+        # the modules imported at top level, the others are counted in their cumulative time
+        if not name.startswith("  "):
+            total += seconds
+    return modules, total
+
+
+class TestImportTime(SimpleTestCase):
+    def assertLazyImports(self, modules, total):
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, modules)
+        self.assertLess(total, IMPORT_TIME_BUDGET)
+
+    def test_wsgi_imports(self):
+        """
+        Test that starting the app and loading its urls doesn't import the export dependencies
+        """
+        script = "import djangoapp.wsgi; from django.urls import get_resolver; get_resolver().reverse_dict"
+        self.assertLazyImports(*profile_imports("-c", script))
+
+    def test_manage_imports(self):
+        """
+        Test that a management command doesn't import the export dependencies unless it uses them
+        """
+        self.assertLazyImports(*profile_imports(os.path.join(settings.BASE_DIR, "manage.py"), "check"))
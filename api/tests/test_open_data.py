@@ -0,0 +1,106 @@
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from data.factories import ReportFactory, EmissionFactory
+from data.models import Report
+
+
+@override_settings(OPEN_DATA_SNAPSHOT_TTL=0)
+class TestPublicReportsApi(APITestCase):
+    def create_published(self, **kwargs):
+        return ReportFactory.create(statut=Report.Status.PUBLISHED, **kwargs)
+
+    def test_unauthenticated_access(self):
+        """
+        Published reports are open data, only published reports are returned
+        """
+        self.create_published(siren="515277358", annee=2020, region="01", naf="03")
+        ReportFactory.create(siren="910546308", statut=Report.Status.DRAFT)
+
+        response = self.client.get(reverse("public-reports"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.json()
+        self.assertEqual(len(body["results"]), 1)
+        self.assertIsNone(body["next"])
+        report = body["results"][0]
+        self.assertEqual(report["siren"], "515277358")
+        self.assertEqual(report["nomRegion"], "Guadeloupe")
+        self.assertEqual(report["nomNaf"], "Pêche et aquaculture")
+        self.assertIn("totalT", report)
+        self.assertNotIn("gestionnaire", report)
+
+    def test_keyset_pagination(self):
+        """
+        Pages follow each other with the next cursor
+        """
+        sirens = ["515277358", "910546308", "794690446", "123456782", "732829320"]
+        for siren in sirens:
+            self.create_published(siren=siren, annee=2020)
+
+        seen = []
+        params = {"limit": 2}
+        while True:
+            body = self.client.get(reverse("public-reports"), params).json()
+            self.assertLessEqual(len(body["results"]), 2)
+            seen += [report["siren"] for report in body["results"]]
+            if body["next"] is None:
+                break
+            params["after"] = body["next"]
+        self.assertEqual(seen, sirens)
+
+    def test_filters(self):
+        """
+        Reports can be filtered by siren, annee, region and naf
+        """
+        self.create_published(siren="515277358", annee=2020, region="01", naf="03")
+        self.create_published(siren="515277358", annee=2021, region="01", naf="03")
+        self.create_published(siren="910546308", annee=2021, region="02", naf="03")
+
+        def sirens(params):
+            return [r["siren"] for r in self.client.get(reverse("public-reports"), params).json()["results"]]
+
+        self.assertEqual(sirens({"siren": "515277358"}), ["515277358", "515277358"])
+        self.assertEqual(sirens({"annee": 2021}), ["515277358", "910546308"])
+        self.assertEqual(sirens({"annee": 2021, "region": "02"}), ["910546308"])
+        self.assertEqual(sirens({"naf": "03", "region": "03"}), [])
+
+    def test_cache_headers(self):
+        """
+        Responses can be cached and revalidated with their ETag until the data changes
+        """
+        report = self.create_published(annee=2020)
+        response = self.client.get(reverse("public-reports"))
+        self.assertIn("public", response["Cache-Control"])
+        etag = response["ETag"]
+
+        response = self.client.get(reverse("public-reports"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # as proxies send it: several ETags, weak ones, or any
+        for if_none_match in [f'"other", {etag}', f"W/{etag}", "*"]:
+            response = self.client.get(reverse("public-reports"), HTTP_IF_NONE_MATCH=if_none_match)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, if_none_match)
+        response = self.client.get(reverse("public-reports"), HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        report.raison_sociale = "New name"
+        report.save()
+        response = self.client.get(reverse("public-reports"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_published_figures(self):
+        """
+        The figures are the ones frozen at publication, not recomputed from the live emissions
+        """
+        report = self.create_published(mode=Report.CalculationMode.MANUAL, manuel_poste_1=2000, manuel_poste_2=500)
+        Report.objects.filter(id=report.id).update(manuel_poste_1=9000)
+        EmissionFactory.create(bilan=report)
+
+        result = self.client.get(reverse("public-reports")).json()["results"][0]
+        self.assertEqual((result["poste1T"], result["poste2T"], result["totalT"]), (2, 0.5, 2.5))
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(reverse("public-reports"), {"after": "a"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("public-reports"), {"limit": 0}).status_code, 400)
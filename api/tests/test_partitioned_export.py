@@ -0,0 +1,39 @@
+import os
+import tempfile
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from api.exports import iter_partitioned_export, render_reports_csv
+from data.factories import ReportFactory, EmissionFactory
+from data.models import Report
+
+
+class TestPartitionedExport(TransactionTestCase):
+    def setUp(self):
+        for index in range(7):
+            report = ReportFactory.create(annee=2020 + index % 3, raison_sociale=f"Company, {index}")
+            EmissionFactory.create(bilan=report)
+
+    def test_same_as_single_process(self):
+        """
+        Test that the partitions rendered in other processes are concatenated in order, after a single header
+        """
+        expected = render_reports_csv(Report.objects.select_related("gestionnaire").order_by("id"))
+        result = b"".join(iter_partitioned_export(workers=2, partitions=3))
+        self.assertEqual(result, expected)
+        self.assertEqual(result.count(b"SIREN,"), 1)
+
+    def test_more_partitions_than_reports(self):
+        """
+        Test that each report is exported once whatever the number of partitions
+        """
+        result = b"".join(iter_partitioned_export(workers=2, partitions=20))
+        self.assertEqual(len(result.decode("utf-8").splitlines()), 8)
+
+    def test_command(self):
+        """
+        Test that the command writes the export to the given file
+        """
+        output = os.path.join(tempfile.mkdtemp(), "export.csv")
+        call_command("privateexport", output, workers=2, stdout=open(os.devnull, "w"))
+        with open(output, "rb") as f:
+            self.assertEqual(len(f.read().decode("utf-8").splitlines()), 8)
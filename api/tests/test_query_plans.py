@@ -0,0 +1,75 @@
+import json
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from data.factories import ReportFactory, EmissionFactory, UserFactory
+from data.models import Report, Emission
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+class TestQueryPlans(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory.create()
+        reports = ReportFactory.create_batch(20, gestionnaire=cls.user)
+        reports += ReportFactory.create_batch(10, statut=Report.Status.PUBLISHED)
+        for report in reports:
+            EmissionFactory.create_batch(4, bilan=report)
+        cls.report = reports[0]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        # the tables are too small for the planner to prefer an index by itself, a sequential scan left in the
+        # plan means that no index can serve the query
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index):
+        plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+        nodes = list(plan_nodes(plan))
+        scanned = [node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"]
+        self.assertEqual(scanned, [], f"sequential scan in {queryset.query}")
+        self.assertIn(index, [node.get("Index Name") for node in nodes], f"{index} not used by {queryset.query}")
+
+    def test_report_emissions(self):
+        """
+        Test that the emissions of a report are read from the (bilan, poste) index, by poste or all at once
+        """
+        # Report.sum_post
+        self.assertUsesIndex(Emission.objects.filter(poste=1, bilan=self.report), "emission_report_post_idx")
+        # ReportEmissionsView and data.bulk.report_post_totals
+        self.assertUsesIndex(Emission.objects.filter(bilan=self.report.id), "emission_report_post_idx")
+        self.assertUsesIndex(
+            Emission.objects.filter(bilan_id__in=[self.report.id, self.report.id + 1]), "emission_report_post_idx"
+        )
+
+    def test_reports(self):
+        """
+        Test that the reports of a user are read from their index
+        """
+        constraints = connection.introspection.get_constraints(connection.cursor(), Report._meta.db_table)
+        [gestionnaire_index] = [
+            name
+            for name, constraint in constraints.items()
+            if constraint["index"] and constraint["columns"] == ["gestionnaire_id"]
+        ]
+        # ReportsView
+        self.assertUsesIndex(Report.objects.filter(gestionnaire=self.user), gestionnaire_index)
+
+    def test_change_feed(self):
+        """
+        Test that the change feed reads the (modification_date, id) indexes from the cursor position
+        """
+        date = timezone.now() - timedelta(days=1)
+        for model, index in [(Report, "report_changes_idx"), (Emission, "emission_changes_idx")]:
+            # api.change_feed.changes_after
+            queryset = model.objects.filter(modification_date__lt=timezone.now(), modification_date__gte=date)
+            queryset = queryset.exclude(modification_date=date, id__lte=10)
+            self.assertUsesIndex(queryset.order_by("modification_date", "id")[:101], index)
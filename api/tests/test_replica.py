@@ -0,0 +1,107 @@
+import requests_mock
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITransactionTestCase
+from data.factories import ReportFactory, EmissionFactory
+from data.models import Report
+from data.replica import REPLICA, choose_read_database, reads_from, replica_lag
+from .utils import authenticate, authenticate_staff
+
+
+# the replica alias is a second connection to the test database, which only sees committed data
+@override_settings(READ_FROM_REPLICA=True)
+class TestReplicaRouting(APITransactionTestCase):
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def capture_queries(self):
+        primary = CaptureQueriesContext(connections[DEFAULT_DB_ALIAS])
+        replica = CaptureQueriesContext(connections[REPLICA])
+        return primary, replica
+
+    def test_router(self):
+        """
+        Test that the reads go to the replica only within reads_from, and the writes always to the primary
+        """
+        self.assertEqual(Report.objects.all().db, DEFAULT_DB_ALIAS)
+        with reads_from(REPLICA):
+            self.assertEqual(Report.objects.all().db, REPLICA)
+            report = ReportFactory.create()
+            self.assertEqual(report._state.db, DEFAULT_DB_ALIAS)
+            self.assertEqual(Report.objects.get(id=report.id)._state.db, REPLICA)
+        self.assertEqual(Report.objects.all().db, DEFAULT_DB_ALIAS)
+
+    @authenticate_staff
+    def test_exports(self):
+        """
+        Test that the admin exports read from the replica, streamed content included, unless the primary
+        is asked for
+        """
+        report = ReportFactory.create(siren="515277358")
+        EmissionFactory.create_batch(3, bilan=report)
+        primary, replica = self.capture_queries()
+        with primary, replica:
+            response = self.client.get(reverse("all-emissions-csv-export"))
+            content = b"".join(response.streaming_content)
+        self.assertIn(b"515277358", content)
+        self.assertEqual(content.count(b"\r\n"), 4)
+        self.assertTrue(any("data_emission" in query["sql"] for query in replica.captured_queries))
+        self.assertFalse(any("data_emission" in query["sql"] for query in primary.captured_queries))
+
+        primary, replica = self.capture_queries()
+        with primary, replica:
+            response = self.client.get(reverse("all-emissions-csv-export"), {"source": "primary"})
+            b"".join(response.streaming_content)
+        self.assertEqual(len(replica), 0)
+        self.assertTrue(any("data_emission" in query["sql"] for query in primary.captured_queries))
+
+        primary, replica = self.capture_queries()
+        with primary, replica, override_settings(CHANGE_FEED_LAG=0):
+            response = self.client.get(reverse("changes"))
+        self.assertEqual(len(response.json()["reports"]), 1)
+        self.assertFalse(any("data_report" in query["sql"] for query in primary.captured_queries))
+
+    @authenticate
+    def test_interactive_views(self):
+        """
+        Test that the views used by the companies read what they have just written, from the primary
+        """
+        ReportFactory.create(gestionnaire=authenticate.user)
+        primary, replica = self.capture_queries()
+        with primary, replica:
+            response = self.client.get(reverse("reports"))
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(len(replica), 0)
+
+    @requests_mock.Mocker()
+    @override_settings(KOUMOUL_API_URL="http://example.com/dataset")
+    def test_public_export_command(self, request_mock):
+        """
+        Test that the publicexport command reads the published reports from the replica
+        """
+        ReportFactory.create(siren="515277358", statut=Report.Status.PUBLISHED)
+        post_mocker = request_mock.post("http://example.com/dataset", json={"success": True})
+        primary, replica = self.capture_queries()
+        with primary, replica, patch("builtins.print"):
+            call_command("publicexport")
+        self.assertIn("515277358", post_mocker.last_request.text)
+        self.assertTrue(any("data_publicationsnapshot" in query["sql"] for query in replica.captured_queries))
+        self.assertEqual(len(primary), 0)
+
+    def test_lag_guard(self):
+        """
+        Test that the primary is read when the replica is late or unreachable
+        """
+        # a second connection to the primary isn't late
+        self.assertEqual(replica_lag(), 0)
+        self.assertEqual(choose_read_database(), REPLICA)
+        with patch("data.replica.replica_lag", return_value=31):
+            self.assertEqual(choose_read_database(), DEFAULT_DB_ALIAS)
+        with patch("data.replica.replica_lag", side_effect=OperationalError):
+            self.assertEqual(choose_read_database(), DEFAULT_DB_ALIAS)
+        with override_settings(READ_FROM_REPLICA=False), patch("data.replica.replica_lag") as lag:
+            self.assertEqual(choose_read_database(), DEFAULT_DB_ALIAS)
+            lag.assert_not_called()
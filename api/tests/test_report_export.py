@@ -8,11 +8,18 @@ from django.urls import reverse
 from django.test.utils import override_settings
 from data.region_choices import Region
 from data.insee_naf_division_choices import NafDivision
+from api.serializers import PrivateReportExportSerializer
+from unittest.mock import patch
 
+import io
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests_mock
+import tempfile
 from api.management.commands.publicexport import update_public_export
 
 
+@override_settings(EXPORT_CACHE_DIR=tempfile.mkdtemp())
 class TestPrivateReportExport(APITestCase):
     @authenticate_staff
     def test_csv_report_export(self):
@@ -68,6 +75,99 @@ class TestPrivateReportExport(APITestCase):
         self.assertEqual(response["Content-Type"], "application/xlsx; charset=utf-8")
         self.assertTrue(response["Content-Disposition"].startswith("attachment; filename=bilans_climat_simplifies_"))
 
+    @authenticate_staff
+    def test_export_served_from_cache(self):
+        """
+        Test that a repeated download reuses the generated file until the data changes
+        """
+        report = ReportFactory.create(annee=2020, raison_sociale="First name")
+        ReportFactory.create(annee=2021)
+
+        response = self.client.get(reverse("private-csv-export"))
+        self.assertFalse(response.streaming)
+        first_body = response.content
+
+        with patch.object(PrivateReportExportSerializer, "to_representation") as serialize:
+            response = self.client.get(reverse("private-csv-export"))
+            serialize.assert_not_called()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertTrue(response["Content-Disposition"].startswith("attachment; filename=bilans_climat_simplifies_"))
+        self.assertEqual(b"".join(response.streaming_content), first_body)
+
+        report.raison_sociale = "Second name"
+        report.save()
+        response = self.client.get(reverse("private-csv-export"))
+        self.assertFalse(response.streaming)
+        self.assertIn("Second name", response.content.decode("utf-8"))
+        self.assertNotIn("First name", response.content.decode("utf-8"))
+
+        # the gestionnaire is changed without the report being modified
+        report.gestionnaire.email = "new.email@example.com"
+        report.gestionnaire.save()
+        response = self.client.get(reverse("private-csv-export"))
+        self.assertFalse(response.streaming)
+        self.assertIn("new.email@example.com", response.content.decode("utf-8"))
+        report.gestionnaire.delete()
+        response = self.client.get(reverse("private-csv-export"))
+        self.assertFalse(response.streaming)
+        self.assertNotIn("new.email@example.com", response.content.decode("utf-8"))
+
+    @authenticate_staff
+    def test_xlsx_export_served_from_cache(self):
+        """
+        Test that a repeated xlsx download reuses the generated file
+        """
+        ReportFactory.create(annee=2020)
+        first_body = self.client.get(reverse("private-xlsx-export")).content
+
+        response = self.client.get(reverse("private-xlsx-export"))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/xlsx; charset=utf-8")
+        self.assertTrue(response["Content-Disposition"].startswith("attachment; filename=bilans_climat_simplifies_"))
+        self.assertEqual(b"".join(response.streaming_content), first_body)
+
+    @authenticate_staff
+    def test_parquet_export(self):
+        """
+        Test that private endpoint returns a typed parquet file of data
+        """
+        ReportFactory.create(
+            annee=2020,
+            siren="515277358",
+            region=Region.guadeloupe,
+            naf=NafDivision.aquaculture,
+            mode=Report.CalculationMode.MANUAL,
+            manuel_poste_1=100,
+            manuel_poste_2=200,
+        )
+        ReportFactory.create(annee=2021, region=Region.guadeloupe)
+
+        response = self.client.get(reverse("private-parquet-export"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.parquet")
+        self.assertTrue(response["Content-Disposition"].startswith("attachment; filename=bilans_climat_simplifies_"))
+        table = pq.read_table(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(table.schema.field("annee").type, pa.int16())
+        self.assertEqual(table.schema.field("region").type, pa.dictionary(pa.int32(), pa.string()))
+        self.assertTrue(pa.types.is_timestamp(table.schema.field("creation_date").type))
+        first = table.slice(0, 1).to_pylist()[0]
+        self.assertEqual(first["siren"], "515277358")
+        self.assertEqual(first["annee"], 2020)
+        self.assertEqual(first["nom_region"], "Guadeloupe")
+        self.assertEqual(first["mode"], "Déclaré")
+        self.assertEqual(first["total_t"], 0.3)
+
+    @authenticate
+    def test_only_staff_access_parquet_export(self):
+        """
+        Test that non-staff users are rejected
+        """
+        response = self.client.get(reverse("private-parquet-export"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     @authenticate
     def test_only_staff_access_xlsx_export(self):
         """
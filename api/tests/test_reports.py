@@ -1,11 +1,13 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .utils import authenticate
+from .utils import authenticate, override_emission_factors
 from data.factories import EmissionFactory, ReportFactory, UserFactory
-from data.models import Report
+from data.models import Report, PublicationSnapshot
 from data.emission_factors import get_emission_factors
-from unittest.mock import patch
 from django.utils import timezone
 from datetime import timedelta
 
@@ -205,7 +207,7 @@ class TestReportApi(APITestCase):
         },
     }
 
-    @patch.object(get_emission_factors(), "emission_factors", example_emission_factors)
+    @override_emission_factors(example_emission_factors)
     @authenticate
     def test_report_totals(self):
         """
@@ -250,7 +252,7 @@ class TestReportApi(APITestCase):
         self.assertEqual(body["poste2"], 3)
         self.assertEqual(body["total"], 28)
 
-    @patch.object(get_emission_factors(), "emission_factors", example_emission_factors)
+    @override_emission_factors(example_emission_factors)
     @authenticate
     def test_report_totals_rounded(self):
         """
@@ -273,6 +275,54 @@ class TestReportApi(APITestCase):
         self.assertEqual(my_report.poste_2, 0)
         self.assertEqual(my_report.total, 1)
 
+    @override_emission_factors(example_emission_factors)
+    @authenticate
+    def test_publication_snapshot(self):
+        """
+        Publishing a report freezes its totals and emissions, later changes don't alter the snapshot
+        until the report is published again. Going back to draft removes the snapshot.
+        """
+        my_report = ReportFactory.create(gestionnaire=authenticate.user)
+        self.assertFalse(PublicationSnapshot.objects.exists())
+        EmissionFactory.create(
+            bilan=my_report, valeur=10, type="Gaz naturel", unite="GJ PCI", localisation="France continentale", poste=1
+        )
+
+        response = self.client.patch(reverse("report", kwargs={"pk": my_report.id}), {"statut": "publié"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        snapshot = PublicationSnapshot.objects.get(bilan=my_report)
+        self.assertEqual((snapshot.poste_1, snapshot.poste_2, snapshot.total), (5, 0, 5))
+        self.assertEqual(snapshot.siren, my_report.siren)
+        self.assertEqual(snapshot.factor_version, get_emission_factors().version)
+        self.assertEqual(len(snapshot.emissions), 1)
+        self.assertEqual(snapshot.emissions[0]["facteur_d_emission"], "0.5")
+        self.assertEqual(snapshot.emissions[0]["resultat"], "5.0")
+
+        EmissionFactory.create(
+            bilan=my_report, valeur=10, type="Essence, E10", unite="kg", localisation="France continentale", poste=2
+        )
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.total, 5)
+
+        self.client.patch(reverse("report", kwargs={"pk": my_report.id}), {"statut": "publié"})
+        snapshot = PublicationSnapshot.objects.get(bilan=my_report)
+        self.assertEqual((snapshot.poste_1, snapshot.poste_2, snapshot.total), (5, 1, 6))
+
+        self.client.patch(reverse("report", kwargs={"pk": my_report.id}), {"statut": "brouillon"})
+        self.assertFalse(PublicationSnapshot.objects.exists())
+
+    @authenticate
+    def test_publish_large_totals(self):
+        """
+        Totals above 2^31 kgCO2e can be published
+        """
+        my_report = ReportFactory.create(
+            gestionnaire=authenticate.user, mode="manuel", manuel_poste_1=2_000_000_000, manuel_poste_2=2_000_000_000
+        )
+        response = self.client.patch(reverse("report", kwargs={"pk": my_report.id}), {"statut": "publié"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(PublicationSnapshot.objects.get(bilan=my_report).total, 4_000_000_000)
+
     @authenticate
     def test_delete_report(self):
         """
@@ -434,3 +484,31 @@ class TestReportApi(APITestCase):
 
         reports = Report.objects.all()
         self.assertEqual(len(reports), 0)
+
+
+class TestPublicationSnapshotMigration(TransactionTestCase):
+    def migrate(self, target=None):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        targets = [("data", target)] if target else executor.loader.graph.leaf_nodes()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_migration(self):
+        """
+        Test that the reports published before the snapshots are given one
+        """
+        self.addCleanup(self.migrate)
+        apps = self.migrate("0010_change_feed")
+        report = apps.get_model("data", "Report").objects.create(
+            siren="000000000", annee=2021, raison_sociale="Entreprise", statut="publié"
+        )
+        apps.get_model("data", "Emission").objects.create(
+            bilan=report, poste=1, valeur=100, type="Anthracite", unite="kg", localisation="Corse"
+        )
+
+        apps = self.migrate("0011_publication_snapshot")
+        snapshot = apps.get_model("data", "PublicationSnapshot").objects.get(bilan_id=report.id)
+        self.assertEqual((snapshot.poste_1, snapshot.poste_2, snapshot.total), (263, 0, 263))
+        self.assertEqual(snapshot.emissions[0]["facteur_d_emission"], "2.63")
+        self.assertEqual(snapshot.publication_date, report.modification_date)
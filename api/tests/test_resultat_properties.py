@@ -0,0 +1,70 @@
+from decimal import Decimal
+from django.test import SimpleTestCase
+from hypothesis import given, settings, strategies as st
+from data.bulk import resultats, post_totals
+from data.emission_factors import scale_factor
+from data.models import Emission, compute_resultat, sum_results
+from .utils import override_emission_factors
+
+valeurs = st.decimals(min_value="-99999999.99", max_value="99999999.99", places=2)
+factors = st.integers(min_value=0, max_value=6).flatmap(
+    lambda places: st.decimals(min_value=0, max_value=10000, places=places)
+)
+# factors are written in the file in plain or scientific notation
+factor_texts = factors.flatmap(lambda factor: st.sampled_from([str(factor), f"{factor:E}", f"{factor:.2E}"]))
+
+
+class TestResultatProperties(SimpleTestCase):
+    @settings(max_examples=200, deadline=None)
+    @given(factors)
+    def test_scaled_factor(self, factor):
+        scaled = scale_factor(factor)
+        self.assertEqual(Decimal(scaled.scaled).scaleb(-scaled.places), factor)
+        self.assertEqual(scaled.value, factor)
+
+    @settings(max_examples=300, deadline=None)
+    @given(st.lists(st.tuples(valeurs, st.none() | factors, st.integers(min_value=1, max_value=2)), max_size=50))
+    def test_integer_results_are_decimal_results(self, emissions):
+        """
+        The results and totals computed with scaled integers are the Decimal ones, down to their representation
+        """
+        valeurs_ = [valeur for valeur, _, _ in emissions]
+        factors_ = [scale_factor(factor) if factor is not None else None for _, factor, _ in emissions]
+        expected = [compute_resultat(valeur, factor) for valeur, factor, _ in emissions]
+        self.assertEqual(list(map(str, resultats(valeurs_, factors_))), list(map(str, expected)))
+
+        postes = [poste for _, _, poste in emissions]
+        totals = {poste: sum_results(r for r, p in zip(expected, postes) if p == poste) for poste in set(postes)}
+        self.assertEqual(post_totals([0] * len(emissions), postes, valeurs_, factors_), {0: totals} if totals else {})
+
+    @settings(max_examples=200, deadline=None)
+    @given(valeurs, factor_texts)
+    def test_emission_resultat(self, valeur, factor_text):
+        """
+        An emission gives the factor as written in the file and the result of compute_resultat
+        """
+        emission_factors = {"Gaz naturel": {"facteurs": {"France continentale": {"kgCO2e/kg": factor_text}}}}
+        with override_emission_factors(emission_factors):
+            emission = Emission(valeur=valeur, type="Gaz naturel", unite="kg", localisation="France continentale")
+            self.assertEqual(str(emission.facteur_d_emission), str(Decimal(factor_text)))
+            self.assertEqual(str(emission.resultat), str(compute_resultat(valeur, Decimal(factor_text))))
+
+    def test_resultat_follows_changes(self):
+        """
+        The memoized result is computed again when the emission or the factors change
+        """
+        emission_factors = {"Gaz naturel": {"facteurs": {"France continentale": {"kgCO2e/kg": "2"}}}}
+        with override_emission_factors(emission_factors):
+            emission = Emission(valeur=Decimal("1.25"), type="Gaz naturel", unite="kg", localisation="Corse")
+            self.assertEqual(emission.resultat, Decimal("2.5"))
+            self.assertEqual(str(emission.facteur_d_emission), "2")
+            emission.valeur = Decimal("3.00")
+            self.assertEqual(emission.resultat, Decimal("6.0"))
+            emission.unite = "litre"
+            self.assertIsNone(emission.resultat)
+            emission.unite = "kg"
+            self.assertEqual(emission.resultat, Decimal("6.0"))
+
+        other_factors = {"Gaz naturel": {"facteurs": {"France continentale": {"kgCO2e/kg": "0.5"}}}}
+        with override_emission_factors(other_factors):
+            self.assertEqual(emission.resultat, Decimal("1.5"))
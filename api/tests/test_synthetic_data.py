@@ -0,0 +1,19 @@
+from django.test import TestCase
+from django.core.management import call_command
+from data.models import Report, Emission, PublicationSnapshot, luhn_validation
+
+
+class TestSyntheticData(TestCase):
+    def test_generate_synthetic_data(self):
+        """
+        Test that the command creates valid reports with emissions matching the factor file
+        """
+        call_command("generatesyntheticdata", reports=5, emissions_per_report=3, stdout=None)
+        call_command("generatesyntheticdata", reports=5, emissions_per_report=3, stdout=None)
+        self.assertEqual(Report.objects.count(), 10)
+        self.assertEqual(Emission.objects.count(), 30)
+        for report in Report.objects.all():
+            luhn_validation(report.siren)
+        self.assertTrue(any(emission.resultat is not None for emission in Emission.objects.all()))
+        published = Report.objects.filter(statut=Report.Status.PUBLISHED)
+        self.assertEqual(PublicationSnapshot.objects.count(), published.count())
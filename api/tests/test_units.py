@@ -0,0 +1,130 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from fractions import Fraction
+from django.test import SimpleTestCase
+from data.emission_factors import EmissionFactors, compile_factors
+from data.units import COEFFICIENTS, UNITS, CONVERSION_DIGITS, resolve_unit, convert_factor, factor_conversions
+
+
+class TestUnits(SimpleTestCase):
+    emission_factors = {
+        "Fioul": {
+            "classification": "carburant",
+            "facteurs": {
+                "France continentale": {
+                    "kgCO2e/GJ PCI": "98.7",
+                    "kgCO2e/kWhPCI": "0.356",
+                    "kgCO2e/TEP PCI": "4147",
+                    "kgCO2e/kWh PCS": "0.32",
+                    "kgCO2e/kg": "2.63",
+                },
+                "Mayotte": {"kgCO2e/tep PCI": "4200", "kgCO2e/Litre": "2.48"},
+            },
+            "poste": "1",
+        },
+        "Gaz": {
+            "classification": "carburant",
+            "facteurs": {"France continentale": {"kgCO2e/GJ PCI": "56.9", "kgCO2e/m3 (n)": "2.05"}},
+            "poste": "1",
+        },
+    }
+
+    def test_spellings(self):
+        """
+        Test that the spellings of the Base Carbone resolve to the same unit, and energies without PCS to PCI
+        """
+        for spelling in ["kWh PCI", "kWhPCI", "kWh (PCI)", "KWh PCI", "kwh"]:
+            self.assertEqual(resolve_unit(spelling).name, "kWh PCI")
+        for spelling in ["tep PCI", "TEP PCI", "Tep PCI", "tep"]:
+            self.assertEqual(resolve_unit(spelling).name, "tep PCI")
+        self.assertEqual(resolve_unit("kWhPCS").name, "kWh PCS")
+        self.assertEqual(resolve_unit("t").name, "tonne")
+        self.assertEqual(resolve_unit("Litre").name, "litre")
+        self.assertIsNone(resolve_unit("m3 (n)"))
+        self.assertIsNone(resolve_unit("t.km"))
+        self.assertIsNone(resolve_unit(None))
+
+    def test_coefficients(self):
+        """
+        Test that the coefficients are exact fractions, consistent along every path of the conversion graph
+        """
+        self.assertEqual(COEFFICIENTS[("MWh PCI", "GJ PCI")], Fraction("3.6"))
+        self.assertEqual(COEFFICIENTS[("tep PCI", "GJ PCI")], Fraction("41.868"))
+        self.assertEqual(COEFFICIENTS[("tonne", "kg")], 1000)
+        self.assertEqual(COEFFICIENTS[("m3", "litre")], 1000)
+        self.assertNotIn(("kWh PCI", "kWh PCS"), COEFFICIENTS)
+        self.assertNotIn(("kg", "litre"), COEFFICIENTS)
+        for a in UNITS:
+            for b in UNITS:
+                if (a.name, b.name) not in COEFFICIENTS:
+                    continue
+                self.assertEqual(COEFFICIENTS[(a.name, b.name)] * COEFFICIENTS[(b.name, a.name)], 1)
+                for c in UNITS:
+                    if (b.name, c.name) in COEFFICIENTS:
+                        path = COEFFICIENTS[(a.name, b.name)] * COEFFICIENTS[(b.name, c.name)]
+                        self.assertEqual(path, COEFFICIENTS[(a.name, c.name)])
+
+    def test_convert_factor(self):
+        """
+        Test that converted factors are exact decimals, or rounded to CONVERSION_DIGITS when they can't be
+        """
+        self.assertEqual(str(convert_factor(Decimal("0.356"), "kgCO2e/kWh PCI", resolve_unit("MWh"))), "356")
+        self.assertEqual(str(convert_factor(Decimal("98.7"), "kgCO2e/GJ PCI", resolve_unit("kWh"))), "0.35532")
+        self.assertEqual(str(convert_factor(Decimal("2.63"), "kgCO2e/kg", resolve_unit("g"))), "0.00263")
+        self.assertEqual(str(convert_factor(Decimal("2.48"), "kgCO2e/Litre", resolve_unit("m3"))), "2480")
+        converted = convert_factor(Decimal("4147"), "kgCO2e/tep PCI", resolve_unit("kWh"))
+        self.assertEqual(len(converted.as_tuple().digits), CONVERSION_DIGITS)
+        self.assertLess(abs(Fraction(converted) - Fraction(4147, 11630)), Fraction(1, 10**CONVERSION_DIGITS))
+        value = Decimal("0.356")
+        self.assertIs(convert_factor(value, "kgCO2e/kWhPCI", resolve_unit("kWh (PCI)")), value)
+
+    def test_factor_conversions(self):
+        """
+        Test that the same unit is used first, then a power of ten, then another exact conversion
+        """
+        conversions = factor_conversions(self.emission_factors["Fioul"]["facteurs"]["France continentale"])
+        self.assertEqual(conversions["kWh PCI"], "kgCO2e/kWhPCI")
+        self.assertEqual(conversions["MWh PCI"], "kgCO2e/kWhPCI")
+        self.assertEqual(conversions["MJ PCI"], "kgCO2e/GJ PCI")
+        self.assertEqual(conversions["tep PCI"], "kgCO2e/TEP PCI")
+        self.assertEqual(conversions["GWh PCS"], "kgCO2e/kWh PCS")
+        self.assertEqual(conversions["tonne"], "kgCO2e/kg")
+        self.assertNotIn("litre", conversions)
+
+    def test_lookups(self):
+        """
+        Test that the factors are found for compatible units, the same way from the JSON file and the mapped table
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "emission-factors.json")
+            with open(path, "w") as f:
+                json.dump(self.emission_factors, f)
+            table_path = os.path.join(directory, "emission-factors.table")
+            compile_factors(path, os.path.join(directory, "emission-factors.pickle"), table_path)
+            from_json = EmissionFactors(path)
+            mapped = EmissionFactors(path, table_path=table_path)
+            self.assertTrue(mapped.uses_table)
+            expected = [
+                (("Fioul", "kWh PCI", "France continentale"), "0.356"),
+                (("Fioul", "kWh (PCI)", "France continentale"), "0.356"),
+                (("Fioul", "MWh", "France continentale"), "356"),
+                (("Fioul", "GJ", "France continentale"), "98.7"),
+                (("Fioul", "kWhPCS", "France continentale"), "0.32"),
+                (("Fioul", "t", "France continentale"), "2630"),
+                (("Fioul", "litre", "France continentale"), None),
+                (("Fioul", "kWh PCI", "Mayotte"), "0.361134995701"),
+                (("Fioul", "m3", "Mayotte"), "2480"),
+                (("Fioul", "kWh PCS", "Mayotte"), None),
+                (("Fioul", "MWh", None), None),
+                (("Gaz", "MWh", None), "204.84"),
+                (("Gaz", "m3 (n)", "Corse"), "2.05"),
+                (("Gaz", "m3", None), None),
+                (("Gaz", "furlong", None), None),
+                (("Inconnu", "kWh", None), None),
+            ]
+            for lookup, factor in expected:
+                for emission_factors in [from_json, mapped]:
+                    found = emission_factors.get_factor(*lookup)
+                    self.assertEqual(str(found) if found is not None else None, factor, lookup)
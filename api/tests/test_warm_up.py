@@ -0,0 +1,59 @@
+import gc
+import os
+import runpy
+import sys
+import tempfile
+from unittest.mock import patch
+from django.conf import settings
+from django.test import SimpleTestCase
+from data.emission_factors import EmissionFactors, compile_factors, get_emission_factors
+from djangoapp.warmup import warm_up, HEAVY_MODULES
+
+
+class TestWarmUp(SimpleTestCase):
+    def test_warm_up(self):
+        """
+        Test that the warm-up imports the heavy modules and loads the factors, without using the database
+        """
+        self.addCleanup(gc.unfreeze)
+        warm_up()
+        for module in HEAVY_MODULES:
+            self.assertIn(module, sys.modules)
+        self.assertIsNotNone(get_emission_factors().lookup_caches)
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+    def test_factors_warm_up(self):
+        """
+        Test that the warm-up maps the factor table without loading the JSON file, and builds the index otherwise
+        """
+        self.addCleanup(gc.unfreeze)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        compiled_path = os.path.join(directory.name, "emission-factors.pickle")
+        table_path = os.path.join(directory.name, "emission-factors.table")
+        compile_factors(compiled_path=compiled_path, table_path=table_path)
+
+        mapped = EmissionFactors(compiled_path=compiled_path, table_path=table_path)
+        with patch("data.emission_factors.emission_factors", mapped):
+            warm_up()
+        self.assertIsNone(mapped._index)
+        self.assertNotIn("emission_factors", mapped.__dict__)
+
+        from_json = EmissionFactors()
+        with patch("data.emission_factors.emission_factors", from_json):
+            warm_up()
+        self.assertIsNotNone(from_json._index)
+
+    def test_gunicorn_config(self):
+        """
+        Test that gunicorn preloads the app in threaded workers, as many as the environment asks for
+        """
+        path = os.path.join(settings.BASE_DIR, "gunicorn.conf.py")
+        config = runpy.run_path(path)
+        self.assertEqual(config["wsgi_app"], "djangoapp.wsgi")
+        self.assertTrue(config["preload_app"])
+        self.assertEqual(config["worker_class"], "gthread")
+        self.assertGreaterEqual(config["workers"], 1)
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "3", "GUNICORN_THREADS": "8"}):
+            config = runpy.run_path(path)
+        self.assertEqual((config["workers"], config["threads"]), (3, 8))
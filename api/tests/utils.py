@@ -1,5 +1,10 @@
 import functools
-
+import json
+import os
+import tempfile
+from unittest.mock import patch
+from django.test.utils import TestContextDecorator
+from data.emission_factors import EmissionFactors
 from data.factories import (
     UserFactory,
 )
@@ -23,3 +28,25 @@ def authenticate_staff(func):
         return func(*args, **kwargs)
 
     return authenticate_and_func
+
+
+class override_emission_factors(TestContextDecorator):
+    """
+    Makes get_emission_factors give the factors passed, read from a file as the ones of the app
+    """
+
+    def __init__(self, emission_factors):
+        self.emission_factors = emission_factors
+        super().__init__()
+
+    def enable(self):
+        # the file is read when the factors are created
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "emission-factors.json")
+            with open(path, "w") as f:
+                json.dump(self.emission_factors, f)
+            self.patcher = patch("data.emission_factors.emission_factors", EmissionFactors(path))
+        self.patcher.start()
+
+    def disable(self):
+        self.patcher.stop()
@@ -3,8 +3,9 @@ from django.urls import path
 from api.views import AdemeUserView, CreateAccountView
 from api.views import ReportsView, ReportView
 from api.views import ReportEmissionsView, EmissionsView, EmissionView
-from api.views import PrivateExportView, PrivateXlsxExportView, EmissionsExportView, EmissionsXlsxExportView
-from api.views import EmissionFactorsFile
+from api.views import EmissionFactorsFile, PublicReportsView, ChangesView, CalculationView
+from api.views import EmissionFactorsPosteView, EmissionFactorsSearchView, EmissionFactorsCompactView
+from api.utils import lazy_view
 
 urlpatterns = {
     path("ademeUser/", AdemeUserView.as_view(), name="ademe_user"),
@@ -13,15 +14,35 @@ urlpatterns = {
     path("bilans/<int:report_pk>/emissions", ReportEmissionsView.as_view(), name="report_emissions"),
     path("emissions/", EmissionsView.as_view(), name="emissions"),
     path("emissions/<int:pk>", EmissionView.as_view(), name="emission"),
-    path("export/", PrivateExportView.as_view(), name="private-csv-export"),
-    path("xlsxExport/", PrivateXlsxExportView.as_view({"get": "list"}), name="private-xlsx-export"),
-    path("emissionsExport/<int:report_pk>", EmissionsExportView.as_view(), name="emissions-csv-export"),
+    path("export/", lazy_view("api.export_views.PrivateExportView"), name="private-csv-export"),
+    path(
+        "xlsxExport/", lazy_view("api.export_views.PrivateXlsxExportView", {"get": "list"}), name="private-xlsx-export"
+    ),
+    path("parquetExport/", lazy_view("api.export_views.PrivateParquetExportView"), name="private-parquet-export"),
+    path("emissionsExport/", lazy_view("api.export_views.AllEmissionsExportView"), name="all-emissions-csv-export"),
+    path("emissionsZipExport/", lazy_view("api.export_views.EmissionsBundleExportView"), name="emissions-zip-export"),
+    path(
+        "emissionsParquetExport/",
+        lazy_view("api.export_views.AllEmissionsParquetExportView"),
+        name="emissions-parquet-export",
+    ),
+    path(
+        "emissionsExport/<int:report_pk>",
+        lazy_view("api.export_views.EmissionsExportView"),
+        name="emissions-csv-export",
+    ),
     path(
         "emissionsXlsxExport/<int:report_pk>",
-        EmissionsXlsxExportView.as_view({"get": "list"}),
+        lazy_view("api.export_views.EmissionsXlsxExportView", {"get": "list"}),
         name="emissions-xlsx-export",
     ),
+    path("public/bilans/", PublicReportsView.as_view(), name="public-reports"),
+    path("changes/", ChangesView.as_view(), name="changes"),
+    path("calcul/", CalculationView.as_view(), name="calculation"),
     path("emissionFactors/", EmissionFactorsFile.as_view(), name="ef-file"),
+    path("emissionFactors/poste/<int:poste>", EmissionFactorsPosteView.as_view(), name="ef-poste"),
+    path("emissionFactors/search/", EmissionFactorsSearchView.as_view(), name="ef-search"),
+    path("emissionFactors/compact/", EmissionFactorsCompactView.as_view(), name="ef-compact"),
     path("ademeAccount/", CreateAccountView.as_view(), name="create_account"),
 }
 
@@ -1,7 +1,60 @@
 import json
+from django.http import FileResponse
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
 from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from data.replica import read_database, choose_read_database, iter_reads_from
+
+# ?source=primary reads the latest data, for an export right after a change
+PRIMARY_SOURCE = "primary"
 
 
 def camelize(data):
     camel_case_bytes = CamelCaseJSONRenderer().render(data)
     return json.loads(camel_case_bytes.decode("utf-8"))
+
+
+def lazy_view(path, actions=None):
+    """
+    The view of the class at the dotted path, its module being imported on the first request it serves
+    """
+    view = None
+
+    # like the views of DRF, which authenticate the requests themselves
+    @csrf_exempt
+    def lazy(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view_class = import_string(path)
+            view = view_class.as_view(actions) if actions else view_class.as_view()
+        return view(request, *args, **kwargs)
+
+    return lazy
+
+
+class ReplicaReadMixin:
+    """
+    Once the request is authenticated and allowed, the view reads from the replica unless the request has
+    ?source=primary. So does the content of a streamed response, generated after the view has returned.
+    """
+
+    read_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.query_params.get("source") != PRIMARY_SOURCE:
+            self.read_token = read_database.set(choose_read_database())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.read_token is None:
+            return super().finalize_response(request, response, *args, **kwargs)
+        try:
+            response = super().finalize_response(request, response, *args, **kwargs)
+        finally:
+            alias = read_database.get()
+            read_database.reset(self.read_token)
+            self.read_token = None
+        # files on disk are sent without querying
+        if response.streaming and not isinstance(response, FileResponse):
+            response.streaming_content = iter_reads_from(alias, response.streaming_content)
+        return response
@@ -3,10 +3,10 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import BadRequest
 from django.db import transaction
 from django.db.utils import IntegrityError
-from django.http.response import JsonResponse
-from django.utils import timezone
+from django.http.response import JsonResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags, patch_cache_control
 from rest_framework import permissions, status
-from rest_framework.exceptions import NotFound, NotAuthenticated
+from rest_framework.exceptions import NotFound, NotAuthenticated, ValidationError
 from rest_framework.generics import (
     ListCreateAPIView,
     RetrieveUpdateDestroyAPIView,
@@ -16,19 +16,16 @@ from rest_framework.generics import (
 from rest_framework.response import Response
 from rest_framework.status import HTTP_201_CREATED, HTTP_200_OK
 from rest_framework.views import APIView
-from api.serializers import ReportSerializer, PrivateReportExportSerializer
-from api.serializers import UserSerializer, EmissionSerializer, EmissionExportSerializer
+from api.serializers import ReportSerializer
+from api.serializers import UserSerializer, EmissionSerializer, CalculationSerializer
 from data.models import Report, Emission
 from .permissions import CanManageReport, CanManageEmissions
-from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_csv import renderers as r
-from .utils import camelize
+from .utils import camelize, ReplicaReadMixin
+from . import open_data, change_feed
+from .calculation import calculate
 from data.emission_factors import get_emission_factors
-from rest_framework.viewsets import ReadOnlyModelViewSet
-from drf_excel.mixins import XLSXFileMixin
-from drf_excel.renderers import XLSXRenderer
-import requests
 import json
+import hashlib
 
 
 class AdemeUserView(APIView):
@@ -71,6 +68,8 @@ class AdemeUserView(APIView):
     # wrap to allow for patching in tests
     @staticmethod
     def _get_token(token):
+        from rest_framework_simplejwt.tokens import UntypedToken
+
         return UntypedToken(token)
 
 
@@ -130,154 +129,132 @@ class EmissionView(RetrieveUpdateDestroyAPIView):
     queryset = Emission.objects.all()
 
 
-class PrivateReportExportRenderer(r.CSVRenderer):
-    header = [
-        "siren",
-        "annee",
-        "raison_sociale",
-        "region",
-        "nom_region",
-        "naf",
-        "nom_naf",
-        "nombre_salaries",
-        "mode",
-        "poste_1_t",
-        "poste_2_t",
-        "total_t",
-        "statut",
-        "creation_date",
-        "publication_date",
-        "gestionnaire_email",
-        "gestionnaire_first_name",
-        "gestionnaire_last_name",
-    ]
-    labels = {
-        **PrivateReportExportSerializer.get_labels(),
-        **{
-            "gestionnaire_email": "Email du créateur du bilan",
-            "gestionnaire_first_name": "Prénom du créateur du bilan",
-            "gestionnaire_last_name": "Nom du créateur du bilan",
-        },
-    }
+def etag_matches(etag, if_none_match):
+    """
+    Whether an If-None-Match header, a list of ETags or *, holds the ETag with the weak comparison
+    """
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in etags]
 
 
-class PrivateExportView(ListAPIView):
-    renderer_classes = (PrivateReportExportRenderer,)
-    model = Report
-    serializer_class = PrivateReportExportSerializer
-    queryset = Report.objects.all()
-    permission_classes = [permissions.IsAdminUser]
+class PublicReportsView(APIView):
+    """
+    Open data: published reports, paginated by id with the `after` cursor and filtered by siren, annee, region and naf
+    """
 
-    def finalize_response(self, request, response, *args, **kwargs):
-        response["Content-Disposition"] = "attachment; filename=%s" % (self.get_filename())
-        return super().finalize_response(request, response, *args, **kwargs)
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    default_limit = 100
+    max_limit = 1000
 
-    def get_filename(self):
-        timestamp = timezone.now().strftime("%Y-%m-%d")
-        return f"bilans_climat_simplifies_{timestamp}.csv"
+    def get(self, request):
+        filters = {name: request.query_params[name] for name in open_data.FILTERS if request.query_params.get(name)}
+        try:
+            after = int(request.query_params["after"]) if request.query_params.get("after") else None
+            limit = min(int(request.query_params.get("limit", self.default_limit)), self.max_limit)
+        except ValueError:
+            raise ValidationError("Les paramètres after et limit doivent être des nombres")
+        if limit < 1:
+            raise ValidationError("Le paramètre limit doit être positif")
+
+        snapshot = open_data.get_snapshot()
+        etag = '"%s"' % hashlib.sha256(f"{snapshot.version}{request.get_full_path()}".encode("utf-8")).hexdigest()[:32]
+        if etag_matches(etag, request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = HttpResponseNotModified()
+        else:
+            results, next_cursor = snapshot.page(filters, after=after, limit=limit)
+            response = Response({"results": results, "next": next_cursor})
+        response["ETag"] = etag
+        patch_cache_control(response, public=True, max_age=settings.OPEN_DATA_SNAPSHOT_TTL)
+        return response
 
 
-class PrivateXlsxExportView(XLSXFileMixin, ReadOnlyModelViewSet):
-    queryset = Report.objects.all()
-    serializer_class = PrivateReportExportSerializer
-    renderer_classes = [XLSXRenderer]
+class ChangesView(ReplicaReadMixin, APIView):
+    """
+    Reports (and emissions with `include=emissions`) modified, and objects deleted, since the given cursor.
+    Changes are served once their date is older than the CHANGE_FEED_LAG setting: a consumer following the
+    cursors misses none of the changes committed within that delay, and sees them that much later.
+    """
+
     permission_classes = [permissions.IsAdminUser]
-    xlsx_use_labels = True
-    column_header = {
-        "height": 20,
-        "style": {
-            "font": {
-                "bold": True,
-            },
-        },
-    }
-    body = {
-        "style": {
-            "alignment": {
-                "horizontal": "left",
-                "vertical": "center",
-            },
-        },
-        "height": 20,
-    }
+    default_limit = 100
+    max_limit = 1000
 
-    def get_filename(self, request):
-        timestamp = timezone.now().strftime("%Y-%m-%d")
-        return f"bilans_climat_simplifies_{timestamp}.xlsx"
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get("limit", self.default_limit)), self.max_limit)
+        except ValueError:
+            raise ValidationError({"limit": "Un nombre est attendu"})
+        if limit < 1:
+            raise ValidationError({"limit": "Le paramètre limit doit être positif"})
+        changes = change_feed.get_changes(
+            cursor=request.query_params.get("cursor"),
+            limit=limit,
+            include_emissions=request.query_params.get("include") == "emissions",
+        )
+        return Response(changes)
+
+
+class CalculationView(APIView):
+    """
+    Results of emissions which are not saved, to preview a report without writing to the database
+    """
 
+    # no user lookup: the calculation doesn't touch the database
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
 
-class EmissionExportRenderer(r.CSVRenderer):
-    header = ["type", "valeur", "unite", "facteur_d_emission", "resultat", "poste", "localisation", "note"]
-    labels = EmissionExportSerializer.get_labels()
+    def post(self, request):
+        serializer = CalculationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(calculate(serializer.validated_data["emissions"]))
 
 
-class EmissionsExportView(ListAPIView):
-    renderer_classes = (EmissionExportRenderer,)
-    model = Emission
-    serializer_class = EmissionExportSerializer
-    permission_classes = [permissions.IsAuthenticated]
+class EmissionFactorsFile(APIView):
+    def get(self, _):
+        return JsonResponse(get_emission_factors().emission_factors, status=status.HTTP_200_OK)
 
-    def get_queryset(self):
-        report_id = self.request.parser_context.get("kwargs").get("report_pk")
-        report = Report.objects.get(pk=report_id)
-        if report.gestionnaire != self.request.user:
-            raise NotFound()
-        return Emission.objects.filter(bilan=report_id)
 
-    def finalize_response(self, request, response, *args, **kwargs):
-        if response.status_code == 200:
-            response["Content-Disposition"] = "attachment; filename=%s" % (self.get_filename())
-        return super().finalize_response(request, response, *args, **kwargs)
+class EmissionFactorsPosteView(APIView):
+    """
+    The emission factors of a poste, optionally of one groupe, in the format of the full file
+    """
 
-    def get_filename(self):
-        report_id = self.request.parser_context.get("kwargs").get("report_pk")
-        report = Report.objects.get(pk=report_id)
-        return f"export_{report.siren}_{report.annee}.csv"
+    def get(self, request, poste):
+        index = get_emission_factors().index
+        types = index.types(poste, request.query_params.get("groupe"))
+        return JsonResponse(index.subset(types), status=status.HTTP_200_OK)
 
 
-class EmissionsXlsxExportView(XLSXFileMixin, ReadOnlyModelViewSet):
-    queryset = Emission.objects.all()
-    serializer_class = EmissionExportSerializer
-    renderer_classes = [XLSXRenderer]
-    permission_classes = [permissions.IsAuthenticated]
-    xlsx_use_labels = True
-    column_header = {
-        "height": 20,
-        "style": {
-            "font": {
-                "bold": True,
-            },
-        },
-    }
-    body = {
-        "style": {
-            "alignment": {
-                "horizontal": "left",
-                "vertical": "center",
-            },
-        },
-        "height": 20,
-    }
+class EmissionFactorsSearchView(APIView):
+    """
+    The emission factors with a word of their name starting with `q`, ignoring case and accents
+    """
 
-    def get_queryset(self):
-        report_id = self.request.parser_context.get("kwargs").get("report_pk")
-        report = Report.objects.get(pk=report_id)
-        if report.gestionnaire != self.request.user:
-            raise NotFound()
-        return Emission.objects.filter(bilan=report_id)
+    max_limit = 100
 
-    def get_filename(self, request, report_pk):
-        report = Report.objects.get(pk=report_pk)
-        return f"export_{report.siren}_{report.annee}.xlsx"
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get("limit", 20)), self.max_limit)
+        except ValueError:
+            raise ValidationError({"limit": "Un nombre est attendu"})
+        if limit < 1:
+            raise ValidationError({"limit": "Le paramètre limit doit être positif"})
+        index = get_emission_factors().index
+        types = index.search(request.query_params.get("q", ""), limit=limit)
+        return JsonResponse(index.subset(types), status=status.HTTP_200_OK)
 
 
-class EmissionFactorsFile(APIView):
+class EmissionFactorsCompactView(APIView):
     def get(self, _):
-        return JsonResponse(get_emission_factors().emission_factors, status=status.HTTP_200_OK)
+        return JsonResponse(get_emission_factors().index.compact, status=status.HTTP_200_OK)
 
 
 def get_authorization_header():
     """Retrieve a service token to call ADEME users API"""
+    # outbound HTTP is only needed by the account creation, requests is imported then
+    import requests
+
     token_endpoint = f"{settings.AUTH_KEYCLOAK}/auth/realms/{settings.AUTH_REALM}/protocol/openid-connect/token"
     token_parameters = {
         "client_id": settings.AUTH_CLIENT_ID,
@@ -299,6 +276,8 @@ def get_authorization_header():
 
 class CreateAccountView(APIView):
     def post(self, _):
+        import requests
+
         body = json.loads(self.request.body)
         email = body.get("email")
         firstname = body.get("firstname")
@@ -345,6 +324,8 @@ class CreateAccountView(APIView):
             return JsonResponse({}, status=HTTP_201_CREATED)
 
     def get(self, _):
+        import requests
+
         # method for testing VPN connection
         headers = get_authorization_header()
         search_endpoint = f"{settings.AUTH_USERS_API}/api/users/search?email=test@example.com"
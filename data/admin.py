@@ -102,7 +102,7 @@ class EmissionAdmin(admin.ModelAdmin):
         "localisation",
         "creation_date",
     )
-    search_fields = ("type",)
+    search_fields = ("factor_key__type",)
     readonly_fields = (
         "bilan",
         "type",
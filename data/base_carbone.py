@@ -0,0 +1,120 @@
+# Téléchargement des lignes de la Base Carbone depuis l'API data-fair de l'ADEME, page par page, plusieurs
+# pages étant demandées en parallèle. Chaque page reçue est gardée sur le disque : une exécution interrompue
+# reprend aux pages manquantes. Les pages expirent après CACHE_MAX_AGE, et la commande generateemissionfactors
+# vide le cache après une exécution complète, pour ne pas mélanger les pages de deux versions de la Base Carbone.
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+BASE_CARBONE_URL = "https://data.ademe.fr/data-fair/api/v1/datasets/base-carbone(r)/lines"
+# the lines the emission factors are made from
+FACTOR_QUERY = {
+    "format": "json",
+    "q_mode": "simple",
+    "Type_Ligne_in": "Poste",
+    "Type_de_l'élément_in": "Facteur d'émission",
+    "Statut_de_l'élément_in": "Valide générique,Valide spécifique",
+    "Type_poste_in": "Combustion",
+    "sampling": "neighbors",
+}
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "base-carbone-pages")
+# seconds after which a cached page is requested again
+CACHE_MAX_AGE = 24 * 3600
+PAGE_SIZE = 1000
+WORKERS = 4
+# a page is requested this many times before giving up, waiting retry_delay * 2**attempt in between
+ATTEMPTS = 3
+
+
+class PageFetcher:
+    """
+    The lines of a data-fair dataset, fetched with `page` and `size` parameters. The first page gives the
+    total, the others are requested by at most `workers` threads at once.
+    """
+
+    def __init__(
+        self,
+        url=BASE_CARBONE_URL,
+        query=FACTOR_QUERY,
+        cache_dir=CACHE_DIR,
+        cache_max_age=CACHE_MAX_AGE,
+        page_size=PAGE_SIZE,
+        workers=WORKERS,
+        retry_delay=1,
+        timeout=30,
+    ):
+        self.url = url
+        self.query = query
+        self.cache_max_age = cache_max_age
+        self.page_size = page_size
+        self.workers = workers
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        # the pages of another query or page size are kept apart
+        key = json.dumps([url, sorted(query.items()), page_size], ensure_ascii=False)
+        self.cache_dir = os.path.join(cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()[:16])
+        self.sessions = threading.local()
+
+    def cache_path(self, page):
+        return os.path.join(self.cache_dir, f"page-{page:05d}.json")
+
+    def clear_cache(self):
+        """
+        Forgets the pages already fetched, for example after an update of the dataset
+        """
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def page(self, page):
+        """
+        The body of a page, read from the cache unless it has expired, or requested then cached
+        """
+        path = self.cache_path(page)
+        if os.path.exists(path) and time.time() - os.path.getmtime(path) < self.cache_max_age:
+            with open(path, "rb") as f:
+                return json.loads(f.read())
+        content = self.request(page)
+        body = json.loads(content)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # written aside then renamed, an interrupted run never leaves half a page
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(content)
+        os.replace(temporary_path, path)
+        return body
+
+    def request(self, page):
+        if not hasattr(self.sessions, "session"):
+            self.sessions.session = requests.Session()
+        parameters = {**self.query, "page": page, "size": self.page_size}
+        for attempt in range(ATTEMPTS):
+            try:
+                response = self.sessions.session.get(self.url, params=parameters, timeout=self.timeout)
+                if response.status_code < 500 and response.status_code != 429:
+                    response.raise_for_status()
+                    return response.content
+                error = requests.HTTPError(f"{response.status_code} for page {page}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as connection_error:
+                error = connection_error
+            if attempt < ATTEMPTS - 1:
+                time.sleep(self.retry_delay * 2**attempt)
+        raise error
+
+    def lines(self):
+        """
+        All the lines, in the order of the pages
+        """
+        first = self.page(1)
+        yield from first["results"]
+        page_count = max(1, math.ceil(first["total"] / self.page_size))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # map gives the pages in order whichever finishes first
+            for body in executor.map(self.page, range(2, page_count + 1)):
+                yield from body["results"]
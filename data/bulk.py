@@ -0,0 +1,143 @@
+# Calcul en masse des résultats et des totaux par poste, en arithmétique entière avec NumPy.
+# Donne exactement les mêmes arrondis que compute_resultat et Report.sum_post, qui calculent une émission
+# à la fois.
+from decimal import Decimal
+import numpy as np
+from data.emission_factors import get_emission_factors
+from data.models import Report, Emission, FactorKey
+
+# valeur is stored with 2 decimals
+VALEUR_DECIMALS = 2
+# number of reports whose emissions are fetched in one query
+REPORTS_PER_QUERY = 2000
+INT64_MAX = np.iinfo(np.int64).max
+
+
+def to_scaled_ints(values, places):
+    """
+    Decimals multiplied by 10**places, as exact Python ints
+    """
+    return [int(value.scaleb(places)) for value in values]
+
+
+def scaled_array(ints, bound):
+    # int64 is enough unless products of the values could overflow it, then Python ints are kept
+    return np.array(ints, dtype=np.int64 if bound <= INT64_MAX else object)
+
+
+def round_half_up(values, divisor):
+    """
+    values / divisor rounded to the nearest integer, halves away from zero like ROUND_HALF_UP
+    """
+    negative = values < 0
+    rounded = (np.abs(values) + divisor // 2) // divisor
+    return np.where(negative, -rounded, rounded), negative
+
+
+def compute_results(valeurs, factors):
+    """
+    Results in tenths of kgCO2e of emissions given their valeur Decimals and their factors as the
+    ScaledFactor (or None) of EmissionFactors.get_scaled_factor, as compute_resultat.
+    Returns (tenths, has_result, negative): emissions without a factor (None or 0) have no result,
+    negative tells the sign of the product for results rounded to zero.
+    """
+    places = max([factor.places for factor in factors if factor is not None], default=0)
+    valeur_ints = to_scaled_ints(valeurs, VALEUR_DECIMALS)
+    # the factors are already integers, brought to the same scale
+    factor_ints = [factor.scaled * 10 ** (places - factor.places) if factor is not None else 0 for factor in factors]
+    bound = max(map(abs, valeur_ints), default=0) * max(map(abs, factor_ints), default=0)
+    products = scaled_array(valeur_ints, bound) * scaled_array(factor_ints, bound)
+    # the product has VALEUR_DECIMALS + places decimals, keep one
+    tenths, negative = round_half_up(products, 10 ** (VALEUR_DECIMALS + places - 1))
+    has_result = scaled_array(factor_ints, bound) != 0
+    return tenths, has_result, negative
+
+
+def sum_by_group(tenths, has_result, groups):
+    """
+    Totals in kgCO2e of the results of each group, rounded like Report.sum_post.
+    Returns the sorted distinct groups and their totals; results are summed with np.add.reduceat
+    over the emissions ordered by group.
+    """
+    groups = np.asarray(groups)
+    if not len(groups):
+        return groups, np.array([], dtype=np.int64)
+    order = np.argsort(groups, kind="stable")
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    values = np.where(has_result, tenths, 0)[order]
+    sums = np.add.reduceat(values, starts)
+    totals, _ = round_half_up(sums, 10)
+    return sorted_groups[starts], totals
+
+
+def to_decimal(tenths, has_result, negative):
+    """
+    The result as compute_resultat gives it, a Decimal with one decimal place or None
+    """
+    if not has_result:
+        return None
+    if tenths:
+        return Decimal(int(tenths)).scaleb(-1)
+    # Decimal keeps the sign of results rounded to zero
+    return Decimal((1 if negative else 0, (0,), -1))
+
+
+def resultats(valeurs, factors):
+    """
+    compute_resultat of each (valeur, factor) pair, computed as a batch
+    """
+    tenths, has_result, negative = compute_results(valeurs, factors)
+    return [to_decimal(*result) for result in zip(tenths.tolist(), has_result.tolist(), negative.tolist())]
+
+
+def post_totals(report_ids, postes, valeurs, factors):
+    """
+    {report_id: {poste: total}} of the emissions, as Report.sum_post gives for each report and poste
+    """
+    if not len(report_ids):
+        return {}
+    tenths, has_result, _ = compute_results(valeurs, factors)
+    report_ids = np.asarray(report_ids, dtype=np.int64)
+    postes = np.asarray(postes, dtype=np.int64)
+    # one group per distinct (report, poste) pair, postes can be any integer
+    pairs, groups = np.unique(np.stack([report_ids, postes], axis=1), axis=0, return_inverse=True)
+    groups, totals = sum_by_group(tenths, has_result, groups.reshape(-1))
+    result = {}
+    for (report_id, poste), total in zip(pairs[groups].tolist(), totals.tolist()):
+        result.setdefault(report_id, {})[poste] = int(total)
+    return result
+
+
+def report_post_totals(report_ids):
+    """
+    {report_id: {poste: total}} computed from the emissions of the reports, in one query
+    """
+    emission_factors = get_emission_factors()
+    factors = {}
+    columns = ([], [], [], [])
+    emissions = Emission.objects.filter(bilan_id__in=report_ids).values_list(
+        "bilan_id", "poste", "valeur", "factor_key_id"
+    )
+    for report_id, poste, valeur, factor_key_id in emissions:
+        if factor_key_id not in factors:
+            factors[factor_key_id] = emission_factors.get_scaled_factor(*FactorKey.objects.values_of(factor_key_id))
+        for column, value in zip(columns, (report_id, poste, valeur, factors[factor_key_id])):
+            column.append(value)
+    return post_totals(*columns)
+
+
+def attach_post_totals(reports):
+    """
+    Computes the poste totals of the reports in bulk, Report.sum_post then reads them instead of
+    querying each report's emissions. Returns the reports as a list.
+    """
+    reports = list(reports)
+    for start in range(0, len(reports), REPORTS_PER_QUERY):
+        end = start + REPORTS_PER_QUERY
+        batch = reports[start:end]
+        report_ids = [report.id for report in batch if report.mode != Report.CalculationMode.MANUAL]
+        totals = report_post_totals(report_ids) if report_ids else {}
+        for report in batch:
+            report.post_totals = totals.get(report.id, {})
+    return reports
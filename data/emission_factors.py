@@ -1,40 +1,422 @@
 # Les facteurs d'émission sont définies dans une fichier JSON plutôt qu'un classe de choix en Django
 # car le client veut pouvoir les modifier, et cette méthode ne requiert pas une migration après.
+import hashlib
 import json
+import logging
 import os
-from decimal import Decimal
+import pickle
+import sys
+from bisect import bisect_left
+from collections import namedtuple, Counter
+from decimal import Decimal, InvalidOperation
+from data.factor_aliases import normalize, normalized_name, build_aliases, validate_aliases, old_names, NORMALIZED
+from data.factor_table import MappedFactorTable, write_table, source_stat, TABLE_SCHEMA, CONTROL_CHARACTERS
+from data.units import resolve_unit, factor_conversions, convert_factor
+
+logger = logging.getLogger(__name__)
+
+# a factor as written in the file, and as the integer value * 10**places
+ScaledFactor = namedtuple("ScaledFactor", ["value", "scaled", "places"])
+
+# the lookups are keyed on user input, they are forgotten past this number to keep memory bounded
+MAX_CACHED_LOOKUPS = 100000
+# the lookups cache None for the factors which don't exist
+NOT_LOOKED_UP = object()
+
+
+FACTORS_FILE = os.path.join(os.path.dirname(__file__), "static/emission-factors.json")
+# written at build time by the compileemissionfactors command, not versioned
+COMPILED_FILE = os.path.join(os.path.dirname(__file__), "compiled/emission-factors.pickle")
+# to be incremented whenever the content of the compiled file or FactorIndex change, older files are then ignored
+COMPILED_SCHEMA = 3
+# the factors as a read-only table shared by the workers, see data/factor_table.py
+TABLE_FILE = os.path.join(os.path.dirname(__file__), "compiled/emission-factors.table")
 
 
 class EmissionFactors:
-    def __init__(self):
-        module_dir = os.path.dirname(__file__)
-        file_path = os.path.join(module_dir, "static/emission-factors.json")
-        with open(file_path, "r") as f:
-            self.emission_factors = json.load(f)
+    def __init__(self, file_path=FACTORS_FILE, compiled_path=None, table_path=None):
+        self.file_path = file_path
+        self.compiled_path = compiled_path
+        self._index = None
+        # (how it was resolved, alias or normalized name, current key): number of lookups made through it
+        self.alias_hits = Counter()
+        # the workers using the table don't read the JSON file at all
+        self.table = open_table(table_path, file_path) if table_path else None
+        if self.table is not None:
+            self.source_hash = self.table.source_hash
+        else:
+            with open(file_path, "rb") as f:
+                content = f.read()
+            self.source_hash = hashlib.sha256(content).hexdigest()
+            self.load_factors(content)
+        # identifies the factor set, changes whenever the file is edited
+        self.version = self.source_hash[:16]
+
+    def __getattr__(self, name):
+        # with the mapped table, the factors are only loaded for the endpoints serving them whole
+        if name == "emission_factors":
+            self.load_factors()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def load_factors(self, content=None):
+        compiled = load_compiled(self.compiled_path, self.source_hash) if self.compiled_path else None
+        if compiled is not None:
+            self.emission_factors, self._index = compiled
+        else:
+            if content is None:
+                with open(self.file_path, "rb") as f:
+                    content = f.read()
+            self.emission_factors = json.loads(content)
+
+    @property
+    def uses_table(self):
+        return self.table is not None
+
+    @property
+    def index(self):
+        # built on first use
+        if self._index is None:
+            self._index = FactorIndex(self.emission_factors)
+        return self._index
 
     def get_factor(self, type, unit, location):
-        factor_unit = f"kgCO2e/{unit}"
+        factor = self.get_scaled_factor(type, unit, location)
+        return factor.value if factor is not None else None
+
+    @property
+    def lookup_caches(self):
+        """
+        The table or the FactorIndex, which hold the caches of the lookups
+        """
+        return self.table if self.uses_table else self.index
+
+    def resolve_type(self, type, caches=None):
+        """
+        The current key of a type which can be an old key, a display name or differ in accents and case,
+        or None. Counts the lookups made through each alias in alias_hits, by normalized name for the
+        normalized matches so that the variants of a name share their count.
+        """
+        caches = caches if caches is not None else self.lookup_caches
+        resolved = caches.resolved_types.get(type)
+        if resolved is None:
+            if len(caches.resolved_types) >= MAX_CACHED_LOOKUPS:
+                caches.resolved_types.clear()
+            resolved = caches.find_type(type) if isinstance(type, str) else (None, None)
+            caches.resolved_types[type] = resolved
+        current, kind = resolved
+        if kind is not None:
+            # bounded by the number of aliases in the factors file, whatever the names requested
+            key = (kind, normalized_name(type) if kind == NORMALIZED else type, current)
+            if key not in self.alias_hits:
+                logger.info("Emission type %r resolved to %r (%s)", key[1], current, kind)
+            self.alias_hits[key] += 1
+        return current
+
+    def get_scaled_factor(self, type, unit, location):
+        """
+        The factor for a type, unit and location, looked up and parsed once
+        """
+        caches = self.lookup_caches
+        type = self.resolve_type(type, caches)
+        if type is None:
+            return None
+        lookups = caches.lookups
+        key = (type, unit, location)
+        # read once, another thread can clear the lookups at any time
+        scaled = lookups.get(key, NOT_LOOKED_UP)
+        if scaled is NOT_LOOKED_UP:
+            if len(lookups) >= MAX_CACHED_LOOKUPS:
+                lookups.clear()
+            factor = self.find_factor(type, unit, location)
+            scaled = scale_factor(factor) if factor is not None else None
+            lookups[key] = scaled
+        return scaled
+
+    def find_factor(self, type, unit, location):
+        if self.uses_table:
+            return self.table.get_factor(type, unit, location)
         if type not in self.emission_factors:
             return None
         all_factors = self.emission_factors[type]["facteurs"]
-        local_factors = None
-        if location in all_factors:
-            local_factors = all_factors[location]
-        elif len(all_factors.keys()) == 1:
-            default_location = list(all_factors.keys())[0]
-            local_factors = all_factors[default_location]
-        if local_factors is None:
-            return None
+        if location not in all_factors:
+            if len(all_factors.keys()) != 1:
+                return None
+            location = list(all_factors.keys())[0]
+        local_factors = all_factors[location]
+        factor_unit = f"kgCO2e/{unit}"
         if factor_unit in local_factors:
             return Decimal(local_factors[factor_unit])
-        return None
+        # a unit of the same dimension, or another spelling of the unit
+        target = resolve_unit(unit)
+        source = self.index.conversions.get((type, location, target.name)) if target is not None else None
+        if source is None:
+            return None
+        return convert_factor(Decimal(local_factors[source]), source, target)
 
     def get_classification(self, type):
-        if type not in self.emission_factors:
+        type = self.resolve_type(type)
+        if type is None:
             return None
+        if self.uses_table:
+            return self.table.get_classification(type)
         return self.emission_factors[type]["classification"]
 
 
+def decimal_places(value):
+    exponent = value.as_tuple().exponent
+    return -exponent if exponent < 0 else 0
+
+
+def scale_factor(value):
+    places = decimal_places(value)
+    return ScaledFactor(value, int(value.scaleb(places)), places)
+
+
+def as_list(value):
+    # a few types are in several postes or groupes
+    return value if isinstance(value, list) else [value]
+
+
+class FactorIndex:
+    """
+    Lookups over the emission factors precomputed once: types by poste and groupe, aliases, unit conversions,
+    prefix search over the words of the type and its display name, and a compact encoding of the whole file.
+    """
+
+    def __init__(self, emission_factors):
+        self.emission_factors = emission_factors
+        # (type, unit, location): ScaledFactor, filled by EmissionFactors.get_scaled_factor
+        self.lookups = {}
+        self.by_poste = {}
+        self.by_groupe = {}
+        self.aliases, self.normalized_aliases = build_aliases(emission_factors)
+        # type asked for: (current key, how it was resolved), filled by EmissionFactors.resolve_type
+        self.resolved_types = {}
+        # (type, location, unit name): the unit of the factors of the location converted to that unit
+        self.conversions = {}
+        # (normalized text from a word onwards, position of the type in the file, type) sorted for bisection
+        self.search_terms = []
+        for position, (type, emission_factor) in enumerate(emission_factors.items()):
+            for poste in as_list(emission_factor.get("poste")):
+                self.by_poste.setdefault(str(poste), []).append(type)
+                for groupe in as_list(emission_factor.get("groupe")):
+                    self.by_groupe.setdefault((str(poste), groupe or ""), []).append(type)
+            for location, location_factors in emission_factor["facteurs"].items():
+                for unit, source in factor_conversions(location_factors).items():
+                    self.conversions[(type, location, unit)] = source
+            for text in {normalize(type), normalize(emission_factor.get("affichage") or "")}:
+                words = text.split()
+                for start in range(len(words)):
+                    self.search_terms.append((" ".join(words[start:]), position, type))
+        self.search_terms.sort()
+        self.compact = self.build_compact()
+
+    def find_type(self, type):
+        if type in self.emission_factors:
+            return type, None
+        if type in self.aliases:
+            return self.aliases[type]
+        # as in the mapped table, which uses them in its keys
+        if any(character in type for character in CONTROL_CHARACTERS):
+            return None, None
+        current = self.normalized_aliases.get(normalized_name(type))
+        return (current, NORMALIZED) if current is not None else (None, None)
+
+    def types(self, poste, groupe=None):
+        if groupe is None:
+            return self.by_poste.get(str(poste), [])
+        return self.by_groupe.get((str(poste), groupe), [])
+
+    def search(self, query, limit=20):
+        """
+        Types having a word of their key or display name starting with the query, in the order of the file
+        """
+        query = " ".join(normalize(query).split())
+        if not query:
+            return []
+        matches = {}
+        start = bisect_left(self.search_terms, (query,))
+        for text, position, type in self.search_terms[start:]:
+            if not text.startswith(query):
+                break
+            matches[type] = position
+        return sorted(matches, key=matches.get)[:limit]
+
+    def subset(self, types):
+        return {type: self.emission_factors[type] for type in types}
+
+    def build_compact(self):
+        """
+        The factors with each unit, location, groupe and classification written once in a table and
+        referred to by its position. Each type is [key, display name or null when identical, poste,
+        groupe index(es), classification index, [[location index, unit index, factor], ...]].
+        """
+        tables = {"unites": {}, "localisations": {}, "groupes": {}, "classifications": {}}
+
+        def intern(table, value):
+            return tables[table].setdefault(value, len(tables[table]))
+
+        types = []
+        for type, emission_factor in self.emission_factors.items():
+            affichage = emission_factor.get("affichage")
+            groupe = emission_factor.get("groupe") or ""
+            if isinstance(groupe, list):
+                groupe_index = [intern("groupes", value or "") for value in groupe]
+            else:
+                groupe_index = intern("groupes", groupe)
+            factors = [
+                [intern("localisations", location), intern("unites", unit), value]
+                for location, location_factors in emission_factor["facteurs"].items()
+                for unit, value in location_factors.items()
+            ]
+            types.append(
+                [
+                    type,
+                    affichage if affichage != type else None,
+                    emission_factor.get("poste"),
+                    groupe_index,
+                    intern("classifications", emission_factor.get("classification")),
+                    factors,
+                ]
+            )
+        return {**{name: list(values) for name, values in tables.items()}, "types": types}
+
+
+def intern_strings(value):
+    """
+    A copy of the parsed JSON where equal strings are a single object, repeated units and locations
+    are then stored once in memory and in the compiled file
+    """
+    if isinstance(value, dict):
+        return {sys.intern(key): intern_strings(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [intern_strings(item) for item in value]
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def validate_factors(emission_factors):
+    """
+    The errors found in the content of the file, as a list of messages
+    """
+    errors = []
+    for type, emission_factor in emission_factors.items():
+        if not isinstance(emission_factor, dict) or not isinstance(emission_factor.get("facteurs"), dict):
+            errors.append(f"{type} : facteurs manquants")
+            continue
+        names = [type, *emission_factor["facteurs"].keys(), *old_names(emission_factor)]
+        if any(character in name for name in names for character in CONTROL_CHARACTERS):
+            errors.append(f"{type} : caractère de contrôle dans le nom ou la localisation")
+        for poste in as_list(emission_factor.get("poste")):
+            if str(poste) not in ["1", "2"]:
+                errors.append(f"{type} : poste {poste} inconnu")
+        for location, location_factors in emission_factor["facteurs"].items():
+            errors += validate_location_factors(type, location, location_factors)
+    return errors + validate_aliases(emission_factors)
+
+
+def validate_location_factors(type, location, location_factors):
+    if not isinstance(location_factors, dict):
+        return [f"{type} : facteurs invalides pour {location}"]
+    errors = []
+    for unit, value in location_factors.items():
+        if not unit.startswith("kgCO2e/"):
+            errors.append(f"{type} : unité {unit} invalide")
+        if not is_valid_factor(value):
+            errors.append(f"{type} : facteur {value!r} invalide pour {location}, {unit}")
+    return errors
+
+
+def is_valid_factor(value):
+    try:
+        return isinstance(value, str) and Decimal(value).is_finite()
+    except (InvalidOperation, TypeError, ValueError):
+        return False
+
+
+def compile_factors(file_path=FACTORS_FILE, compiled_path=COMPILED_FILE, table_path=TABLE_FILE):
+    """
+    Writes the validated factors and their prebuilt FactorIndex to compiled_path, for the workers to load
+    without parsing the JSON and building the index, and the factor table they map to table_path.
+    Raises ValueError if the file has errors.
+    """
+    with open(file_path, "rb") as f:
+        content = f.read()
+    emission_factors = intern_strings(json.loads(content))
+    errors = validate_factors(emission_factors)
+    if errors:
+        raise ValueError("\n".join(errors))
+    payload = {
+        "schema": COMPILED_SCHEMA,
+        "source_hash": hashlib.sha256(content).hexdigest(),
+        # pickle keeps index.emission_factors the same object as emission_factors
+        "emission_factors": emission_factors,
+        "index": FactorIndex(emission_factors),
+    }
+    os.makedirs(os.path.dirname(compiled_path), exist_ok=True)
+    # written aside then renamed, a worker starting meanwhile never reads half a file
+    temporary_path = f"{compiled_path}.tmp"
+    with open(temporary_path, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, compiled_path)
+    os.makedirs(os.path.dirname(table_path), exist_ok=True)
+    write_table(emission_factors, payload["source_hash"], file_path, table_path)
+    return payload
+
+
+def load_compiled(compiled_path, source_hash):
+    """
+    (emission_factors, index) from the compiled file, or None when it is missing or was compiled from
+    another version of the JSON file or by another version of this code
+    """
+    try:
+        # the file is only ever written by compile_factors during the build
+        with open(compiled_path, "rb") as f:
+            payload = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Unreadable compiled emission factors %s, reading the JSON file", compiled_path, exc_info=True)
+        return None
+    if not isinstance(payload, dict) or payload.get("schema") != COMPILED_SCHEMA:
+        logger.warning("Compiled emission factors %s have another schema, reading the JSON file", compiled_path)
+        return None
+    if payload.get("source_hash") != source_hash:
+        logger.warning("Compiled emission factors %s are outdated, reading the JSON file", compiled_path)
+        return None
+    return payload["emission_factors"], payload["index"]
+
+
+def open_table(table_path, file_path):
+    """
+    The mapped factor table, or None when it is missing or the JSON file changed since it was written
+    """
+    try:
+        table = MappedFactorTable(table_path)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Unreadable emission factors table %s, reading the factors", table_path, exc_info=True)
+        return None
+    if table.schema != TABLE_SCHEMA or not table_matches_source(table, file_path):
+        logger.warning("Emission factors table %s is outdated, reading the factors", table_path)
+        return None
+    return table
+
+
+def table_matches_source(table, file_path):
+    """
+    Whether the table was written from the JSON file as it is now. Its size and modification time tell without
+    reading it, unless the deployment changed the time (archives keep whole seconds), the hash then decides.
+    """
+    if table.source_stat == source_stat(file_path):
+        return True
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest() == table.source_hash
+
+
 emission_factors = None
 
 
@@ -42,5 +424,5 @@ emission_factors = None
 def get_emission_factors():
     global emission_factors
     if emission_factors is None:
-        emission_factors = EmissionFactors()
+        emission_factors = EmissionFactors(compiled_path=COMPILED_FILE, table_path=TABLE_FILE)
     return emission_factors
@@ -0,0 +1,72 @@
+# Anciens noms des types d'émission. Emission.type garde la clé du fichier des facteurs au moment de la saisie :
+# quand une mise à jour du fichier renomme un type (par exemple quand try_adding_display_name change son
+# affichage), les émissions existantes doivent toujours trouver leur facteur.
+# Un type est retrouvé par sa clé, par un des noms de sa liste "anciens_noms", par son affichage, ou par
+# n'importe lequel de ces noms sans tenir compte des accents, de la casse et des espaces.
+import unicodedata
+
+# how an emission type was resolved to the current key
+OLD_KEY = "ancien nom"
+DISPLAY_NAME = "affichage"
+NORMALIZED = "normalisé"
+
+
+def normalize(text):
+    """
+    Lower case text without accents, for accent-insensitive matching
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def normalized_name(name):
+    return " ".join(normalize(name).split())
+
+
+def old_names(emission_factor):
+    names = emission_factor.get("anciens_noms") if isinstance(emission_factor, dict) else None
+    return names if isinstance(names, list) else []
+
+
+def build_aliases(emission_factors):
+    """
+    ({name: (current key, OLD_KEY or DISPLAY_NAME)}, {normalized name: current key}). Names which could be
+    several types are left out, as are display names which are the key of another type.
+    """
+    aliases = {}
+    for type, emission_factor in emission_factors.items():
+        for name in old_names(emission_factor):
+            aliases[name] = (type, OLD_KEY)
+    display_names = {}
+    for type, emission_factor in emission_factors.items():
+        display_names.setdefault(emission_factor.get("affichage"), set()).add(type)
+    for name, types in display_names.items():
+        if name and len(types) == 1 and name not in emission_factors and name not in aliases:
+            aliases[name] = (types.pop(), DISPLAY_NAME)
+
+    candidates = {}
+    names = [(type, type) for type in emission_factors]
+    names += [(name, type) for name, (type, kind) in aliases.items()]
+    for name, type in names:
+        candidates.setdefault(normalized_name(name), set()).add(type)
+    normalized = {name: types.pop() for name, types in candidates.items() if len(types) == 1}
+    return aliases, normalized
+
+
+def validate_aliases(emission_factors):
+    """
+    The errors in the old names of the types, as a list of messages
+    """
+    errors = []
+    owners = {}
+    for type, emission_factor in emission_factors.items():
+        names = emission_factor.get("anciens_noms", []) if isinstance(emission_factor, dict) else []
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            errors.append(f"{type} : anciens noms invalides")
+            continue
+        for name in names:
+            if name in emission_factors:
+                errors.append(f"{type} : l'ancien nom {name} est un type existant")
+            elif owners.setdefault(name, type) != type:
+                errors.append(f"{type} : l'ancien nom {name} est aussi celui de {owners[name]}")
+    return errors
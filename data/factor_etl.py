@@ -0,0 +1,192 @@
+# Création du fichier des facteurs d'émission à partir de la Base Carbone, en un seul passage sur ses lignes :
+# seules les colonnes utilisées sont gardées, la mémoire ne dépend que du nombre de facteurs créés.
+#
+# data/static/emission-factors.json a été initialement généré ainsi (voir la commande generateemissionfactors).
+# Pour le mettre à jour, copier le fichier créé vers data/static/emission-factors.json, en gardant les modifications
+# faites depuis à la main si elles sont toujours pertinentes.
+# NB : les hooks pre-commit formatent le fichier davantage. Pour voir les changements avant de commiter, lancer
+#      `pre-commit run` sur le fichier emission-factors.json ajouté.
+import csv
+import json
+import os
+from django.conf import settings
+
+EXTRACT_FILE = os.path.join(settings.BASE_DIR, "scripts/files/Base.Carbone.V20.2_Extrait.BCS-1.csv")
+POSTS_FILE = os.path.join(settings.BASE_DIR, "scripts/files/posts.json")
+
+# the columns of the Base Carbone the factors are made from, named as in the data-fair API
+COLUMNS = [
+    "Localisation_géographique",
+    "Sous-localisation_géographique_français",
+    "Nom_base_français",
+    "Nom_attribut_français",
+    "Nom_frontière_français",
+    "Unité_français",
+    "Total_poste_non_décomposé",
+]
+
+
+def read_csv_lines(file):
+    """
+    The lines of a Base Carbone CSV export, as dicts of the COLUMNS only
+    """
+    reader = csv.reader(file, delimiter=",")
+    headers = [header.replace(" ", "_") for header in next(reader)]
+    # as when every column was read, the last one wins when a name is repeated
+    positions = {name: len(headers) - 1 - headers[::-1].index(name) for name in COLUMNS}
+    for row in reader:
+        yield {name: row[position] for name, position in positions.items()}
+
+
+def select_columns(lines):
+    """
+    The lines of the data-fair API, as dicts of the COLUMNS only
+    """
+    for line in lines:
+        yield {name: line.get(name, "") for name in COLUMNS}
+
+
+class FactorFileBuilder:
+    """
+    Adds the lines one at a time to the factors, keeping count of what was left out for the report
+    """
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.factors = {}
+        self.duplicate_fe_by_unit = {}
+        self.duplicate_count = 0
+        self.missing_post = []
+        self.post_used = set()
+        self.total_efs_saved = 0
+        self.ignored = 0
+
+    def add(self, emission):
+        # Dès la spécification :
+        # "NB sur les FE : si un FE France et Europe existent pour le même combustible,
+        # prendre le FE France uniquement.
+        if emission["Localisation_géographique"] == "Europe":
+            self.ignored += 1
+            return
+
+        emission_type = emission["Nom_base_français"]
+        attribute = emission["Nom_attribut_français"]
+        border = emission["Nom_frontière_français"]
+        name_with_attribute = f"{emission_type}, {attribute}" if attribute else emission_type
+        emission_key = f"{name_with_attribute}, {border}" if border else name_with_attribute
+        unit = emission["Unité_français"]
+
+        factor = self.factors.get(emission_key)
+        if factor is None:
+            additional_info = self.additional_info(emission_type, attribute) or {}
+            factor = self.factors[emission_key] = {
+                "facteurs": {},
+                "type": emission_type,
+                "attribut": attribute,
+                "frontière": border,
+                "poste": additional_info.get("poste"),
+                "groupe": additional_info.get("groupe"),
+                "classification": additional_info.get("classification"),
+            }
+
+        local_factors = factor["facteurs"].setdefault(get_location(emission), {})
+        # note if there is a duplicate unit for emission type
+        if unit in local_factors:
+            duplicates = self.duplicate_fe_by_unit.setdefault(emission_key, {})
+            duplicates[unit] = duplicates.get(unit, 0) + 1
+            self.duplicate_count += 1
+            return
+        local_factors[unit] = emission["Total_poste_non_décomposé"].replace(",", ".")
+        self.total_efs_saved += 1
+
+    def additional_info(self, name, attribute):
+        name_for_post = f"{name}, {attribute}" if attribute else name
+        if name_for_post in self.posts:
+            self.post_used.add(name_for_post)
+            return self.posts[name_for_post]
+        elif name in self.posts:
+            self.post_used.add(name)
+            return self.posts[name]
+        self.missing_post.append(name_for_post)
+        return None
+
+    def build(self):
+        add_display_name(self.factors)
+        return self.factors
+
+    def report(self):
+        unused_posts = [name for name in self.posts.keys() if name not in self.post_used]
+        return [
+            str(self.duplicate_fe_by_unit),
+            f"Total ignored: {self.ignored}",
+            f"Total duplicates: {self.duplicate_count}",
+            f"Missing posts: {self.missing_post}",
+            f"Unused posts: {unused_posts}",
+            f"Total efs saved: {self.total_efs_saved}",
+            f"Total types: {len(self.factors.keys())}",
+        ]
+
+
+def get_location(emission):
+    location = emission["Localisation_géographique"]
+    sub_location = emission["Sous-localisation_géographique_français"]
+    if location == "Outre-mer":
+        return sub_location
+    if sub_location and sub_location != "France":
+        return f"{location} : {sub_location}"
+    return location
+
+
+def add_display_name(factors):
+    try_adding_display_name(factors, lambda factor: factor["type"], lambda factor: True)
+    try_adding_display_name(
+        factors, name_and_attribute, lambda factor: not factor.get("affichage") and factor.get("attribut")
+    )
+    try_adding_display_name(
+        factors,
+        name_and_attribute_and_border,
+        lambda factor: not factor.get("affichage") and factor.get("attribut") and factor.get("frontière"),
+    )
+    for key, factor in factors.items():
+        if not factor.get("affichage"):
+            factor["affichage"] = key  # key must be unique, so take that as fallback
+        del factor["attribut"]
+        del factor["frontière"]
+        del factor["type"]
+
+
+def name_and_attribute(factor):
+    return f"{factor['type']}, {factor['attribut']}"
+
+
+def name_and_attribute_and_border(factor):
+    return f"{factor['type']}, {factor['attribut']}, {factor['frontière']}"
+
+
+def try_adding_display_name(factors, name_func, valid_data):
+    unique_names = {}
+    duplicate_names = set()
+    for key, factor in factors.items():
+        if not valid_data(factor):
+            continue
+        name = name_func(factor)
+        if name in unique_names:
+            del unique_names[name]
+            duplicate_names.add(name)
+        elif name not in duplicate_names:
+            unique_names[name] = key
+    for key in unique_names.values():
+        factors[key]["affichage"] = name_func(factors[key])
+
+
+def write_factors_file(lines, output, posts_path=POSTS_FILE):
+    """
+    Writes the factors made from the lines to the output file, returns the lines of the report
+    """
+    with open(posts_path, "r", encoding="utf8") as jsonfile:
+        builder = FactorFileBuilder(json.load(jsonfile))
+    for line in lines:
+        builder.add(line)
+    with open(output, "w", encoding="utf8") as jsonfile:
+        json.dump(builder.build(), jsonfile, indent=2, ensure_ascii=False)
+    return builder.report()
@@ -0,0 +1,185 @@
+# Table des facteurs d'émission dans un fichier binaire en lecture seule, projeté en mémoire avec mmap :
+# tous les workers partagent les mêmes pages du cache du système au lieu de garder chacun leurs dictionnaires.
+#
+# Format, en little-endian :
+#   en-tête : MAGIC, version du format, sha256, taille et date de modification du fichier JSON source,
+#             nombre d'emplacements
+#   emplacements : table de hachage à adressage ouvert de (crc32 de la clé, position de la clé, position de la valeur)
+#   chaînes : chaque chaîne une seule fois, sa longueur sur 2 octets puis son UTF-8
+import mmap
+import os
+import struct
+import zlib
+from decimal import Decimal
+from data.factor_aliases import build_aliases, normalized_name, NORMALIZED
+from data.units import resolve_unit, factor_conversions, convert_factor
+
+MAGIC = b"BCSF"
+# to be incremented whenever the layout of the file changes, older files are then ignored
+TABLE_SCHEMA = 3
+HEADER = struct.Struct("<4sI32sQQI")
+SLOT = struct.Struct("<III")
+LENGTH = struct.Struct("<H")
+EMPTY = 0xFFFFFFFF
+# the parts of a key are joined with this character, which the factor file never contains
+SEPARATOR = "\x1f"
+# suffix of the key giving the only location of a type, used whatever location is asked for
+DEFAULT_LOCATION = "\x1e"
+# prefixes of the keys giving the current key of a type from its name, or from its normalized name
+ALIAS = "\x1d"
+NORMALIZED_ALIAS = "\x1c"
+CONTROL_CHARACTERS = (SEPARATOR, DEFAULT_LOCATION, ALIAS, NORMALIZED_ALIAS)
+
+
+def source_stat(path):
+    """
+    (size, modification time) of the JSON file, which tells that the table is up to date without reading the file
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def factor_key(type, location, unit):
+    return SEPARATOR.join([type, location, unit])
+
+
+def table_entries(emission_factors):
+    """
+    (key, value) of everything the table answers: the factors, the classifications, the default locations,
+    the units the factors are converted from and the aliases of the types
+    """
+    aliases, normalized_aliases = build_aliases(emission_factors)
+    for name, (type, kind) in aliases.items():
+        yield ALIAS + name, kind + SEPARATOR + type
+    for name, type in normalized_aliases.items():
+        yield NORMALIZED_ALIAS + name, type
+    for type, emission_factor in emission_factors.items():
+        # the current keys are aliases of themselves, without a kind
+        yield ALIAS + type, SEPARATOR + type
+        if emission_factor.get("classification") is not None:
+            yield type, emission_factor["classification"]
+        locations = emission_factor["facteurs"]
+        if len(locations) == 1:
+            yield type + DEFAULT_LOCATION, next(iter(locations))
+        for location, location_factors in locations.items():
+            for unit, value in location_factors.items():
+                yield factor_key(type, location, unit), value
+            # the factor units all start with kgCO2e/, the names of the units converted to never do
+            for unit, source in factor_conversions(location_factors).items():
+                yield factor_key(type, location, unit), source
+
+
+def write_table(emission_factors, source_hash, source_path, path):
+    entries = list(table_entries(emission_factors))
+    # at most half full, the probe sequences stay short
+    slot_count = 1
+    while slot_count < 2 * len(entries):
+        slot_count *= 2
+    strings = bytearray()
+    offsets = {}
+
+    def add_string(text):
+        if text not in offsets:
+            data = text.encode("utf-8")
+            offsets[text] = len(strings)
+            strings.extend(LENGTH.pack(len(data)) + data)
+        return offsets[text]
+
+    slots = [(0, EMPTY, EMPTY)] * slot_count
+    for key, value in entries:
+        hash = zlib.crc32(key.encode("utf-8"))
+        position = hash & (slot_count - 1)
+        while slots[position][1] != EMPTY:
+            position = (position + 1) & (slot_count - 1)
+        slots[position] = (hash, add_string(key), add_string(value))
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        header = (MAGIC, TABLE_SCHEMA, bytes.fromhex(source_hash), *source_stat(source_path), slot_count)
+        f.write(HEADER.pack(*header))
+        f.write(b"".join(SLOT.pack(*slot) for slot in slots))
+        f.write(strings)
+    os.replace(temporary_path, path)
+
+
+class MappedFactorTable:
+    """
+    Read-only lookups in a file written by write_table, giving the same answers as EmissionFactors
+    does from the parsed JSON. Nothing is copied from the mapped file but the strings looked up.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.schema, source_digest, size, modification, self.slot_count = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an emission factors table")
+        self.source_hash = source_digest.hex()
+        self.source_stat = (size, modification)
+        self.strings = HEADER.size + SLOT.size * self.slot_count
+        # (type, unit, location): ScaledFactor, filled by EmissionFactors.get_scaled_factor
+        self.lookups = {}
+        # type asked for: (current key, how it was resolved), filled by EmissionFactors.resolve_type
+        self.resolved_types = {}
+
+    def string(self, offset):
+        start = self.strings + offset
+        (length,) = LENGTH.unpack_from(self.buffer, start)
+        start += LENGTH.size
+        end = start + length
+        return self.buffer[start:end]
+
+    def get(self, key):
+        data = key.encode("utf-8")
+        hash = zlib.crc32(data)
+        position = hash & (self.slot_count - 1)
+        while True:
+            slot_hash, key_offset, value_offset = SLOT.unpack_from(self.buffer, HEADER.size + SLOT.size * position)
+            if key_offset == EMPTY:
+                return None
+            if slot_hash == hash and self.string(key_offset) == data:
+                return self.string(value_offset).decode("utf-8")
+            position = (position + 1) & (self.slot_count - 1)
+
+    def find_type(self, type):
+        """
+        As FactorIndex.find_type: (current key, how it was resolved or None), (None, None) for an unknown type
+        """
+        if any(character in type for character in CONTROL_CHARACTERS):
+            return None, None
+        alias = self.get(ALIAS + type)
+        if alias is not None:
+            kind, _, current = alias.partition(SEPARATOR)
+            return current, kind or None
+        current = self.get(NORMALIZED_ALIAS + normalized_name(type))
+        return (current, NORMALIZED) if current is not None else (None, None)
+
+    def get_factor(self, type, unit, location):
+        """
+        As EmissionFactors.find_factor: the factor of the location, or of the only location of the type
+        """
+        parts = [type, unit, location or ""]
+        if any(character in part for part in parts for character in CONTROL_CHARACTERS):
+            return None
+        value = self.get_local_factor(type, unit, location) if location is not None else None
+        if value is None:
+            default_location = self.get(type + DEFAULT_LOCATION)
+            if default_location is None:
+                return None
+            value = self.get_local_factor(type, unit, default_location)
+        return value
+
+    def get_local_factor(self, type, unit, location):
+        value = self.get(factor_key(type, location, f"kgCO2e/{unit}"))
+        if value is not None:
+            return Decimal(value)
+        target = resolve_unit(unit)
+        source = self.get(factor_key(type, location, target.name)) if target is not None else None
+        if source is None:
+            return None
+        return convert_factor(Decimal(self.get(factor_key(type, location, source))), source, target)
+
+    def get_classification(self, type):
+        if any(character in type for character in CONTROL_CHARACTERS):
+            return None
+        return self.get(type)
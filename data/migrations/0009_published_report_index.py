@@ -0,0 +1,17 @@
+# Generated by Django 4.0.8 on 2026-10-19 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0008_report_validations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(condition=models.Q(('statut', 'publié')), fields=['id'], name='published_report_idx'),
+        ),
+    ]
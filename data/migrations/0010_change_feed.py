@@ -0,0 +1,38 @@
+# Generated by Django 4.0.8 on 2026-10-19 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0009_published_report_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bilan', 'Bilan'), ('emission', 'Émission')], max_length=10, verbose_name="type d'objet")),
+                ('object_id', models.BigIntegerField(verbose_name='identifiant')),
+                ('deletion_date', models.DateTimeField(auto_now_add=True, verbose_name='date de suppression')),
+            ],
+            options={
+                'verbose_name': 'suppression',
+                'verbose_name_plural': 'suppressions',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='emission',
+            index=models.Index(fields=['modification_date', 'id'], name='emission_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['modification_date', 'id'], name='report_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deletion_date', 'id'], name='tombstone_changes_idx'),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 4.0.8 on 2026-10-19 04:17
+
+import hashlib
+import json
+import os
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+import django.db.models.deletion
+
+# the factor lookup and totals as they were when the snapshots were introduced, so that later changes to
+# data.models and data.emission_factors don't change this migration
+FACTORS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static/emission-factors.json")
+
+
+def get_factor(emission_factors, type, unit, location):
+    if type not in emission_factors:
+        return None
+    all_factors = emission_factors[type]["facteurs"]
+    if location in all_factors:
+        local_factors = all_factors[location]
+    elif len(all_factors) == 1:
+        local_factors = next(iter(all_factors.values()))
+    else:
+        return None
+    factor = local_factors.get(f"kgCO2e/{unit}")
+    return Decimal(factor) if factor is not None else None
+
+
+def compute_resultat(valeur, factor):
+    if factor:
+        return Decimal(valeur * factor).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+    return None
+
+
+def sum_results(results):
+    results = [result for result in results if result]
+    if results:
+        return int(sum(results).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    return 0
+
+
+def snapshot_values(report, emissions, emission_factors, factor_version):
+    lines = []
+    for emission in emissions:
+        factor = get_factor(emission_factors, emission.type, emission.unite, emission.localisation)
+        resultat = compute_resultat(emission.valeur, factor)
+        lines.append(
+            {
+                "poste": emission.poste,
+                "type": emission.type,
+                "localisation": emission.localisation,
+                "valeur": str(emission.valeur),
+                "unite": emission.unite,
+                "facteur_d_emission": str(factor) if factor is not None else None,
+                "resultat": str(resultat) if resultat is not None else None,
+            }
+        )
+    if report.mode == "manuel":
+        poste_1, poste_2 = report.manuel_poste_1, report.manuel_poste_2
+    else:
+        poste_1, poste_2 = [
+            sum_results(Decimal(line["resultat"]) for line in lines if line["poste"] == poste and line["resultat"])
+            for poste in (1, 2)
+        ]
+    total = (poste_1 or 0) + (poste_2 or 0) if poste_1 is not None or poste_2 is not None else None
+    return {
+        "siren": report.siren,
+        "raison_sociale": report.raison_sociale,
+        "naf": report.naf,
+        "nombre_salaries": report.nombre_salaries,
+        "region": report.region,
+        "annee": report.annee,
+        "mode": report.mode,
+        "poste_1": poste_1,
+        "poste_2": poste_2,
+        "total": total,
+        "publication_date": report.publication_date or report.modification_date,
+        "factor_version": factor_version,
+        "emissions": lines,
+    }
+
+
+def snapshot_published_reports(apps, schema_editor):
+    Report = apps.get_model("data", "Report")
+    Emission = apps.get_model("data", "Emission")
+    PublicationSnapshot = apps.get_model("data", "PublicationSnapshot")
+    reports = Report.objects.filter(statut="publié")
+    if not reports.exists():
+        return
+    with open(FACTORS_FILE, "rb") as f:
+        content = f.read()
+    emission_factors = json.loads(content)
+    factor_version = hashlib.sha256(content).hexdigest()[:16]
+    for report in reports.iterator():
+        values = snapshot_values(report, Emission.objects.filter(bilan=report), emission_factors, factor_version)
+        PublicationSnapshot.objects.create(bilan=report, **values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0010_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicationSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('siren', models.CharField(max_length=9, verbose_name='SIREN')),
+                ('raison_sociale', models.TextField(verbose_name='raison sociale')),
+                ('naf', models.CharField(blank=True, choices=[('01', 'Culture et production animale, chasse et services annexes'), ('02', 'Sylviculture et exploitation forestière'), ('03', 'Pêche et aquaculture'), ('05', 'Extraction de houille et de lignite'), ('06', "Extraction d'hydrocarbures"), ('07', 'Extraction de minerais métalliques'), ('08', 'Autres industries extractives'), ('09', 'Services de soutien aux industries extractives'), ('10', 'Industries alimentaires'), ('11', 'Fabrication de boissons'), ('12', 'Fabrication de produits à base de tabac'), ('13', 'Fabrication de textiles'), ('14', "Industrie de l'habillement"), ('15', 'Industrie du cuir et de la chaussure'), ('16', "Travail du bois et fabrication d'articles en bois et en liège, à l'exception des meubles ; fabrication d'articles en vannerie et sparterie"), ('17', 'Industrie du papier et du carton'), ('18', "Imprimerie et reproduction d'enregistrements"), ('19', 'Cokéfaction et raffinage'), ('20', 'Industrie chimique'), ('21', 'Industrie pharmaceutique'), ('22', 'Fabrication de produits en caoutchouc et en plastique'), ('23', "Fabrication d'autres produits minéraux non métalliques"), ('24', 'Métallurgie'), ('25', "Fabrication de produits métalliques, à l'exception des machines et des équipements"), ('26', 'Fabrication de produits informatiques, électroniques et optiques'), ('27', "Fabrication d'équipements électriques"), ('28', 'Fabrication de machines et équipements n.c.a.'), ('29', 'Industrie automobile'), ('30', "Fabrication d'autres matériels de transport"), ('31', 'Fabrication de meubles'), ('32', 'Autres industries manufacturières'), ('33', "Réparation et installation de machines et d'équipements"), ('35', "Production et distribution d'électricité, de gaz, de vapeur et d'air conditionné"), ('36', "Captage, traitement et distribution d'eau"), ('37', 'Collecte et traitement des eaux usées'), ('38', 'Collecte, traitement et élimination des déchets ; récupération'), ('39', 'Dépollution et autres services de gestion des déchets'), ('41', 'Construction de bâtiments'), ('42', 'Génie civil'), ('43', 'Travaux de construction spécialisés'), ('45', "Commerce et réparation d'automobiles et de motocycles"), ('46', "Commerce de gros, à l'exception des automobiles et des motocycles"), ('47', "Commerce de détail, à l'exception des automobiles et des motocycles"), ('49', 'Transports terrestres et transport par conduites'), ('50', 'Transports par eau'), ('51', 'Transports aériens'), ('52', 'Entreposage et services auxiliaires des transports'), ('53', 'Activités de poste et de courrier'), ('55', 'Hébergement'), ('56', 'Restauration'), ('58', 'Édition'), ('59', 'Production de films cinématographiques, de vidéo et de programmes de télévision ; enregistrement sonore et édition musicale'), ('60', 'Programmation et diffusion'), ('61', 'Télécommunications'), ('62', 'Programmation, conseil et autres activités informatiques'), ('63', "Services d'information"), ('64', 'Activités des services financiers, hors assurance et caisses de retraite'), ('65', 'Assurance'), ('66', "Activités auxiliaires de services financiers et d'assurance"), ('68', 'Activités immobilières'), ('69', 'Activités juridiques et comptables'), ('70', 'Activités des sièges sociaux ; conseil de gestion'), ('71', "Activités d'architecture et d'ingénierie ; activités de contrôle et analyses techniques"), ('72', 'Recherche-développement scientifique'), ('73', 'Publicité et études de marché'), ('74', 'Autres activités spécialisées, scientifiques et techniques'), ('75', 'Activités vétérinaires'), ('77', 'Activités de location et location-bail'), ('78', "Activités liées à l'emploi"), ('79', 'Activités des agences de voyage, voyagistes, services de réservation et activités connexes'), ('80', 'Enquêtes et sécurité'), ('81', 'Services relatifs aux bâtiments et aménagement paysager'), ('82', 'Activités administratives et autres activités de soutien aux entreprises'), ('84', 'Administration publique et défense ; sécurité sociale obligatoire'), ('85', 'Enseignement'), ('86', 'Activités pour la santé humaine'), ('87', 'Hébergement médico-social et social'), ('88', 'Action sociale sans hébergement'), ('90', 'Activités créatives, artistiques et de spectacle'), ('91', 'Bibliothèques, archives, musées et autres activités culturelles'), ('92', "Organisation de jeux de hasard et d'argent"), ('93', 'Activités sportives, récréatives et de loisirs'), ('94', 'Activités des organisations associatives'), ('95', "Réparation d'ordinateurs et de biens personnels et domestiques"), ('96', 'Autres services personnels'), ('97', "Activités des ménages en tant qu'employeurs de personnel domestique"), ('98', 'Activités indifférenciées des ménages en tant que producteurs de biens et services pour usage propre'), ('99', 'Activités des organisations et organismes extraterritoriaux')], max_length=4, null=True, verbose_name='code NAF')),
+                ('nombre_salaries', models.IntegerField(blank=True, null=True, verbose_name='nombre de salariés')),
+                ('region', models.CharField(blank=True, choices=[('01', 'Guadeloupe'), ('02', 'Martinique'), ('03', 'Guyane'), ('04', 'La Réunion'), ('06', 'Mayotte'), ('11', 'Île-de-France'), ('24', 'Centre-Val de Loire'), ('27', 'Bourgogne-Franche-Comté'), ('28', 'Normandie'), ('32', 'Hauts-de-France'), ('44', 'Grand Est'), ('52', 'Pays de la Loire'), ('53', 'Bretagne'), ('75', 'Nouvelle-Aquitaine'), ('76', 'Occitanie'), ('84', 'Auvergne-Rhône-Alpes'), ('93', "Provence-Alpes-Côte d'Azur"), ('94', 'Corse')], max_length=4, null=True, verbose_name='code région')),
+                ('annee', models.IntegerField(verbose_name='année de reporting')),
+                ('mode', models.CharField(choices=[('manuel', 'Déclaré'), ('auto', 'Calculé')], max_length=10, verbose_name='mode de publication')),
+                ('poste_1', models.BigIntegerField(blank=True, null=True, verbose_name='total poste 1')),
+                ('poste_2', models.BigIntegerField(blank=True, null=True, verbose_name='total poste 2')),
+                ('total', models.BigIntegerField(blank=True, null=True, verbose_name='total')),
+                ('publication_date', models.DateTimeField(verbose_name='date de publication')),
+                ('factor_version', models.CharField(max_length=16, verbose_name="version des facteurs d'émission")),
+                ('emissions', models.JSONField(default=list, verbose_name='émissions')),
+                ('bilan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='publication_snapshot', to='data.report')),
+            ],
+            options={
+                'verbose_name': 'bilan publié',
+                'verbose_name_plural': 'bilans publiés',
+            },
+        ),
+        migrations.RunPython(snapshot_published_reports, migrations.RunPython.noop),
+    ]
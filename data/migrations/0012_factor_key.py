@@ -0,0 +1,115 @@
+# Generated by Django 4.0.8 on 2026-10-19 09:40
+
+from django.db import migrations, models, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+import django.db.models.deletion
+
+# emissions updated in one transaction, the table is never locked as a whole
+BATCH_SIZE = 20000
+
+
+def id_batches(Emission):
+    bounds = Emission.objects.aggregate(first=Min("id"), last=Max("id"))
+    if bounds["first"] is None:
+        return
+    for start in range(bounds["first"], bounds["last"] + 1, BATCH_SIZE):
+        yield Emission.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE)
+
+
+def intern_factor_keys(apps, schema_editor):
+    Emission = apps.get_model("data", "Emission")
+    FactorKey = apps.get_model("data", "FactorKey")
+    keys = Emission.objects.values_list("type", "unite", "localisation").distinct()
+    FactorKey.objects.bulk_create(
+        [FactorKey(type=type, unite=unite, localisation=localisation) for type, unite, localisation in keys]
+    )
+    located = FactorKey.objects.filter(
+        type=OuterRef("type"), unite=OuterRef("unite"), localisation=OuterRef("localisation")
+    )
+    unlocated = FactorKey.objects.filter(type=OuterRef("type"), unite=OuterRef("unite"), localisation__isnull=True)
+    for batch in id_batches(Emission):
+        with transaction.atomic():
+            batch.filter(localisation__isnull=False).update(factor_key=Subquery(located.values("id")[:1]))
+            batch.filter(localisation__isnull=True).update(factor_key=Subquery(unlocated.values("id")[:1]))
+
+
+def restore_factor_key_values(apps, schema_editor):
+    Emission = apps.get_model("data", "Emission")
+    FactorKey = apps.get_model("data", "FactorKey")
+    key = FactorKey.objects.filter(id=OuterRef("factor_key_id"))
+    for batch in id_batches(Emission):
+        with transaction.atomic():
+            batch.update(
+                type=Subquery(key.values("type")[:1]),
+                unite=Subquery(key.values("unite")[:1]),
+                localisation=Subquery(key.values("localisation")[:1]),
+            )
+
+
+class Migration(migrations.Migration):
+    # the emissions are converted in batches, each in its own transaction
+    atomic = False
+
+    dependencies = [
+        ('data', '0011_publication_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FactorKey',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('type', models.CharField(max_length=100, verbose_name="type d'émission")),
+                ('unite', models.CharField(max_length=20, verbose_name='unité')),
+                ('localisation', models.CharField(blank=True, max_length=100, null=True, verbose_name='localisation')),
+            ],
+            options={
+                'verbose_name': "clé de facteur d'émission",
+                'verbose_name_plural': "clés de facteurs d'émission",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='factorkey',
+            constraint=models.UniqueConstraint(condition=models.Q(('localisation__isnull', False)), fields=('type', 'unite', 'localisation'), name='factor_key_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='factorkey',
+            constraint=models.UniqueConstraint(condition=models.Q(('localisation__isnull', True)), fields=('type', 'unite'), name='factor_key_without_localisation_unique'),
+        ),
+        migrations.AddField(
+            model_name='emission',
+            name='factor_key',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='data.factorkey', verbose_name="clé de facteur d'émission"),
+        ),
+        migrations.RunPython(intern_factor_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='emission',
+            name='factor_key',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='data.factorkey', verbose_name="clé de facteur d'émission"),
+        ),
+        # nullable before being removed, so that the migration can be reversed: the columns are added back
+        # empty then filled from the factor keys
+        migrations.AlterField(
+            model_name='emission',
+            name='type',
+            field=models.CharField(max_length=100, null=True, verbose_name="type d'émission"),
+        ),
+        migrations.AlterField(
+            model_name='emission',
+            name='unite',
+            field=models.CharField(max_length=20, null=True, verbose_name='unité'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_factor_key_values),
+        migrations.RemoveField(
+            model_name='emission',
+            name='type',
+        ),
+        migrations.RemoveField(
+            model_name='emission',
+            name='unite',
+        ),
+        migrations.RemoveField(
+            model_name='emission',
+            name='localisation',
+        ),
+    ]
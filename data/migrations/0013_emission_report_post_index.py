@@ -0,0 +1,23 @@
+# Generated by Django 4.0.8 on 2026-10-19 05:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0012_factor_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emission',
+            index=models.Index(fields=['bilan', 'poste'], name='emission_report_post_idx'),
+        ),
+        migrations.AlterField(
+            model_name='emission',
+            name='bilan',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='data.report'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.8 on 2026-10-19 05:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0013_emission_report_post_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='report',
+            name='published_report_idx',
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from data.emission_factors import get_emission_factors
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
@@ -40,6 +40,10 @@ class Report(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["siren", "annee"], name="annual_report"),
         ]
+        indexes = [
+            # keyset ordering of the change feed
+            models.Index(fields=["modification_date", "id"], name="report_changes_idx"),
+        ]
 
     class Status(models.TextChoices):
         DRAFT = "brouillon"
@@ -100,14 +104,10 @@ class Report(models.Model):
     )
 
     def sum_post(self, post):
-        results = [
-            emission.resultat for emission in Emission.objects.filter(poste=post, bilan=self) if emission.resultat
-        ]
-        if len(results):
-            # don't rely on int rounding which rounds 0.5 to 0, use Decimal quantize instead
-            return int(sum(results).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
-        else:
-            return 0
+        # set when the totals of many reports are computed at once, see data.bulk.attach_post_totals
+        if hasattr(self, "post_totals"):
+            return self.post_totals.get(post, 0)
+        return sum_results(emission.resultat for emission in Emission.objects.filter(poste=post, bilan=self))
 
     @property
     def poste_1(self):
@@ -145,36 +145,201 @@ class Report(models.Model):
     def save(self, *args, **kwargs):
         if self.statut == self.Status.PUBLISHED:
             self.publication_date = timezone.now()
-        super().save(*args, **kwargs)
+            # the snapshot is taken again on each publication, it is never updated otherwise
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                PublicationSnapshot.objects.filter(bilan=self).delete()
+                PublicationSnapshot.objects.create(
+                    bilan=self, **publication_snapshot_values(self, self.emission_set.all())
+                )
+        else:
+            super().save(*args, **kwargs)
+            PublicationSnapshot.objects.filter(bilan=self).delete()
 
 
 def kg_to_t(value):
     return value / 1000 if value is not None else None
 
 
+def sum_results(results):
+    """
+    Total in kgCO2e of emission results, rounded to the nearest integer
+    """
+    results = [result for result in results if result]
+    if len(results):
+        # don't rely on int rounding which rounds 0.5 to 0, use Decimal quantize instead
+        return int(sum(results).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    else:
+        return 0
+
+
+def compute_resultat(valeur, factor):
+    """
+    Emission in kgCO2e for a quantity and an emission factor, rounded to 0.1
+    """
+    if factor:
+        return Decimal(valeur * factor).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+    return None
+
+
+class FactorKeyManager(models.Manager):
+    """
+    Keeps the factor keys in memory: they are never changed once created, and there are only a few hundred
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.values_by_id = {}
+        self.ids_by_values = {}
+
+    def values_of(self, id):
+        """
+        (type, unite, localisation) of a factor key
+        """
+        values = self.values_by_id.get(id)
+        if values is None:
+            # all the keys at once, on first use and whenever another process added one
+            self.values_by_id = {key[0]: key[1:] for key in self.values_list("id", "type", "unite", "localisation")}
+            values = self.values_by_id[id]
+        return values
+
+    def id_of(self, type, unite, localisation):
+        """
+        The id of the factor key, created if it is new
+        """
+        values = (type, unite, localisation)
+        id = self.ids_by_values.get(values)
+        if id is None:
+            id = self.get_or_create(type=type, unite=unite, localisation=localisation)[0].id
+            # a key created in a transaction which is rolled back must not be used afterwards
+            transaction.on_commit(lambda: self.ids_by_values.setdefault(values, id))
+        return id
+
+
+class FactorKey(models.Model):
+    """
+    A (type, unite, localisation) of emissions, stored once: the emissions refer to it by its id, which keeps
+    the emissions table and its indexes small
+    """
+
+    class Meta:
+        verbose_name = "clé de facteur d'émission"
+        verbose_name_plural = "clés de facteurs d'émission"
+        constraints = [
+            # NULL localisations are not equal in a unique constraint, they have their own
+            models.UniqueConstraint(
+                fields=["type", "unite", "localisation"],
+                condition=models.Q(localisation__isnull=False),
+                name="factor_key_unique",
+            ),
+            models.UniqueConstraint(
+                fields=["type", "unite"],
+                condition=models.Q(localisation__isnull=True),
+                name="factor_key_without_localisation_unique",
+            ),
+        ]
+
+    id = models.AutoField(primary_key=True)
+    type = models.CharField(verbose_name="type d'émission", max_length=100)
+    unite = models.CharField(verbose_name="unité", max_length=20)
+    localisation = models.CharField(verbose_name="localisation", max_length=100, blank=True, null=True)
+
+    objects = FactorKeyManager()
+
+
+class EmissionQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create doesn't go through Emission.save
+        objs = list(objs)
+        for emission in objs:
+            emission.intern_factor_key()
+        created = super().bulk_create(objs, *args, **kwargs)
+        # as data.signals.record_report_change does for each saved emission
+        report_ids = {emission.bilan_id for emission in objs}
+        Report.objects.filter(id__in=report_ids).update(modification_date=timezone.now())
+        return created
+
+
 class Emission(models.Model):
     class Meta:
         verbose_name = "emission"
         verbose_name_plural = "emissions"
+        indexes = [
+            # the emissions of a report by poste, see Report.sum_post. Also serves the lookups on the report alone,
+            # which is why bilan has no index of its own
+            models.Index(fields=["bilan", "poste"], name="emission_report_post_idx"),
+            # keyset ordering of the change feed
+            models.Index(fields=["modification_date", "id"], name="emission_changes_idx"),
+        ]
 
     creation_date = models.DateTimeField(auto_now_add=True)
     modification_date = models.DateTimeField(auto_now=True)
 
-    bilan = models.ForeignKey(Report, on_delete=models.CASCADE)
+    bilan = models.ForeignKey(Report, on_delete=models.CASCADE, db_index=False)
 
     valeur = models.DecimalField(verbose_name="valeur", max_digits=10, decimal_places=2)  # max 99.999.999,99
-    type = models.CharField(verbose_name="type d'émission", max_length=100)
-    localisation = models.CharField(verbose_name="localisation", max_length=100, blank=True, null=True)
-    unite = models.CharField(verbose_name="unité", max_length=20)
+    # type, unite and localisation, see the properties below
+    factor_key = models.ForeignKey(FactorKey, on_delete=models.PROTECT, verbose_name="clé de facteur d'émission")
     poste = models.IntegerField(verbose_name="poste")
     note = models.TextField(verbose_name="note", blank=True, null=True)
 
+    objects = EmissionQuerySet.as_manager()
+
+    @property
+    def factor_key_values(self):
+        # the values given since the emission was last saved, or those of its factor key
+        values = self.__dict__.get("_factor_key_values")
+        if values is None:
+            values = FactorKey.objects.values_of(self.factor_key_id) if self.factor_key_id else (None, None, None)
+        return values
+
+    def set_factor_key_value(self, position, value):
+        values = list(self.factor_key_values)
+        values[position] = value
+        self._factor_key_values = tuple(values)
+
+    @property
+    def type(self):
+        return self.factor_key_values[0]
+
+    @type.setter
+    def type(self, value):
+        self.set_factor_key_value(0, value)
+
+    @property
+    def unite(self):
+        return self.factor_key_values[1]
+
+    @unite.setter
+    def unite(self, value):
+        self.set_factor_key_value(1, value)
+
+    @property
+    def localisation(self):
+        return self.factor_key_values[2]
+
+    @localisation.setter
+    def localisation(self, value):
+        self.set_factor_key_value(2, value)
+
+    def intern_factor_key(self):
+        values = self.__dict__.pop("_factor_key_values", None)
+        if values is not None:
+            self.factor_key_id = FactorKey.objects.id_of(*values)
+
+    def save(self, *args, **kwargs):
+        self.intern_factor_key()
+        super().save(*args, **kwargs)
+
     @property
     def resultat(self):
-        factor = self.facteur_d_emission
-        if factor:
-            return Decimal(self.valeur * factor).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
-        return None
+        # serializing an emission reads it several times, it is computed again only when its inputs change
+        emission_factors = get_emission_factors()
+        key = (self.valeur, self.type, self.unite, self.localisation, emission_factors.version)
+        if self.__dict__.get("_resultat_key") != key:
+            self._resultat = compute_resultat(self.valeur, self.facteur_d_emission)
+            self._resultat_key = key
+        return self._resultat
 
     @property
     def facteur_d_emission(self):
@@ -183,3 +348,111 @@ class Emission(models.Model):
     @property
     def classification(self):
         return get_emission_factors().get_classification(self.type)
+
+
+class Tombstone(models.Model):
+    """
+    Keeps track of deleted reports and emissions so that the change feed can tell consumers about them
+    """
+
+    class Meta:
+        verbose_name = "suppression"
+        verbose_name_plural = "suppressions"
+        indexes = [
+            models.Index(fields=["deletion_date", "id"], name="tombstone_changes_idx"),
+        ]
+
+    class Kind(models.TextChoices):
+        REPORT = "bilan", "Bilan"
+        EMISSION = "emission", "Émission"
+
+    kind = models.CharField(max_length=10, choices=Kind.choices, verbose_name="type d'objet")
+    object_id = models.BigIntegerField(verbose_name="identifiant")
+    deletion_date = models.DateTimeField(auto_now_add=True, verbose_name="date de suppression")
+
+
+def publication_snapshot_values(report, emissions):
+    """
+    Fields of the publication snapshot of a report and its emissions, with the current emission factors
+    """
+    emission_factors = get_emission_factors()
+    lines = []
+    for emission in emissions:
+        factor = emission_factors.get_factor(emission.type, emission.unite, emission.localisation)
+        resultat = compute_resultat(emission.valeur, factor)
+        lines.append(
+            {
+                "poste": emission.poste,
+                "type": emission.type,
+                "localisation": emission.localisation,
+                "valeur": str(emission.valeur),
+                "unite": emission.unite,
+                "facteur_d_emission": str(factor) if factor is not None else None,
+                "resultat": str(resultat) if resultat is not None else None,
+            }
+        )
+    if report.mode == Report.CalculationMode.MANUAL:
+        poste_1, poste_2 = report.manuel_poste_1, report.manuel_poste_2
+    else:
+        poste_1, poste_2 = [
+            sum_results(Decimal(line["resultat"]) for line in lines if line["poste"] == poste and line["resultat"])
+            for poste in (1, 2)
+        ]
+    total = (poste_1 or 0) + (poste_2 or 0) if poste_1 is not None or poste_2 is not None else None
+    return {
+        "siren": report.siren,
+        "raison_sociale": report.raison_sociale,
+        "naf": report.naf,
+        "nombre_salaries": report.nombre_salaries,
+        "region": report.region,
+        "annee": report.annee,
+        "mode": report.mode,
+        "poste_1": poste_1,
+        "poste_2": poste_2,
+        "total": total,
+        "publication_date": report.publication_date,
+        "factor_version": emission_factors.version,
+        "emissions": lines,
+    }
+
+
+# NB: this model is used by the public export, take care when changing it.
+class PublicationSnapshot(models.Model):
+    """
+    Frozen copy of a published report: its totals and emission lines as computed with the emission factors
+    of the day of publication. Public data is read from here rather than recomputed from live emissions.
+    """
+
+    class Meta:
+        verbose_name = "bilan publié"
+        verbose_name_plural = "bilans publiés"
+
+    bilan = models.OneToOneField(Report, on_delete=models.CASCADE, related_name="publication_snapshot")
+
+    siren = models.CharField(verbose_name="SIREN", max_length=9)
+    raison_sociale = models.TextField(verbose_name="raison sociale")
+    naf = models.CharField(verbose_name="code NAF", blank=True, null=True, choices=NafDivision.choices, max_length=4)
+    nombre_salaries = models.IntegerField(verbose_name="nombre de salariés", blank=True, null=True)
+    region = models.CharField(verbose_name="code région", blank=True, null=True, choices=Region.choices, max_length=4)
+    annee = models.IntegerField(verbose_name="année de reporting")
+    mode = models.CharField(max_length=10, choices=Report.CalculationMode.choices, verbose_name="mode de publication")
+
+    poste_1 = models.BigIntegerField(verbose_name="total poste 1", blank=True, null=True)
+    poste_2 = models.BigIntegerField(verbose_name="total poste 2", blank=True, null=True)
+    total = models.BigIntegerField(verbose_name="total", blank=True, null=True)
+
+    publication_date = models.DateTimeField(verbose_name="date de publication")
+    factor_version = models.CharField(verbose_name="version des facteurs d'émission", max_length=16)
+    emissions = models.JSONField(verbose_name="émissions", default=list)
+
+    @property
+    def poste_1_t(self):
+        return kg_to_t(self.poste_1)
+
+    @property
+    def poste_2_t(self):
+        return kg_to_t(self.poste_2)
+
+    @property
+    def total_t(self):
+        return kg_to_t(self.total)
@@ -0,0 +1,98 @@
+# Réplique en lecture seule de la BDD : les exports et les statistiques la lisent pour ne pas charger la base
+# principale utilisée par les entreprises. Les vues interactives lisent toujours la base principale, pour que
+# l'utilisateur retrouve ce qu'il vient d'enregistrer.
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA = "replica"
+
+# the database alias the reads go to, None for the default routing
+read_database = ContextVar("read_database", default=None)
+
+
+def replica_lag():
+    """
+    Seconds the replica is behind the primary, 0 when it has replayed everything it received or when the
+    replica alias is not a standby server
+    """
+    with connections[REPLICA].cursor() as cursor:
+        # on an idle primary the last replayed transaction gets old without the replica being late
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+def choose_read_database():
+    """
+    The replica, unless there is none or it is more than REPLICA_MAX_LAG seconds late or can't be reached
+    """
+    if not settings.READ_FROM_REPLICA:
+        return DEFAULT_DB_ALIAS
+    try:
+        lag = replica_lag()
+    except DatabaseError:
+        logger.warning("Replica database unavailable, reading from the primary", exc_info=True)
+        return DEFAULT_DB_ALIAS
+    if lag > settings.REPLICA_MAX_LAG:
+        logger.warning("Replica database %.1fs late, reading from the primary", lag)
+        return DEFAULT_DB_ALIAS
+    return REPLICA
+
+
+@contextmanager
+def reads_from(alias):
+    token = read_database.set(alias)
+    try:
+        yield alias
+    finally:
+        read_database.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    """
+    Reads of the block from the replica, when it is up to date
+    """
+    with reads_from(choose_read_database()) as alias:
+        yield alias
+
+
+def iter_reads_from(alias, iterable):
+    """
+    Iterates with the reads from the alias, for the streamed responses consumed after their view has returned
+    """
+    iterator = iter(iterable)
+    while True:
+        with reads_from(alias):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class ReplicaRouter:
+    """
+    Sends the reads to the database chosen by reads_from, the writes and migrations always to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from data.models import Report, Emission, Tombstone
+
+
+@receiver(post_delete, sender=Report)
+def record_report_deletion(sender, instance, **kwargs):
+    Tombstone.objects.create(kind=Tombstone.Kind.REPORT, object_id=instance.id)
+
+
+@receiver(post_delete, sender=Emission)
+def record_emission_deletion(sender, instance, **kwargs):
+    Tombstone.objects.create(kind=Tombstone.Kind.EMISSION, object_id=instance.id)
+
+
+@receiver([post_save, post_delete], sender=Emission)
+def record_report_change(sender, instance, **kwargs):
+    # the totals of the report change with its emissions, the change feed lists the report again
+    Report.objects.filter(id=instance.bilan_id).update(modification_date=timezone.now())
@@ -0,0 +1,89 @@
+# Génère des bilans et des émissions réalistes (types, unités et localisations tirés du fichier des facteurs)
+# pour mesurer les performances des exports et des calculs sur des volumes proches de la production.
+import random
+from decimal import Decimal
+from django.utils import timezone
+from data.emission_factors import get_emission_factors
+from data.insee_naf_division_choices import NafDivision
+from data.region_choices import Region
+from data.models import Report, Emission, FactorKey
+
+# share of emissions which can't be matched to a factor, as happens when the factor file changes
+UNRESOLVABLE_RATIO = 0.02
+
+
+def luhn_siren(number):
+    """
+    Builds a valid SIREN from an 8 digit number by appending the Luhn check digit
+    """
+    digits = f"{number:08d}"
+    for check_digit in range(10):
+        code = digits + str(check_digit)
+        checksum = sum(int(n) for n in code[-1::-2])
+        checksum += sum(sum(int(n) for n in str(int(digit) * 2)) for digit in code[-2::-2])
+        if checksum % 10 == 0:
+            return code
+
+
+def factor_choices():
+    choices = []
+    max_length = FactorKey._meta.get_field("type").max_length
+    for type, emission_factor in get_emission_factors().emission_factors.items():
+        if len(type) > max_length:
+            continue
+        for location, factors in emission_factor["facteurs"].items():
+            for unit in factors.keys():
+                choices.append((type, unit.replace("kgCO2e/", "", 1), location))
+    return choices
+
+
+def synthetic_reports(count, seed=0, first_siren=10000000):
+    rng = random.Random(seed)
+    year = timezone.now().year
+    regions = list(Region)
+    nafs = list(NafDivision)
+    for index in range(count):
+        published = rng.random() < 0.5
+        mode = Report.CalculationMode.MANUAL if rng.random() < 0.1 else Report.CalculationMode.AUTO
+        yield Report(
+            siren=luhn_siren(first_siren + index),
+            annee=rng.randint(year - 2, year),
+            raison_sociale=f"Entreprise {index}",
+            nombre_salaries=rng.randint(50, 500),
+            region=rng.choice(regions),
+            naf=rng.choice(nafs),
+            statut=Report.Status.PUBLISHED if published else Report.Status.DRAFT,
+            publication_date=timezone.now() if published else None,
+            mode=mode,
+            manuel_poste_1=rng.randint(0, 100000) if mode == Report.CalculationMode.MANUAL else None,
+            manuel_poste_2=rng.randint(0, 100000) if mode == Report.CalculationMode.MANUAL else None,
+        )
+
+
+def synthetic_emission_values(count, seed=0):
+    """
+    Yields (poste, type, valeur, unite, localisation) tuples
+    """
+    rng = random.Random(seed)
+    choices = factor_choices()
+    for _ in range(count):
+        type, unit, location = rng.choice(choices)
+        if rng.random() < UNRESOLVABLE_RATIO:
+            unit = "unité inconnue"
+        valeur = Decimal(rng.randint(1, 10000000)).scaleb(-2)
+        yield rng.randint(1, 2), type, valeur, unit, location
+
+
+def synthetic_emissions(report_ids, per_report, seed=0):
+    values = synthetic_emission_values(len(report_ids) * per_report, seed=seed)
+    for report_id in report_ids:
+        for _ in range(per_report):
+            poste, type, valeur, unite, localisation = next(values)
+            yield Emission(
+                bilan_id=report_id,
+                poste=poste,
+                type=type,
+                valeur=valeur,
+                unite=unite,
+                localisation=localisation,
+            )
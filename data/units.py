@@ -0,0 +1,154 @@
+# Unités des quantités et des facteurs d'émission. La Base Carbone écrit une même unité de plusieurs façons
+# (kWh PCI, kWhPCI, kWh (PCI), KWh PCI...), et une quantité saisie en MWh, en tonnes ou en m3 peut utiliser un
+# facteur donné par kWh, par kg ou par litre.
+# Chaque unité connue a une dimension et sa taille dans l'unité de base de sa dimension, en fraction exacte :
+# les coefficients entre toutes les unités d'une même dimension sont calculés une fois au chargement.
+import re
+from collections import namedtuple
+from decimal import Decimal, Context, ROUND_HALF_EVEN
+from fractions import Fraction
+
+# the units of the factors are this followed by the unit of the quantity
+FACTOR_PREFIX = "kgCO2e/"
+
+Unit = namedtuple("Unit", ["name", "dimension", "size", "spellings"])
+
+# 1 tep = 41.868 GJ = 11630 kWh
+TEP = 11630
+ENERGY_SIZES = [
+    ("kWh", Fraction(1)),
+    ("MWh", Fraction(1000)),
+    ("GWh", Fraction(1000000)),
+    ("MJ", Fraction(1000, 3600)),
+    ("GJ", Fraction(1000000, 3600)),
+    ("tep", Fraction(TEP)),
+]
+
+
+def energy_units(heating_value, default=False):
+    # the factors of the Base Carbone are on the lower heating value unless PCS is written,
+    # so an energy entered without it is taken as PCI
+    return [
+        Unit(
+            f"{name} {heating_value}",
+            f"énergie {heating_value}",
+            size,
+            [f"{name} {heating_value}", *([name] if default else [])],
+        )
+        for name, size in ENERGY_SIZES
+    ]
+
+
+UNITS = [
+    *energy_units("PCI", default=True),
+    *energy_units("PCS"),
+    Unit("kg", "masse", Fraction(1), ["kg", "kilogramme", "kilogrammes"]),
+    Unit("g", "masse", Fraction(1, 1000), ["g", "gramme", "grammes"]),
+    Unit("tonne", "masse", Fraction(1000), ["tonne", "tonnes", "t"]),
+    Unit("litre", "volume", Fraction(1), ["litre", "litres", "l"]),
+    Unit("m3", "volume", Fraction(1000), ["m3", "m³"]),
+]
+
+
+def spelling_key(unit):
+    """
+    The unit ignoring case, spaces and parentheses: "kWh (PCI)", "kWhPCI" and "KWh PCI" are the same
+    """
+    return re.sub(r"[\s()]", "", unit).casefold()
+
+
+UNITS_BY_SPELLING = {spelling_key(spelling): unit for unit in UNITS for spelling in unit.spellings}
+DIMENSIONS = dict.fromkeys(unit.dimension for unit in UNITS)
+UNITS_BY_DIMENSION = {dimension: [unit for unit in UNITS if unit.dimension == dimension] for dimension in DIMENSIONS}
+# (from, to): a quantity in `from` times the coefficient is the quantity in `to`
+COEFFICIENTS = {
+    (source.name, target.name): source.size / target.size
+    for units in UNITS_BY_DIMENSION.values()
+    for source in units
+    for target in units
+}
+
+# significant digits kept when a converted factor has no exact decimal value, as GJ to kWh
+CONVERSION_DIGITS = 12
+
+
+def resolve_unit(unit):
+    """
+    The known Unit written as `unit`, or None
+    """
+    if not isinstance(unit, str):
+        return None
+    return UNITS_BY_SPELLING.get(spelling_key(unit))
+
+
+def quantity_unit(factor_unit):
+    """
+    "GJ PCI" for "kgCO2e/GJ PCI", None for a unit not per quantity
+    """
+    return factor_unit.partition(FACTOR_PREFIX)[2] if factor_unit.startswith(FACTOR_PREFIX) else None
+
+
+def is_exact(coefficient):
+    """
+    Whether multiplying a decimal by the coefficient gives a decimal, its denominator having no other
+    prime factors than 2 and 5
+    """
+    denominator = coefficient.denominator
+    for prime in (2, 5):
+        while denominator % prime == 0:
+            denominator //= prime
+    return denominator == 1
+
+
+def factor_conversions(factor_units):
+    """
+    {known unit name: factor unit} telling which of the units a factor is given in ("kgCO2e/GJ PCI"...)
+    is used for every unit it can be converted to: the simplest conversion, then the first unit.
+    """
+    sources = {}
+    for factor_unit in factor_units:
+        resolved = resolve_unit(quantity_unit(factor_unit))
+        if resolved is not None:
+            sources.setdefault(resolved.dimension, []).append((factor_unit, resolved))
+    conversions = {}
+    for dimension, candidates in sources.items():
+        for target in UNITS_BY_DIMENSION[dimension]:
+            # a factor per unit of target is a factor per unit of source times the size of target in source
+            ranks = [conversion_rank(COEFFICIENTS[(target.name, source.name)]) for _, source in candidates]
+            conversions[target.name] = candidates[ranks.index(min(ranks))][0]
+    return conversions
+
+
+def conversion_rank(coefficient):
+    """
+    0 for the same unit, 1 for a power of ten which keeps the digits of the factor as written (kWh to MWh),
+    2 for another exact conversion (GJ to kWh), 3 for a conversion which is rounded
+    """
+    if coefficient == 1:
+        return 0
+    if is_power_of_ten(coefficient):
+        return 1
+    return 2 if is_exact(coefficient) else 3
+
+
+def is_power_of_ten(coefficient):
+    value = coefficient if coefficient.numerator != 1 else 1 / coefficient
+    return value.denominator == 1 and str(value.numerator).rstrip("0") == "1"
+
+
+def convert_factor(value, factor_unit, target):
+    """
+    The factor `value` given in `factor_unit` as a factor per unit of the Unit `target`, exact when possible
+    """
+    source = resolve_unit(quantity_unit(factor_unit))
+    coefficient = COEFFICIENTS[(target.name, source.name)]
+    if coefficient == 1:
+        return value
+    converted = Fraction(value) * coefficient
+    if is_exact(converted):
+        places = 0
+        while 10**places % converted.denominator:
+            places += 1
+        return Decimal(converted.numerator * (10**places // converted.denominator)).scaleb(-places)
+    context = Context(prec=CONVERSION_DIGITS, rounding=ROUND_HALF_EVEN)
+    return context.divide(Decimal(converted.numerator), Decimal(converted.denominator))
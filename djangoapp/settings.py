@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -70,6 +71,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "api.middleware.ExportCompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -115,6 +117,30 @@ DATABASES = {
     }
 }
 
+# Read-only replica for the exports and statistics, see data.replica. Without REPLICA_DB_HOST everything is read
+# from the primary, the alias then only being a second connection to it (used by the tests).
+DATABASES["replica"] = {
+    **DATABASES["default"],
+    "USER": os.getenv("REPLICA_DB_USER", DATABASES["default"]["USER"]),
+    "NAME": os.getenv("REPLICA_DB_NAME", DATABASES["default"]["NAME"]),
+    "PASSWORD": os.getenv("REPLICA_DB_PASSWORD", DATABASES["default"]["PASSWORD"]),
+    "HOST": os.getenv("REPLICA_DB_HOST", DATABASES["default"]["HOST"]),
+    "PORT": os.getenv("REPLICA_DB_PORT", DATABASES["default"]["PORT"]),
+    "TEST": {"MIRROR": "default"},
+}
+
+DATABASE_ROUTERS = ["data.replica.ReplicaRouter"]
+
+READ_FROM_REPLICA = bool(os.getenv("REPLICA_DB_HOST"))
+
+# Seconds of replication lag above which the reads meant for the replica go to the primary
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "30"))
+
+# Seconds during which the change feed holds back the changes. Their dates are set before their transaction
+# commits, a change is only served once every transaction which could still commit an earlier date is over and
+# replicated: longer than the longest transaction plus REPLICA_MAX_LAG.
+CHANGE_FEED_LAG = float(os.getenv("CHANGE_FEED_LAG", "120"))
+
 
 LOGGING = {
     "version": 1,
@@ -172,6 +198,18 @@ STATIC_URL = "/static/"
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, "static"),)
 
+# Generated export files are kept here and reused as long as the data hasn't changed
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bilans-climat-exports"))
+
+# Number of rows fetched at a time from the database server-side cursor by the streamed exports
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "2000"))
+
+# Number of threads rendering the per-report files of the emissions ZIP export
+EXPORT_BUNDLE_WORKERS = int(os.getenv("EXPORT_BUNDLE_WORKERS", "4"))
+
+# Seconds during which the public API serves its snapshot of published reports without checking for changes
+OPEN_DATA_SNAPSHOT_TTL = int(os.getenv("OPEN_DATA_SNAPSHOT_TTL", "60"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -184,7 +222,6 @@ REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": (
         "djangorestframework_camel_case.render.CamelCaseJSONRenderer",
         "djangorestframework_camel_case.render.CamelCaseBrowsableAPIRenderer",
-        "drf_excel.renderers.XLSXRenderer",
     ),
     "DEFAULT_PARSER_CLASSES": (
         "djangorestframework_camel_case.parser.CamelCaseFormParser",
@@ -0,0 +1,45 @@
+# Préchargement fait une seule fois par gunicorn avant de lancer les workers (voir gunicorn.conf.py) :
+# les workers partagent alors ces modules et ces structures par copy-on-write au lieu de les construire
+# chacun à leur première requête.
+import gc
+import importlib
+from django.db import connections
+from django.urls import get_resolver
+
+# imported by the export views and the account creation on their first use only
+HEAVY_MODULES = [
+    "openpyxl",
+    "drf_excel.renderers",
+    "drf_excel.mixins",
+    "rest_framework_csv.renderers",
+    "numpy",
+    "pyarrow",
+    "pyarrow.parquet",
+    "zstandard",
+    "requests",
+    "rest_framework_simplejwt.tokens",
+    "api.export_views",
+    "api.exports.compression",
+]
+
+
+def warm_up():
+    from api.exports import emission_export_labels
+    from api.serializers import PrivateReportExportSerializer, PublicReportExportSerializer
+    from data.emission_factors import get_emission_factors
+
+    # imports the views of all the urls and compiles their patterns
+    get_resolver().reverse_dict
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+    # the mapped table when there is one, which the workers share without it being copied: the index would be
+    # built from the JSON file in every worker's memory
+    get_emission_factors().lookup_caches
+    emission_export_labels()
+    PrivateReportExportSerializer.get_labels()
+    PublicReportExportSerializer.get_labels()
+    # a connection opened meanwhile must not be shared by the workers
+    connections.close_all()
+    # the objects created until now are left alone by the garbage collector of the workers, which would
+    # otherwise copy their memory pages by updating them
+    gc.freeze()
@@ -0,0 +1,26 @@
+# Configuration de gunicorn, lue depuis le dossier de lancement (voir le Procfile).
+# L'application est chargée et préchauffée une fois avant de lancer les workers, qui la partagent.
+import os
+
+wsgi_app = "djangoapp.wsgi"
+preload_app = True
+errorlog = "-"
+
+
+def available_cpus():
+    # the CPUs this process may run on, fewer than os.cpu_count() in a container with a CPU limit
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# the requests mostly wait for the database: a process per CPU, each serving several requests in threads
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", available_cpus()))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+
+def on_starting(server):
+    from djangoapp.warmup import warm_up
+
+    warm_up()